@@ -0,0 +1,180 @@
+"""Online backups of the database, and restoring them
+
+Backups use SQLite's backup API a few pages at a time on a separate
+connection, so the app keeps reading and writing meanwhile. Each backup is
+written to a .partial file, checked with PRAGMA integrity_check, then renamed,
+so a listed backup is always complete. Restoring copies a backup into the
+live database in one backup step, which other connections see as a single
+atomic change.
+"""
+import os
+import re
+import sqlite3
+import time
+from schema import MIGRATIONS, migrate, new_uid
+from store import connect
+
+# Database pages (4 KB) copied per step, and the pause that lets writers in between steps
+BACKUP_PAGES = 256
+STEP_PAUSE = 0.005
+
+# Backups kept: the newest KEEP_LAST, plus the newest of each of the last KEEP_DAYS days
+KEEP_LAST = 5
+KEEP_DAYS = 14
+
+# Hours between scheduled backups of the window, 0 turns them off (setting backup_interval_hours)
+BACKUP_INTERVAL_HOURS = 24
+
+BACKUP_NAME = re.compile(r"^quicklink-(\d{8}-\d{6})(-\d+)?(-[a-z-]+)?\.db$")
+
+
+def backup_dir(db_path):
+    """Returns the directory of the backups of a database, next to it"""
+    return os.path.splitext(os.path.abspath(db_path))[0] + "-backups"
+
+
+def list_backups(directory):
+    """Returns (path, time) of the backups in a directory, newest first"""
+    if not os.path.isdir(directory):
+        return []
+    backups = []
+    for name in os.listdir(directory):
+        match = BACKUP_NAME.match(name)
+        if match:
+            when = time.mktime(time.strptime(match.group(1), "%Y%m%d-%H%M%S"))
+            # Backups taken within the same second are numbered in order
+            number = int(match.group(2)[1:]) if match.group(2) else 0
+            backups.append((when, number, os.path.join(directory, name)))
+    backups.sort(reverse=True)
+    return [(path, when) for when, number, path in backups]
+
+
+def check_backup(path):
+    """Returns the problems PRAGMA integrity_check finds in a database file, empty when it is sound"""
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        return [str(e)]
+    finally:
+        conn.close()
+
+    if problems == ["ok"]:
+        problems = []
+    if version > len(MIGRATIONS):
+        problems.append(f"Made by a newer version of QuickLink (schema version {version})")
+    return problems
+
+
+def create_backup(db_path, directory=None, label="", progress=None, prune=True):
+    """Backs a database up into directory, returns the path of the backup
+
+    progress(copied, total) is called after every step, on the calling thread.
+    Older backups are pruned afterwards unless prune is False. Raises
+    ValueError if the copy fails its integrity check.
+    """
+    directory = directory or backup_dir(db_path)
+    os.makedirs(directory, exist_ok=True)
+
+    # Names sort by time, a second backup within the same second gets a number
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(directory, f"quicklink-{stamp}{label and '-' + label}.db")
+    n = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"quicklink-{stamp}-{n}{label and '-' + label}.db")
+        n += 1
+
+    partial = path + ".partial"
+    source = connect(db_path)
+    target = sqlite3.connect(partial)
+    try:
+        # A write by another connection restarts the copy at the next step, never corrupts it
+        source.backup(
+            target, pages=BACKUP_PAGES, sleep=STEP_PAUSE,
+            progress=progress and (lambda status, remaining, total: progress(total - remaining, total)),
+        )
+        # A backup is a single file, without a write-ahead log next to it
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        target.close()
+        source.close()
+
+    problems = check_backup(partial)
+    if problems:
+        os.remove(partial)
+        raise ValueError(f"The backup failed its integrity check: {problems[0]}")
+    os.replace(partial, path)
+
+    if prune:
+        prune_backups(directory)
+    return path
+
+
+def prune_backups(directory, keep_last=KEEP_LAST, keep_days=KEEP_DAYS):
+    """Deletes the backups outside the retention, returns their paths"""
+    backups = list_backups(directory)
+    keep = {path for path, when in backups[:keep_last]}
+
+    # The newest backup of each recent day
+    cutoff = time.time() - keep_days * 24 * 3600
+    days = set()
+    for path, when in backups:
+        day = time.strftime("%Y%m%d", time.localtime(when))
+        if when >= cutoff and day not in days:
+            days.add(day)
+            keep.add(path)
+
+    removed = []
+    for path, when in backups:
+        if path not in keep:
+            os.remove(path)
+            removed.append(path)
+    return removed
+
+
+def newest_backup_time(directory):
+    """Returns the time of the newest backup, or None"""
+    backups = list_backups(directory)
+    return backups[0][1] if backups else None
+
+
+def restore_backup(db_path, path):
+    """Replaces the content of a database with a backup, returns the path of the backup taken first
+
+    The database being replaced is backed up first (labelled before-restore).
+    The backup is copied in a single step, so windows and commands using the
+    database see either the old or the restored content, never a mix.
+    """
+    problems = check_backup(path)
+    if problems:
+        raise ValueError(f"{os.path.basename(path)} can't be restored: {problems[0]}")
+
+    # Not pruned yet, that could delete the backup being restored
+    safety = create_backup(db_path, os.path.dirname(os.path.abspath(path)), "before-restore", prune=False)
+
+    source = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    target = connect(db_path)
+    try:
+        counter = change_counter(target)
+        source.backup(target)
+
+        # Backups of older versions are brought up to date
+        migrate(target)
+
+        # The change log goes on from where it was, with an entry telling open windows
+        # that everything changed
+        with target:
+            target.execute("INSERT INTO change_log (id) VALUES (?)", (max(counter, change_counter(target)) + 1,))
+            # The restored rows went back in time, databases synced with this one compare every row next time
+            target.execute("UPDATE settings SET value = ? WHERE key = 'database_uid'", (new_uid(),))
+    finally:
+        target.close()
+        source.close()
+    return safety
+
+
+def change_counter(conn):
+    """Returns the last id of the change log of a database, 0 before it had one"""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
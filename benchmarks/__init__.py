@@ -0,0 +1,8 @@
+"""Benchmarks of QuickLink, run from the repository root
+
+    python -m benchmarks.generate /tmp/bench.db --pages 1000
+    python -m benchmarks.run /tmp/bench.db --output results.json
+    python -m benchmarks.run /tmp/bench.db --baseline results.json
+
+The database given to benchmarks.run is never modified, writes go to a copy.
+"""
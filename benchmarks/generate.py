@@ -0,0 +1,133 @@
+"""Builds a synthetic QuickLink database of any size
+
+    python -m benchmarks.generate /tmp/bench.db --pages 1000
+    python -m benchmarks.generate /tmp/mixed.db --image-size 512 --formats png,jpeg,webp --duplicate-ratio 0.8
+"""
+import argparse
+import io
+import os
+import random
+import sys
+from PIL import Image, ImageDraw
+from schema import image_hash
+from store import PAGE_SIZE, QuickLinkStore
+from thumbnails import ThumbnailCache
+
+# Links written per executemany call
+BATCH_SIZE = 1000
+
+FORMATS = {"png": "PNG", "jpeg": "JPEG", "gif": "GIF", "webp": "WEBP"}
+
+WORDS = ["docs", "mail", "drive", "github", "news", "video", "music", "maps", "shop", "bank",
+         "calendar", "notes", "photos", "wiki", "forum", "blog", "cloud", "chat", "design", "code"]
+
+
+def make_image(rng, size, image_format):
+    """Returns the bytes of a random icon-like image"""
+    img = Image.new("RGBA", (size, size), tuple(rng.randrange(256) for _ in range(3)) + (255,))
+    draw = ImageDraw.Draw(img)
+    for _ in range(6):
+        x0, y0 = rng.randrange(size), rng.randrange(size)
+        x1, y1 = rng.randrange(x0, size + 1), rng.randrange(y0, size + 1)
+        fill = tuple(rng.randrange(256) for _ in range(4))
+        if rng.random() < 0.5:
+            draw.ellipse((x0, y0, x1, y1), fill=fill)
+        else:
+            draw.rectangle((x0, y0, x1, y1), fill=fill)
+
+    # A patch of noise makes every image unique and closer to real photos in size
+    noise = Image.frombytes("L", (size // 4, size // 4), rng.randbytes((size // 4) ** 2))
+    img.paste(noise.convert("RGBA"), (rng.randrange(size - size // 4 + 1), rng.randrange(size - size // 4 + 1)))
+
+    if image_format in ("JPEG", "GIF"):
+        img = img.convert("RGB")
+    output = io.BytesIO()
+    img.save(output, format=image_format)
+    return output.getvalue()
+
+
+def generate(path, pages=100, links_per_page=PAGE_SIZE, image_size=256, formats=("png",),
+             duplicate_ratio=0.5, image_ratio=1.0, thumbnails=False, seed=0):
+    """Creates a database at path, returns the number of links and distinct images"""
+    if os.path.exists(path):
+        raise ValueError(f"{path} already exists")
+    if not 0 < links_per_page <= PAGE_SIZE:
+        raise ValueError(f"Links per page must be between 1 and {PAGE_SIZE}")
+
+    rng = random.Random(seed)
+    store = QuickLinkStore(path)
+    conn = store.conn
+    image_hashes = []
+    batch = []
+    count = 0
+
+    try:
+        with conn:
+            for page in range(pages):
+                page_id = conn.execute("INSERT INTO pages (title) VALUES (?)", (f"Page {page + 1}",)).lastrowid
+                for position in range(links_per_page):
+                    word = rng.choice(WORDS)
+                    digest = None
+                    if rng.random() < image_ratio:
+                        # Reuse an earlier image for the requested share of links
+                        if image_hashes and rng.random() < duplicate_ratio:
+                            digest = rng.choice(image_hashes)
+                        else:
+                            data = make_image(rng, image_size, FORMATS[rng.choice(formats)])
+                            digest = image_hash(data)
+                            conn.execute("INSERT OR IGNORE INTO images (hash, data) VALUES (?, ?)", (digest, data))
+                            image_hashes.append(digest)
+                    batch.append((page_id, f"https://{word}.example.com/{count}", position, digest,
+                                  f"{word.title()} {count}"))
+                    count += 1
+
+                    if len(batch) >= BATCH_SIZE:
+                        conn.executemany(
+                            "INSERT INTO links (page_id, url, position, image_hash, title) VALUES (?, ?, ?, ?, ?)",
+                            batch,
+                        )
+                        batch.clear()
+
+            if batch:
+                conn.executemany(
+                    "INSERT INTO links (page_id, url, position, image_hash, title) VALUES (?, ?, ?, ?, ?)", batch
+                )
+
+        if thumbnails:
+            ThumbnailCache(conn, store.thumbnail_size).backfill()
+    finally:
+        store.close()
+
+    return count, len(image_hashes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.generate", description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="database file to create")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--links-per-page", type=int, default=PAGE_SIZE)
+    parser.add_argument("--image-size", type=int, default=256, help="width and height of the images, in pixels")
+    parser.add_argument("--formats", default="png", help=f"comma separated, from {', '.join(FORMATS)}")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.5, help="share of links reusing an earlier image")
+    parser.add_argument("--image-ratio", type=float, default=1.0, help="share of links with an image")
+    parser.add_argument("--thumbnails", action="store_true", help="build the thumbnail cache too")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    formats = args.formats.split(",")
+    unknown = [name for name in formats if name not in FORMATS]
+    if unknown:
+        parser.error(f"unknown image format: {', '.join(unknown)}")
+
+    try:
+        count, images = generate(args.path, args.pages, args.links_per_page, args.image_size, formats,
+                                 args.duplicate_ratio, args.image_ratio, args.thumbnails, args.seed)
+    except ValueError as e:
+        print(f"generate: {e}", file=sys.stderr)
+        return 1
+    print(f"Created {args.path}: {args.pages} pages, {count} links, {images} distinct images")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,405 @@
+"""Times the hot paths of QuickLink on a database and writes the results as JSON
+
+    python -m benchmarks.run /tmp/bench.db --output results.json
+    python -m benchmarks.run /tmp/bench.db --baseline results.json
+
+Rendering and window startup need a display. Without one, Xvfb is started
+when it is installed, otherwise those benchmarks are skipped.
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.generate import WORDS
+from store import QuickLinkStore
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Runs of each benchmark
+REPEAT = 50
+
+# Median change (as a share of the baseline) reported as a regression or an improvement
+THRESHOLD = 0.1
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Opens the window in a fresh interpreter and prints its startup times
+GUI_STARTUP = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import ttkbootstrap as ttk
+import gui
+root = ttk.Window(themename="journal")
+app = gui.QuickLink(root, sys.argv[2], started)
+print(json.dumps(app.startup_times))
+app.on_close()
+"""
+
+
+def summarize(samples):
+    """Returns count, min, median, p95 and max of samples given in seconds, as milliseconds"""
+    samples = sorted(samples)
+    n = len(samples)
+    return {
+        "runs": n,
+        "min_ms": samples[0] * 1000,
+        "median_ms": samples[n // 2] * 1000,
+        "p95_ms": samples[min(n - 1, int(n * 0.95))] * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+def measure(fn, repeat):
+    """Times fn(i) for i in range(repeat)"""
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def peak_rss_kb(who="self"):
+    """Peak resident memory of this process (or of its finished children), in KB"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in bytes on macOS, KB elsewhere
+    return usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+
+
+# === BENCHMARKS ===
+
+def bench_sql(path, repeat, rng):
+    """Store operations, on a copy of the database"""
+    results = {}
+    results["open_store"] = measure(lambda i: QuickLinkStore(path).close(), max(5, repeat // 5))
+
+    store = QuickLinkStore(path)
+    try:
+        page_ids = list(store.page_ids)
+        if page_ids:
+            results["get_page"] = measure(lambda i: store.get_page(rng.choice(page_ids)), repeat)
+
+            # Walking forward page by page, like pressing ">" repeatedly
+            def next_page(i):
+                page_id = store.next_page_id(next_page.page_id) or store.first_page_id()
+                next_page.page_id = store.get_page(page_id).id
+            next_page.page_id = page_ids[0]
+            results["next_page"] = measure(next_page, repeat)
+
+            def prev_page(i):
+                page_id = store.prev_page_id(prev_page.page_id) or page_ids[-1]
+                prev_page.page_id = store.get_page(page_id).id
+            prev_page.page_id = page_ids[-1]
+            results["prev_page"] = measure(prev_page, repeat)
+
+            # A block of the all links view, anywhere in the collection
+            results["links_from"] = measure(lambda i: store.links_from(rng.choice(page_ids), 0, 128), repeat)
+
+        # Links go to new pages so positions are always free
+        link_ids = []
+        bench_pages = []
+
+        def add_link(i):
+            if i % store.page_size == 0:
+                bench_pages.append(store.add_page("Benchmark"))
+            link_ids.append(
+                store.add_link(bench_pages[-1], f"https://example.com/{i}", i % store.page_size, f"Link {i}")
+            )
+        results["add_link"] = measure(add_link, repeat)
+        results["delete_link"] = measure(lambda i: store.delete_link(link_ids[i]), repeat)
+
+        # Full pages, built outside the timed part
+        full_pages = []
+        for i in range(repeat):
+            page_id = store.add_page("Benchmark")
+            store.conn.executemany(
+                "INSERT INTO links (page_id, url, position, title) VALUES (?, ?, ?, ?)",
+                [(page_id, f"https://example.com/{i}/{j}", j, f"Link {j}") for j in range(store.page_size)],
+            )
+            store.conn.commit()
+            full_pages.append(page_id)
+        results["delete_page"] = measure(lambda i: store.delete_page(full_pages[i]), repeat)
+        for page_id in bench_pages:
+            store.delete_page(page_id)
+
+        # Whole words, prefixes and typos
+        queries = [rng.choice(WORDS) for _ in range(repeat)]
+        results["search"] = measure(lambda i: store.search(queries[i]), repeat)
+        results["search_prefix"] = measure(lambda i: store.search(queries[i][:3]), repeat)
+        typos = [word[:-2] + word[-1] + word[-2] for word in queries]
+        results["search_typo"] = measure(lambda i: store.search(typos[i]), repeat)
+    finally:
+        store.close()
+    return results
+
+
+def bench_images(path, repeat, rng):
+    """Reading, decoding and scaling of stored images"""
+    from PIL import Image
+    from thumbnails import ThumbnailCache
+
+    store = QuickLinkStore(path)
+    try:
+        image_hashes = [row[0] for row in store.conn.execute("SELECT hash FROM images LIMIT 1000")]
+        if not image_hashes:
+            return {}
+        sample = [rng.choice(image_hashes) for _ in range(repeat)]
+        cache = ThumbnailCache(store.conn, store.thumbnail_size)
+        results = {}
+
+        def read_original(i):
+            with store.open_image(sample[i]) as blob:
+                blob.read()
+        results["read_original"] = measure(read_original, repeat)
+
+        originals = []
+        for image_hash in sample:
+            with store.open_image(image_hash) as blob:
+                originals.append(blob.read())
+
+        def decode_original(i):
+            Image.open(io.BytesIO(originals[i])).load()
+        results["decode_original"] = measure(decode_original, repeat)
+        results["make_thumbnail"] = measure(lambda i: cache.make_thumbnail(originals[i]), repeat)
+
+        thumbnails = [cache.get(image_hash) for image_hash in sample]
+        thumbnails = [data for data in thumbnails if data]
+        if thumbnails:
+            def decode_thumbnail(i):
+                Image.open(io.BytesIO(thumbnails[i % len(thumbnails)])).load()
+            results["decode_thumbnail"] = measure(decode_thumbnail, repeat)
+        return results
+    finally:
+        store.close()
+
+
+def bench_render(path, repeat, rng):
+    """Page changes in the real window, with and without waiting for the images"""
+    import ttkbootstrap as ttk
+    import gui
+
+    root = ttk.Window(themename="journal")
+    app = gui.QuickLink(root, path)
+    page_ids = list(app.store.page_ids)
+    results = {}
+
+    def show(page_id):
+        app.current_page_id = page_id
+        app.load_page(page_id)
+        root.update()
+
+    def render_page(i):
+        show(rng.choice(page_ids))
+    results["render_page"] = measure(render_page, repeat)
+
+    def wait_for_images():
+        while app.image_loader.busy():
+            root.update()
+            time.sleep(0.001)
+
+    # Every image decoded again, then paging back and forth over decoded images
+    def render_page_images(i):
+        app.image_loader.cache.clear()
+        show(rng.choice(page_ids))
+        wait_for_images()
+    results["render_page_images"] = measure(render_page_images, repeat)
+
+    def flip_pages(i):
+        show(page_ids[i % min(2, len(page_ids))])
+        wait_for_images()
+    results["flip_pages_cached"] = measure(flip_pages, repeat)
+
+    # Scrolling the all links view by half a row, then jumping anywhere
+    view = app.all_links_view
+    view.open()
+    root.update()
+
+    def scroll_all_links(i):
+        view.scroll_by(view.TILE_HEIGHT // 2)
+        root.update()
+    results["scroll_all_links"] = measure(scroll_all_links, repeat)
+
+    def jump_all_links(i):
+        view.yview("moveto", rng.random())
+        root.update()
+    results["jump_all_links"] = measure(jump_all_links, repeat)
+    view.close()
+
+    app.on_close()
+    return results
+
+
+def bench_startup(path, repeat, display):
+    """Fresh interpreters: the command line, and the window with and without its snapshot"""
+    runs = max(3, repeat // 10)
+    results = {}
+    cli = [sys.executable, os.path.join(ROOT, "quicklink.py"), "--db", path, "pages"]
+    results["startup_cli"] = measure(lambda i: subprocess.run(cli, check=True, capture_output=True), runs)
+    if not display:
+        return results
+
+    def start_window(snapshot):
+        samples = {}
+        for i in range(runs):
+            if not snapshot and os.path.exists(path + ".snapshot"):
+                os.remove(path + ".snapshot")
+            output = subprocess.run([sys.executable, "-c", GUI_STARTUP, ROOT, path],
+                                    check=True, capture_output=True, text=True).stdout
+            for name, ms in json.loads(output.splitlines()[-1]).items():
+                samples.setdefault(name, []).append(ms / 1000)
+        return samples
+
+    for kind, snapshot in (("cold", False), ("snapshot", True)):
+        # The first run with snapshots writes the one the others paint
+        if snapshot:
+            start_window(True)
+        for name, samples in start_window(snapshot).items():
+            results[f"startup_gui_{kind}_{name}"] = summarize(samples)
+    return results
+
+
+# === DISPLAY ===
+
+def start_display():
+    """Returns (display available, Xvfb process to stop or None)"""
+    if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"):
+        return True, None
+    if not shutil.which("Xvfb"):
+        return False, None
+
+    display = f":{90 + os.getpid() % 100}"
+    process = subprocess.Popen(["Xvfb", display, "-screen", "0", "1280x800x24"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(0.5)
+    if process.poll() is not None:
+        return False, None
+    os.environ["DISPLAY"] = display
+    return True, process
+
+
+# === REPORT ===
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Yields a line per benchmark comparing its median against the baseline"""
+    old = baseline.get("results", {})
+    for name, result in results.items():
+        if name not in old:
+            yield f"{name:<40} {result['median_ms']:>10.3f} ms  (new)"
+            continue
+        before = old[name]["median_ms"]
+        ratio = result["median_ms"] / before if before else 1.0
+        verdict = "slower" if ratio > 1 + threshold else "faster" if ratio < 1 - threshold else ""
+        yield f"{name:<40} {result['median_ms']:>10.3f} ms  {before:>10.3f} ms  {ratio:>6.2f}x  {verdict}"
+
+
+def run(path, repeat=REPEAT, gui=True, seed=0):
+    """Runs every benchmark on a temporary copy of the database, returns the report"""
+    rng = random.Random(seed)
+    display, xvfb = start_display() if gui else (False, None)
+
+    with tempfile.TemporaryDirectory() as directory:
+        copy = os.path.join(directory, "bench.db")
+        # The backup API copies a consistent database, even one that is in use
+        source = sqlite3.connect(path)
+        target = sqlite3.connect(copy)
+        source.backup(target)
+        source.close()
+        target.close()
+
+        store = QuickLinkStore(copy)
+        database = store.stats()
+        store.close()
+
+        results = {}
+        skipped = []
+        try:
+            results.update(bench_sql(copy, repeat, rng))
+            results.update(bench_images(copy, repeat, rng))
+            if display:
+                results.update(bench_render(copy, repeat, rng))
+            else:
+                skipped.append("render (no display)")
+            results.update(bench_startup(copy, repeat, display))
+            if not display:
+                skipped.append("startup_gui (no display)")
+        finally:
+            if xvfb:
+                xvfb.terminate()
+
+    database["path"] = os.path.abspath(path)
+    return {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "seed": seed,
+            "database": database,
+            "skipped": skipped,
+        },
+        "results": results,
+        "peak_rss_kb": {"benchmark": peak_rss_kb("self"), "subprocesses": peak_rss_kb("children")},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="database to benchmark, it is copied first")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help=f"median change reported as slower or faster (default: {THRESHOLD})")
+    parser.add_argument("--no-gui", action="store_true", help="skip rendering and window startup")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        parser.error(f"{args.path} doesn't exist")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    report = run(args.path, max(1, args.repeat), not args.no_gui, args.seed)
+
+    if baseline:
+        print(f"{'benchmark':<40} {'median':>13}  {'baseline':>13}  {'ratio':>7}")
+        for line in compare(report["results"], baseline, args.threshold):
+            print(line)
+    else:
+        print(f"{'benchmark':<40} {'median':>13}  {'p95':>13}  {'max':>13}")
+        for name, result in report["results"].items():
+            print(f"{name:<40} {result['median_ms']:>10.3f} ms  {result['p95_ms']:>10.3f} ms  "
+                  f"{result['max_ms']:>10.3f} ms")
+    for name, kb in report["peak_rss_kb"].items():
+        if kb is not None:
+            print(f"peak RSS ({name}): {kb / 1024:.1f} MB")
+    for name in report["meta"]["skipped"]:
+        print(f"skipped: {name}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""Streaming import and export of bookmarks (Netscape HTML, JSON, CSV)
+
+Records flow through generators, so memory stays bounded by one batch of
+links plus the largest image, whatever the size of the file or database.
+
+    python quicklink.py import bookmarks.html
+    python quicklink.py export backup.json
+"""
+import base64
+import csv
+import html
+import json
+import os
+from collections import namedtuple
+from html.parser import HTMLParser
+
+# Links written per executemany call
+BATCH_SIZE = 1000
+
+# Characters read from a file at a time
+READ_SIZE = 64 * 1024
+
+# Page title of bookmarks outside any folder
+DEFAULT_PAGE_TITLE = "Imported"
+
+Bookmark = namedtuple("Bookmark", "url title page image image_path image_hash", defaults=(None, None, None, None, None))
+
+CSV_FIELDS = ["url", "title", "page", "image_path"]
+
+
+# === READERS ===
+
+class NetscapeParser(HTMLParser):
+    """Collects the links of a browser bookmark export, with their folder"""
+
+    def __init__(self):
+        super().__init__()
+        self.folders = []
+        self.bookmarks = []
+        self.in_folder_title = False
+        self.folder_title = ""
+        self.href = None
+        self.link_title = ""
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "h3":
+            self.in_folder_title = True
+            self.folder_title = ""
+        elif tag == "a":
+            self.href = dict(attrs).get("href")
+            self.link_title = ""
+        elif tag == "dl" and self.folder_title:
+            # The list following a folder title holds the folder contents
+            self.folders.append(self.folder_title.strip())
+            self.folder_title = ""
+
+    def handle_endtag(self, tag):
+        if tag == "h3":
+            self.in_folder_title = False
+        elif tag == "a" and self.href:
+            page = self.folders[-1] if self.folders else None
+            self.bookmarks.append(Bookmark(self.href, self.link_title.strip() or None, page))
+            self.href = None
+        elif tag == "dl" and self.folders:
+            self.folders.pop()
+
+    def handle_data(self, data):
+        if self.in_folder_title:
+            self.folder_title += data
+        elif self.href:
+            self.link_title += data
+
+
+def read_netscape(f):
+    """Yields the bookmarks of a Netscape bookmark file (the export format of every browser)"""
+    parser = NetscapeParser()
+    for chunk in iter(lambda: f.read(READ_SIZE), ""):
+        parser.feed(chunk)
+        yield from parser.bookmarks
+        parser.bookmarks.clear()
+    parser.close()
+    yield from parser.bookmarks
+
+
+def iter_json_array(f):
+    """Yields the items of a top-level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    eof = False
+
+    while True:
+        buffer = buffer.lstrip()
+        if not started and buffer:
+            if buffer[0] != "[":
+                raise ValueError("Expected a JSON array")
+            buffer = buffer[1:]
+            started = True
+            continue
+        if started and buffer[:1] == ",":
+            buffer = buffer[1:]
+            continue
+        if started and buffer[:1] == "]":
+            return
+
+        if started and buffer:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield item
+                buffer = buffer[end:]
+                continue
+
+        # Need more text
+        if eof:
+            raise ValueError("Unexpected end of JSON array")
+        chunk = f.read(READ_SIZE)
+        eof = not chunk
+        buffer += chunk
+
+
+def read_json(f):
+    """Yields the bookmarks of a JSON export (an array of link objects)"""
+    for item in iter_json_array(f):
+        image = item.get("image")
+        yield Bookmark(
+            item["url"], item.get("title"), item.get("page"),
+            base64.b64decode(image) if image else None,
+            item.get("image_path"), item.get("image_hash"),
+        )
+
+
+def read_csv(f):
+    """Yields the bookmarks of a CSV file with url, title, page and image_path columns"""
+    for row in csv.DictReader(f):
+        if row.get("url"):
+            yield Bookmark(row["url"], row.get("title") or None, row.get("page") or None,
+                           image_path=row.get("image_path") or None)
+
+
+READERS = {".html": read_netscape, ".htm": read_netscape, ".json": read_json, ".csv": read_csv}
+
+
+# === IMPORT ===
+
+def resolve_image(store, bookmark, base_dir):
+    """Stores the image of a bookmark, returns its hash or None"""
+    if bookmark.image:
+        return store.add_image(bookmark.image)
+
+    if bookmark.image_path:
+        path = os.path.join(base_dir, os.path.expanduser(bookmark.image_path))
+        try:
+            return store.add_image_file(path)
+        except OSError:
+            return None
+
+    # Exports carry the bytes of an image only the first time it is used
+    if bookmark.image_hash and store.has_image(bookmark.image_hash):
+        return bookmark.image_hash
+    return None
+
+
+def import_bookmarks(store, bookmarks, base_dir=".", batch_size=BATCH_SIZE):
+    """Adds bookmarks to new, filled up pages, in a single transaction
+
+    Consecutive bookmarks of the same folder share pages. Returns the ids of
+    the created pages and the number of links imported.
+    """
+    conn = store.conn
+    page_ids = []
+    batch = []
+    count = 0
+    page_key = None
+    page_id = None
+    part = 0
+    page_size = store.page_size
+    position = page_size
+
+    with conn:
+        for bookmark in bookmarks:
+            # A new folder, or a full page, starts a new page
+            if page_id is None or bookmark.page != page_key or position == page_size:
+                part = part + 1 if page_id is not None and bookmark.page == page_key else 1
+                title = bookmark.page or DEFAULT_PAGE_TITLE
+                if part > 1:
+                    title = f"{title} ({part})"
+                page_id = conn.execute("INSERT INTO pages (title) VALUES (?)", (title,)).lastrowid
+                page_ids.append(page_id)
+                page_key = bookmark.page
+                position = 0
+
+            image_hash = resolve_image(store, bookmark, base_dir)
+            batch.append((page_id, bookmark.url, position, image_hash, bookmark.title))
+            position += 1
+            count += 1
+
+            if len(batch) >= batch_size:
+                conn.executemany(
+                    "INSERT INTO links (page_id, url, position, image_hash, title) VALUES (?, ?, ?, ?, ?)", batch
+                )
+                batch.clear()
+
+        if batch:
+            conn.executemany(
+                "INSERT INTO links (page_id, url, position, image_hash, title) VALUES (?, ?, ?, ?, ?)", batch
+            )
+
+    store.append_page_ids(page_ids)
+    return page_ids, count
+
+
+def import_file(store, path, batch_size=BATCH_SIZE):
+    """Imports a bookmark file, its format is taken from the extension"""
+    reader = READERS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        raise ValueError(f"Unsupported bookmark file: {path}")
+
+    with open(path, encoding="utf-8", newline="") as f:
+        return import_bookmarks(store, reader(f), os.path.dirname(os.path.abspath(path)), batch_size)
+
+
+# === EXPORT ===
+
+def iter_links(conn):
+    """Yields (page_id, page_title, url, title, image_hash) of every link, page by page"""
+    # The cursor fetches rows as they are consumed
+    yield from conn.execute("""
+        SELECT p.id, p.title, l.url, l.title, l.image_hash
+        FROM pages p
+        JOIN links l ON l.page_id = p.id
+        ORDER BY p.id, l.position
+    """)
+
+
+def export_json(store, f, images=True):
+    """Writes every link as a JSON array, each image is embedded the first time it is used"""
+    seen = set()
+    f.write("[")
+    for i, (page_id, page, url, title, image_hash) in enumerate(iter_links(store.conn)):
+        item = {"page": page, "url": url, "title": title}
+        if image_hash and images:
+            item["image_hash"] = image_hash
+            if image_hash not in seen:
+                seen.add(image_hash)
+                with store.open_image(image_hash) as blob:
+                    item["image"] = base64.b64encode(blob.read()).decode("ascii")
+        f.write(",\n" if i else "\n")
+        f.write(json.dumps(item, ensure_ascii=False))
+    f.write("\n]\n")
+
+
+def export_csv(store, f):
+    """Writes every link as CSV, images are left out"""
+    writer = csv.writer(f)
+    writer.writerow(CSV_FIELDS)
+    for page_id, page, url, title, image_hash in iter_links(store.conn):
+        writer.writerow([url, title or "", page or "", ""])
+
+
+def export_netscape(store, f):
+    """Writes every link as a Netscape bookmark file, one folder per page"""
+    f.write("<!DOCTYPE NETSCAPE-Bookmark-file-1>\n")
+    f.write('<META HTTP-EQUIV="Content-Type" CONTENT="text/html; charset=UTF-8">\n')
+    f.write("<TITLE>Bookmarks</TITLE>\n<H1>Bookmarks</H1>\n<DL><p>\n")
+
+    current_page_id = None
+    for page_id, page, url, title, image_hash in iter_links(store.conn):
+        if page_id != current_page_id:
+            if current_page_id is not None:
+                f.write("    </DL><p>\n")
+            f.write(f"    <DT><H3>{html.escape(page or '')}</H3>\n    <DL><p>\n")
+            current_page_id = page_id
+        f.write(f'        <DT><A HREF="{html.escape(url or "")}">{html.escape(title or url or "")}</A>\n')
+
+    if current_page_id is not None:
+        f.write("    </DL><p>\n")
+    f.write("</DL><p>\n")
+
+
+WRITERS = {".html": export_netscape, ".htm": export_netscape, ".json": export_json, ".csv": export_csv}
+
+
+def export_file(store, path):
+    """Exports every link to a bookmark file, its format is taken from the extension"""
+    writer = WRITERS.get(os.path.splitext(path)[1].lower())
+    if writer is None:
+        raise ValueError(f"Unsupported bookmark file: {path}")
+
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer(store, f)
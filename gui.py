@@ -0,0 +1,1556 @@
+import tkinter as tk
+from tkinter import filedialog, simpledialog, messagebox
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+import os
+import bisect
+import multiprocessing
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from store import Link, QuickLinkStore, DEFAULT_DB_PATH, MOST_USED_PAGE_ID, DEFAULT_COLUMNS, DEFAULT_ROWS, MAX_GRID, THUMBNAIL_SIZE, is_busy
+import backup
+import bookmarks
+import health
+import ingest
+import perf
+import sync
+from snapshot import load_snapshot, save_snapshot, snapshot_path
+from thumbnails import ThumbnailCache
+from imageloader import ImageLoader
+from launcher import Launcher, BATCH_CONCURRENCY, BATCH_INTERVAL
+
+# Milliseconds between checks for changes made by other windows or commands
+CHANGE_POLL_INTERVAL = 1000
+
+# Milliseconds between writes of the launches recorded meanwhile
+LAUNCH_FLUSH_INTERVAL = 5000
+
+# Milliseconds after a page is complete before the images of its neighbours are decoded
+PREFETCH_DELAY = 150
+
+# Milliseconds after launch, then between checks, before a scheduled backup is due
+BACKUP_CHECK_DELAY = 60 * 1000
+BACKUP_CHECK_INTERVAL = 60 * 60 * 1000
+
+# Milliseconds after launch, then between batches of link health checks
+HEALTH_CHECK_DELAY = 30 * 1000
+HEALTH_CHECK_INTERVAL = 5 * 60 * 1000
+
+# Outline of the tiles of links the last health check flagged
+HEALTH_STYLES = {"broken": "danger-outline", "redirected": "warning-outline"}
+
+class TileGrid(ttk.Frame):
+    """Grid of link tiles whose widgets are built once and reused by every page"""
+    
+    def __init__(self, master, on_open, rows=4, columns=4, **kwargs):
+        super().__init__(master, **kwargs)
+        self.on_open = on_open
+        self.rows = rows
+        self.columns = columns
+        self.buttons = []
+        
+        for i in range(columns):
+            self.columnconfigure(i, weight=1, uniform="column")
+        for i in range(rows):
+            self.rowconfigure(i, weight=1, uniform="row")
+        
+        for i in range(rows * columns):
+            link_frame = ttk.Frame(self, bootstyle="default")
+            link_frame.grid(row=i // columns, column=i % columns, padx=10, pady=10, sticky="nsew")
+            
+            # The command never changes, it reads the URL of whatever link the tile shows
+            btn = ttk.Button(link_frame, command=lambda position=i: self.open(position))
+            btn.pack(fill=BOTH, expand=YES)
+            btn.position = i  # Store position
+            btn.options = {}  # Options currently applied to the widget
+            self.buttons.append(btn)
+            self.clear(i)
+    
+    def configure_tile(self, btn, **options):
+        """Applies only the options that differ from what the tile already shows"""
+        changed = {key: value for key, value in options.items()
+                   if key not in btn.options or btn.options[key] != value}
+        if changed:
+            btn.configure(**changed)
+            btn.options.update(changed)
+    
+    def show(self, position, link_id, url, title, photo=None, health=None):
+        """Shows a link on a tile, with its image (if available) or title, outlined when it looks broken"""
+        btn = self.buttons[position]
+        btn.link_id = link_id  # Store Link ID for Deletion
+        btn.url = url
+        btn.image = photo  # Keep reference
+        
+        # Use title or "Link" if there is no image
+        self.configure_tile(btn, text="" if photo else (title or "Link"), image=photo or "",
+                            bootstyle=HEALTH_STYLES.get(health, "success-outline"), state="normal")
+    
+    def set_image(self, position, link_id, photo):
+        """Replaces the title placeholder of a tile once its image is decoded"""
+        btn = self.buttons[position]
+        if btn.link_id != link_id:
+            return  # The tile shows another link by now
+        btn.image = photo  # Keep reference
+        self.configure_tile(btn, text="", image=photo)
+    
+    def clear(self, position):
+        """Turns a tile back into an empty slot"""
+        btn = self.buttons[position]
+        btn.link_id = None  # No link ID
+        btn.url = None
+        btn.image = None
+        self.configure_tile(btn, text="Empty", image="", bootstyle="light", state="disabled")
+    
+    def open(self, position):
+        """Opens the link shown on a tile"""
+        btn = self.buttons[position]
+        if btn.url:
+            self.on_open(btn.url, btn.link_id)
+    
+    def find(self, link_id):
+        """Returns the position of the tile showing a link, or None"""
+        for btn in self.buttons:
+            if btn.link_id == link_id:
+                return btn.position
+        return None
+    
+    def first_free_position(self):
+        """Returns the position of the first empty tile, or None if the grid is full"""
+        return self.find(None)
+    
+    def __len__(self):
+        return len(self.buttons)
+
+class SearchOverlay:
+    """Type-to-launch window searching the links of every page"""
+    
+    def __init__(self, root, store, on_open, delay=30):
+        self.root = root
+        self.store = store
+        self.on_open = on_open
+        self.delay = delay  # Milliseconds of typing pause before searching
+        self.window = None
+        self.pending = None
+    
+    def open(self, event=None):
+        """Opens the search window, or focuses it if already open"""
+        if self.window is not None:
+            self.window.lift()
+            self.entry.focus_set()
+            return
+        
+        self.window = ttk.Toplevel(self.root)
+        self.window.title("Search Links")
+        self.window.geometry("600x400")
+        self.window.transient(self.root)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
+        main_frame = ttk.Frame(self.window, padding=15)
+        main_frame.pack(fill=BOTH, expand=YES)
+        
+        # Results update as you type
+        self.query_var = tk.StringVar()
+        self.query_var.trace_add("write", lambda *args: self.schedule())
+        self.entry = ttk.Entry(main_frame, textvariable=self.query_var, font=("Helvetica", 14))
+        self.entry.pack(fill=X, pady=(0, 10))
+        
+        self.results = ttk.Treeview(main_frame, columns=("title", "url", "page"), show="headings")
+        self.results.heading("title", text="Title")
+        self.results.heading("url", text="URL")
+        self.results.heading("page", text="Page")
+        self.results.column("title", width=180)
+        self.results.column("url", width=260)
+        self.results.column("page", width=120)
+        self.results.pack(fill=BOTH, expand=YES)
+        self.urls = {}
+        
+        # Enter opens the top hit (or the selected one), arrows move through the results
+        self.window.bind("<Return>", self.launch)
+        self.window.bind("<Escape>", self.close)
+        self.entry.bind("<Down>", self.focus_results)
+        self.results.bind("<Double-1>", self.launch)
+        
+        self.entry.focus_set()
+    
+    def close(self, event=None):
+        if self.pending is not None:
+            self.root.after_cancel(self.pending)
+            self.pending = None
+        self.window.destroy()
+        self.window = None
+    
+    def schedule(self):
+        """Searches once typing pauses, instead of on every keystroke"""
+        if self.pending is not None:
+            self.root.after_cancel(self.pending)
+        self.pending = self.root.after(self.delay, self.update_results)
+    
+    def update_results(self):
+        self.pending = None
+        self.results.delete(*self.results.get_children())
+        self.urls = {}
+        
+        for result in self.store.search(self.query_var.get()):
+            iid = str(result.link_id)
+            self.urls[iid] = result.url
+            self.results.insert("", "end", iid=iid, values=(
+                result.title or "Untitled link", result.url, result.page_title,
+            ))
+        
+        # The top hit is what Enter opens
+        children = self.results.get_children()
+        if children:
+            self.results.selection_set(children[0])
+    
+    def focus_results(self, event=None):
+        children = self.results.get_children()
+        if children:
+            self.results.focus_set()
+            self.results.focus(self.results.selection()[0] if self.results.selection() else children[0])
+    
+    def launch(self, event=None):
+        """Opens the selected result and closes the window"""
+        # Results of the last keystrokes may still be pending
+        if self.pending is not None:
+            self.root.after_cancel(self.pending)
+            self.update_results()
+        
+        selected = self.results.selection()
+        if not selected:
+            return
+        url = self.urls[selected[0]]
+        self.close()
+        self.on_open(url, int(selected[0]))
+
+class CanvasTile:
+    """Canvas items of one tile of the all links view, reused for whatever link scrolls into it"""
+    
+    def __init__(self, canvas, width, height):
+        self.frame = canvas.create_rectangle(0, 0, width, height, tags="tile")
+        self.image = canvas.create_image(0, 0, anchor=N, tags="tile")
+        self.text = canvas.create_text(0, 0, anchor=N, width=width - 10, tags="tile")
+        self.index = None  # Position of the shown link in the whole collection
+        self.link = None
+        self.photo = None  # Keep reference
+    
+    def items(self):
+        return (self.frame, self.image, self.text)
+
+class AllLinksView:
+    """Scrolling window over every link, only the tiles in view exist and only their rows are read"""
+    
+    TILE_WIDTH = THUMBNAIL_SIZE + 30
+    TILE_HEIGHT = THUMBNAIL_SIZE + 50
+    BLOCK_SIZE = 128  # Links read per query
+    CACHED_BLOCKS = 8  # Blocks kept in memory, the least recently used goes first
+    
+    def __init__(self, root, store, db_path, on_open, delay=60, cache=None):
+        self.root = root
+        self.store = store
+        self.db_path = db_path
+        self.on_open = on_open
+        self.cache = cache
+        self.delay = delay  # Milliseconds of scrolling pause before images are loaded
+        self.window = None
+    
+    def open(self, event=None):
+        """Opens the view, or focuses it if already open"""
+        if self.window is not None:
+            self.window.lift()
+            self.refresh()
+            return
+        
+        self.window = ttk.Toplevel(self.root)
+        self.window.title("All Links")
+        self.window.geometry("900x700")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
+        colors = ttk.Style().colors
+        self.colors = (colors.border, colors.fg)
+        self.canvas = tk.Canvas(self.window, highlightthickness=0, background=colors.bg)
+        self.scrollbar = ttk.Scrollbar(self.window, orient=VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=RIGHT, fill=Y)
+        self.canvas.pack(side=LEFT, fill=BOTH, expand=YES)
+        
+        # Images of this window are decoded by its own loader, so paging the grid doesn't cancel them,
+        # into the cache of the grid
+        self.image_loader = ImageLoader(self.window, self.db_path, THUMBNAIL_SIZE, cache=self.cache,
+                                        report_render=False)
+        self.pending = None
+        self.tiles = []
+        self.tile_items = {}  # Canvas item id -> tile
+        self.columns = 1
+        self.offset = 0  # Pixels scrolled from the top
+        
+        self.canvas.bind("<Configure>", self.layout)
+        self.canvas.tag_bind("tile", "<Button-1>", self.click)
+        self.window.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.window.bind("<Button-4>", lambda event: self.scroll_by(-60))
+        self.window.bind("<Button-5>", lambda event: self.scroll_by(60))
+        self.window.bind("<Prior>", lambda event: self.yview("scroll", -1, "pages"))
+        self.window.bind("<Next>", lambda event: self.yview("scroll", 1, "pages"))
+        self.window.bind("<Home>", lambda event: self.yview("moveto", 0))
+        self.window.bind("<End>", lambda event: self.yview("moveto", 1))
+        self.window.bind("<F5>", lambda event: self.refresh())
+        self.window.bind("<Escape>", self.close)
+        self.window.bind("<Destroy>", self.on_destroy)
+        
+        self.refresh()
+    
+    def close(self, event=None):
+        self.window.destroy()
+    
+    def on_destroy(self, event):
+        """Stops the timers and the image loader of the window, however it is destroyed"""
+        # The children of the window get the event too
+        if event.widget is not self.window:
+            return
+        if self.pending is not None:
+            self.window.after_cancel(self.pending)
+            self.pending = None
+        self.image_loader.close()
+        self.window = None
+        self.blocks = None
+    
+    def refresh(self):
+        """Re-reads the number of links of every page, after links were added or deleted"""
+        # Index of the first link of every page, the only data kept for the whole collection
+        self.page_ids = []
+        self.page_starts = []
+        self.total = 0
+        for page_id, count in self.store.page_link_counts():
+            self.page_ids.append(page_id)
+            self.page_starts.append(self.total)
+            self.total += count
+        
+        self.blocks = OrderedDict()
+        for tile in self.tiles:
+            tile.index = None
+        self.window.title(f"All Links ({self.total})")
+        self.layout()
+    
+    def block(self, number):
+        """Returns the links of a block
+
+        The (page_id, position) index seeks to the page of the first link, then
+        OFFSET skips the links before it on that page only, less than a page.
+        """
+        if number in self.blocks:
+            self.blocks.move_to_end(number)
+            return self.blocks[number]
+        
+        start = number * self.BLOCK_SIZE
+        i = bisect.bisect_right(self.page_starts, start) - 1
+        rows = self.store.links_from(self.page_ids[i], start - self.page_starts[i], self.BLOCK_SIZE)
+        self.blocks[number] = rows
+        if len(self.blocks) > self.CACHED_BLOCKS:
+            self.blocks.popitem(last=False)
+        return rows
+    
+    def link_at(self, index):
+        rows = self.block(index // self.BLOCK_SIZE)
+        i = index % self.BLOCK_SIZE
+        return rows[i] if i < len(rows) else None
+    
+    def content_height(self):
+        return -(-self.total // self.columns) * self.TILE_HEIGHT
+    
+    def layout(self, event=None):
+        """Sizes the tile pool to the window, one more row than fits so scrolling never shows a gap"""
+        width = max(self.canvas.winfo_width(), self.TILE_WIDTH)
+        height = max(self.canvas.winfo_height(), self.TILE_HEIGHT)
+        columns = max(1, width // self.TILE_WIDTH)
+        count = (height // self.TILE_HEIGHT + 2) * columns
+        
+        # Links move to other tiles when the number of columns or tiles changes
+        if columns != self.columns or count != len(self.tiles):
+            first = self.offset // self.TILE_HEIGHT * self.columns
+            self.columns = columns
+            self.offset = first // columns * self.TILE_HEIGHT
+            for tile in self.tiles:
+                tile.index = None
+        
+        while len(self.tiles) < count:
+            tile = CanvasTile(self.canvas, self.TILE_WIDTH - 10, self.TILE_HEIGHT - 10)
+            self.canvas.itemconfigure(tile.frame, outline=self.colors[0])
+            self.canvas.itemconfigure(tile.text, fill=self.colors[1])
+            for item in tile.items():
+                self.tile_items[item] = tile
+            self.tiles.append(tile)
+        while len(self.tiles) > count:
+            tile = self.tiles.pop()
+            for item in tile.items():
+                del self.tile_items[item]
+                self.canvas.delete(item)
+        
+        self.scroll_to(self.offset)
+    
+    def yview(self, *args):
+        """Scrollbar command"""
+        height = self.canvas.winfo_height()
+        if args[0] == "moveto":
+            self.scroll_to(float(args[1]) * self.content_height())
+        elif args[0] == "scroll":
+            step = height - self.TILE_HEIGHT if args[2] == "pages" else self.TILE_HEIGHT // 2
+            self.scroll_by(int(args[1]) * max(step, self.TILE_HEIGHT // 2))
+    
+    def on_mouse_wheel(self, event):
+        # Windows reports multiples of 120 per notch, macOS small steps
+        if abs(event.delta) >= 120:
+            self.scroll_by(-event.delta // 2)
+        else:
+            self.scroll_by(-event.delta * 20)
+    
+    def scroll_by(self, pixels):
+        self.scroll_to(self.offset + pixels)
+    
+    def scroll_to(self, offset):
+        height = self.canvas.winfo_height()
+        total_height = self.content_height()
+        self.offset = int(max(0, min(offset, total_height - height)))
+        self.redraw()
+        if total_height > 0:
+            self.scrollbar.set(self.offset / total_height, min(1.0, (self.offset + height) / total_height))
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def redraw(self):
+        """Moves the pooled tiles to the links in view"""
+        # A link always uses the tile index % pool size, so links still in view keep their tile
+        first = self.offset // self.TILE_HEIGHT * self.columns
+        for index in range(first, first + len(self.tiles)):
+            tile = self.tiles[index % len(self.tiles)]
+            row, column = divmod(index, self.columns)
+            x = column * self.TILE_WIDTH + 5
+            y = row * self.TILE_HEIGHT - self.offset + 5
+            
+            if index >= self.total:
+                for item in tile.items():
+                    self.canvas.itemconfigure(item, state="hidden")
+                tile.index = None
+                continue
+            
+            if tile.index != index:
+                # The tile shows another link now
+                tile.index = index
+                tile.link = self.link_at(index)
+                tile.photo = None
+                link_id, page_id, position, url, title, image_hash = tile.link
+                self.canvas.itemconfigure(tile.image, image="")
+                self.canvas.itemconfigure(tile.text, text=title or url)
+                for item in tile.items():
+                    self.canvas.itemconfigure(item, state="normal")
+            
+            self.canvas.coords(tile.frame, x, y, x + self.TILE_WIDTH - 10, y + self.TILE_HEIGHT - 10)
+            self.canvas.coords(tile.image, x + self.TILE_WIDTH // 2 - 5, y + 5)
+            self.canvas.coords(tile.text, x + self.TILE_WIDTH // 2 - 5, y + THUMBNAIL_SIZE + 10)
+        
+        # Images are only requested once scrolling pauses
+        if self.pending is not None:
+            self.window.after_cancel(self.pending)
+        self.pending = self.window.after(self.delay, self.load_images)
+    
+    def load_images(self):
+        self.pending = None
+        self.image_loader.cancel()
+        for tile in self.tiles:
+            if tile.index is not None and tile.photo is None and tile.link[5]:
+                self.image_loader.load(
+                    tile.link[5], None,
+                    lambda photo, tile=tile, index=tile.index: self.set_image(tile, index, photo),
+                )
+    
+    def set_image(self, tile, index, photo):
+        if tile.index != index:
+            return  # Scrolled to another link by now
+        tile.photo = photo
+        self.canvas.itemconfigure(tile.image, image=photo)
+    
+    def click(self, event):
+        tile = self.tile_items.get(self.canvas.find_withtag("current")[0])
+        if tile is not None and tile.index is not None:
+            self.on_open(tile.link[3], tile.link[0])
+
+class QuickLink:
+    def __init__(self, root, db_path=DEFAULT_DB_PATH, started=None):
+        self.root = root
+        self.db_path = db_path
+        self.started = time.perf_counter() if started is None else started
+        self.root.title("QuickLink - Quick Access to Everything")
+        self.root.geometry("1100x700")
+        
+        # Variables
+        self.current_page_id = None
+        self.shown_links = {}  # Position -> link shown on the tile
+        self.startup_times = {}
+        
+        # Tile images are decoded off the Tk thread, and kept for pages shown again
+        self.image_loader = ImageLoader(self.root, self.db_path, THUMBNAIL_SIZE)
+        self.prefetch_job = None
+        
+        # Links open on worker threads, the result is shown in the status bar
+        self.launcher = Launcher(self.root, self.on_launch_result)
+        self.batch_failures = []
+        self.saved_selections = {}  # Page id -> link ids last picked in "Open Links..."
+        
+        # The page shown when the app was last closed is painted before touching the database
+        self.snapshot_path = snapshot_path(self.db_path)
+        snapshot = load_snapshot(self.snapshot_path)
+        if snapshot and snapshot.thumbnail_size != THUMBNAIL_SIZE:
+            snapshot = None
+        
+        # Create main layout
+        self.create_ui(*(snapshot.grid if snapshot else (DEFAULT_ROWS, DEFAULT_COLUMNS)))
+        
+        if snapshot:
+            self.show_page(snapshot.page, decode_now=True)
+            self.mark_painted("first_paint")
+        
+        # Initialize database
+        self.store = QuickLinkStore(self.db_path)
+        if self.store.migration_messages:
+            self.status_label.config(text="; ".join(self.store.migration_messages))
+        
+        # Pre-scaled tiles, backfilled once after images were moved by a migration
+        if self.store.migration_messages:
+            ThumbnailCache(self.store.conn, self.store.thumbnail_size).backfill()
+        
+        # Long jobs (bookmark import/export) run here so the window stays responsive
+        self.background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="quicklink-job")
+        self.image_pool = None
+        
+        # Quick launcher over every page
+        self.search_overlay = SearchOverlay(self.root, self.store, self.open_url)
+        self.root.bind("<Control-k>", self.search_overlay.open)
+        self.root.bind("<Control-f>", self.search_overlay.open)
+        
+        # Scrolling view of every link
+        self.all_links_view = AllLinksView(self.root, self.store, self.db_path, self.open_url,
+                                           cache=self.image_loader.cache)
+        self.root.bind("<Control-l>", self.all_links_view.open)
+        
+        # The grid size is a setting of the database
+        if (self.tile_grid.rows, self.tile_grid.columns) != (self.store.rows, self.store.columns):
+            self.build_tile_grid(self.store.rows, self.store.columns)
+            snapshot = None
+        
+        # The snapshot stays on screen unless the database changed since it was saved
+        if (snapshot and self.store.has_page(snapshot.page.id)
+                and snapshot.counter == self.store.change_counter()):
+            self.current_page_id = snapshot.page.id
+        else:
+            self.load_initial_page(snapshot.page.id if snapshot else None)
+        if "first_paint" not in self.startup_times:
+            self.mark_painted("first_paint")
+        self.mark_painted("ready")
+        
+        # Backups run on the background thread once the last one is older than the interval
+        self.backing_up = False
+        self.root.after(BACKUP_CHECK_DELAY, self.scheduled_backup)
+        
+        # Links are checked a batch at a time, the tiles redraw through poll_changes
+        self.checking_links = False
+        self.root.after(HEALTH_CHECK_DELAY, self.scheduled_link_check)
+        
+        # Launches are recorded in memory and written every few seconds, sooner once a batch is full
+        self.launch_flush = self.root.after(LAUNCH_FLUSH_INTERVAL, self.flush_launches)
+        
+        # Changes made by other processes are picked up from the change log
+        self.root.report_callback_exception = self.report_error
+        self.data_version = self.store.data_version()
+        self.last_change = self.store.change_counter()
+        self.root.after(CHANGE_POLL_INTERVAL, self.poll_changes)
+        
+        # Live breakdown of the last page render
+        if perf.enabled:
+            self.root.bind("<F12>", self.toggle_perf_overlay)
+            self.update_perf_overlay()
+    
+    def mark_painted(self, name):
+        """Flushes pending drawing and records the time since launch, in milliseconds"""
+        self.root.update()
+        seconds = time.perf_counter() - self.started
+        self.startup_times[name] = seconds * 1000
+        if perf.enabled:
+            perf.record(f"startup.{name}", seconds)
+    
+    def open_search(self):
+        self.search_overlay.open()
+    
+    def create_ui(self, rows=DEFAULT_ROWS, columns=DEFAULT_COLUMNS):
+        """Creates the user interface"""
+        # Menu
+        menubar = tk.Menu(self.root)
+        file_menu = tk.Menu(menubar, tearoff=False)
+        file_menu.add_command(label="Import Bookmarks...", command=self.import_bookmarks)
+        file_menu.add_command(label="Export Bookmarks...", command=self.export_bookmarks)
+        file_menu.add_separator()
+        file_menu.add_command(label="Back Up Now", command=self.back_up)
+        file_menu.add_command(label="Restore Backup...", command=self.restore_backup)
+        file_menu.add_command(label="Sync With...", command=self.sync_with)
+        menubar.add_cascade(label="File", menu=file_menu)
+        links_menu = tk.Menu(menubar, tearoff=False)
+        links_menu.add_command(label="Open All on Page", command=self.open_all_links)
+        links_menu.add_command(label="Open Links...", command=self.open_links)
+        links_menu.add_command(label="Stop Opening Links", command=self.launcher.cancel_batch)
+        links_menu.add_separator()
+        links_menu.add_command(label="Check Links Now", command=self.check_links)
+        menubar.add_cascade(label="Links", menu=links_menu)
+        view_menu = tk.Menu(menubar, tearoff=False)
+        view_menu.add_command(label="Most Used", command=self.show_most_used)
+        view_menu.add_command(label="All Links (Ctrl+L)", command=self.open_all_links_view)
+        view_menu.add_command(label="Grid Size...", command=self.change_grid_size)
+        menubar.add_cascade(label="View", menu=view_menu)
+        if perf.enabled:
+            debug_menu = tk.Menu(menubar, tearoff=False)
+            debug_menu.add_command(label="Show/Hide Timings (F12)", command=self.toggle_perf_overlay)
+            debug_menu.add_command(label="Save Timings...", command=self.dump_perf)
+            debug_menu.add_command(label="Start/Stop Profiling", command=self.toggle_profile)
+            menubar.add_cascade(label="Debug", menu=debug_menu)
+        self.root.config(menu=menubar)
+        
+        # Main frame
+        self.main_frame = ttk.Frame(self.root, padding=10)
+        self.main_frame.pack(fill=BOTH, expand=YES)
+
+        # === ROW 1: CENTERED BUTTONS ===
+        self.buttons_frame = ttk.Frame(self.main_frame)
+        self.buttons_frame.pack(pady=(0, 15))  # Without fill=X, so as not to expand to the full width
+
+        # Centered buttons
+        self.add_link_btn = ttk.Button(
+            self.buttons_frame, text="New Link", command=self.add_link, bootstyle="success", width=15
+        )
+        self.add_link_btn.pack(side=LEFT, padx=5)
+
+        self.del_link_btn = ttk.Button(
+            self.buttons_frame, text="Delete Link", command=self.delete_link, bootstyle="danger", width=12
+        )
+        self.del_link_btn.pack(side=LEFT, padx=5)
+
+        self.change_title_btn = ttk.Button(
+            self.buttons_frame, text="Page Title", command=self.change_page_title, bootstyle="info", width=18
+        )
+        self.change_title_btn.pack(side=LEFT, padx=5)
+
+        self.add_page_btn = ttk.Button(
+            self.buttons_frame, text="New Page", command=self.add_page, bootstyle="success", width=18
+        )
+        self.add_page_btn.pack(side=LEFT, padx=5)
+
+        self.del_page_btn = ttk.Button(
+            self.buttons_frame, text="Del. Current Page", command=self.delete_page, bootstyle="danger", width=15
+        )
+        self.del_page_btn.pack(side=LEFT, padx=5)
+
+        self.search_btn = ttk.Button(
+            self.buttons_frame, text="Search (Ctrl+K)", command=self.open_search, bootstyle="info", width=15
+        )
+        self.search_btn.pack(side=LEFT, padx=5)
+        
+        # === LINE 2: PAGE TITLE ===
+        self.title_frame = ttk.Frame(self.main_frame)
+        self.title_frame.pack(fill=X, pady=(0, 20))
+        
+        self.title_label = ttk.Label(self.title_frame, text="Untitled page", 
+                                    font=("Helvetica", 22, "bold"))
+        self.title_label.pack(anchor=CENTER)
+        
+        # === LINE 3: LINKS AND NAVIGATION ===
+        self.content_frame = ttk.Frame(self.main_frame)
+        self.content_frame.pack(fill=BOTH, expand=YES)
+        
+        # Navigation button on the left
+        self.prev_btn = ttk.Button(self.content_frame, text="<", command=self.prev_page, 
+                                  bootstyle="secondary", width=4, padding=10)
+        self.prev_btn.pack(side=LEFT, fill=Y, padx=(0, 15))
+        
+        # Central container for links
+        self.links_container = ttk.Frame(self.content_frame)
+        self.links_container.pack(side=LEFT, fill=BOTH, expand=YES)
+        
+        # Link grid, its tiles are reconfigured instead of rebuilt on every page
+        self.tile_grid = None
+        self.build_tile_grid(rows, columns)
+        
+        # Navigation button on the right
+        self.next_btn = ttk.Button(self.content_frame, text=">", command=self.next_page, 
+                                  bootstyle="secondary", width=4, padding=10)
+        self.next_btn.pack(side=RIGHT, fill=Y, padx=(15, 0))
+        
+        # === LINE 4: STATUS ===
+        self.status_frame = ttk.Frame(self.main_frame)
+        self.status_frame.pack(fill=X, pady=(10, 0))
+        self.status_label = ttk.Label(self.status_frame, text="", bootstyle="secondary")
+        self.status_label.pack(side=LEFT)
+        
+        # Timings of the last page, only with the performance hooks on
+        self.perf_label = ttk.Label(self.status_frame, text="", bootstyle="info")
+        if perf.enabled:
+            self.perf_label.pack(side=RIGHT)
+    
+    def build_tile_grid(self, rows, columns):
+        """(Re)creates the grid of tiles with a new size"""
+        self.image_loader.cancel()
+        if self.tile_grid is not None:
+            self.tile_grid.destroy()
+        self.tile_grid = TileGrid(self.links_container, self.open_url, rows, columns)
+        self.tile_grid.pack(fill=BOTH, expand=YES)
+    
+    def change_grid_size(self):
+        """Changes the number of rows and columns of every page"""
+        dialog = ttk.Toplevel(self.root)
+        dialog.title("Grid Size")
+        dialog.resizable(False, False)
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        main_frame = ttk.Frame(dialog, padding=15)
+        main_frame.pack(fill=BOTH, expand=YES)
+        
+        rows_var = tk.IntVar(value=self.store.rows)
+        columns_var = tk.IntVar(value=self.store.columns)
+        ttk.Label(main_frame, text="Rows:").grid(row=0, column=0, sticky=W, pady=5)
+        ttk.Spinbox(main_frame, from_=1, to=MAX_GRID, textvariable=rows_var, width=5).grid(row=0, column=1, pady=5)
+        ttk.Label(main_frame, text="Columns:").grid(row=1, column=0, sticky=W, pady=5)
+        ttk.Spinbox(main_frame, from_=1, to=MAX_GRID, textvariable=columns_var, width=5).grid(row=1, column=1, pady=5)
+        
+        def on_submit():
+            try:
+                rows, columns = rows_var.get(), columns_var.get()
+            except tk.TclError:
+                messagebox.showerror("Error", "Please enter whole numbers.", parent=dialog)
+                return
+            
+            smaller = rows * columns < self.store.page_size
+            if smaller and not messagebox.askyesno(
+                "Smaller Grid", "Links that no longer fit move to free tiles or to new pages. Continue?", parent=dialog
+            ):
+                return
+            try:
+                moved = self.store.set_grid(rows, columns)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e), parent=dialog)
+                return
+            dialog.destroy()
+            
+            self.build_tile_grid(rows, columns)
+            self.load_page(self.current_page_id)
+            if moved:
+                self.status_label.config(text=f"Moved {moved} links that no longer fit their page")
+        
+        ttk.Button(main_frame, text="Apply", command=on_submit, bootstyle="success").grid(
+            row=2, column=0, columnspan=2, pady=(15, 0)
+        )
+    
+    def open_all_links_view(self):
+        self.all_links_view.open()
+    
+    def load_initial_page(self, page_id=None):
+        """Loads the given page, the first page, or creates one if there are no pages"""
+        if not self.store.has_page(page_id):
+            page_id = self.store.first_page_id()
+        
+        if page_id is None:
+            # Create first page if not exists
+            page_id = self.store.add_page('Quick Access to Everything')
+        
+        self.current_page_id = page_id
+        self.load_page(page_id)
+    
+    @perf.timed("gui.load_page")
+    def load_page(self, page_id):
+        """Loads a specific page"""
+        if perf.enabled:
+            perf.begin_render()
+        
+        # Images still being decoded for the previous page are no longer needed
+        self.image_loader.cancel()
+        
+        self.show_page(self.store.get_page(page_id))
+        
+        # Otherwise the render ends once the image loader delivered the last image
+        if perf.enabled and not self.image_loader.busy():
+            perf.end_render()
+        
+        # So that < and > usually find their images decoded already
+        if self.prefetch_job is not None:
+            self.root.after_cancel(self.prefetch_job)
+        self.prefetch_job = self.root.after(PREFETCH_DELAY, self.prefetch_neighbours)
+    
+    @perf.timed("gui.show_page", "widgets")
+    def show_page(self, page, decode_now=False):
+        """Shows a page, cached thumbnails are decoded right away with decode_now"""
+        self.title_label.config(text=page.title)
+        self.shown_links = {}
+        
+        # Reconfigure the existing tiles, titles are shown until the images arrive
+        for i in range(len(self.tile_grid)):
+            self.show_tile(i, page.links.get(i), decode_now)
+        
+        # Update navigation buttons
+        self.update_navigation_buttons(page)
+        
+        # The "Most Used" page is computed, its links are edited on their own pages
+        state = "disabled" if page.id == MOST_USED_PAGE_ID else "normal"
+        for btn in (self.add_link_btn, self.del_link_btn, self.change_title_btn, self.del_page_btn):
+            btn.config(state=state)
+    
+    def show_tile(self, position, link, decode_now=False):
+        """Shows a link, or an empty slot, on one tile"""
+        if link:
+            self.shown_links[position] = link
+            if decode_now and link.thumbnail:
+                photo = self.image_loader.load_now(link.image_hash, link.thumbnail)
+                self.tile_grid.show(position, link.id, link.url, link.title, photo, link.health)
+                return
+            self.tile_grid.show(position, link.id, link.url, link.title, health=link.health)
+            if link.image_hash:  # If you have an image
+                self.load_tile_image(position, link.id, link.image_hash, link.thumbnail)
+        else:
+            # Empty tile if there is no link at this position
+            self.shown_links.pop(position, None)
+            self.tile_grid.clear(position)
+    
+    def poll_changes(self):
+        """Redraws what other processes changed, an unchanged database costs two cheap reads"""
+        self.root.after(CHANGE_POLL_INTERVAL, self.poll_changes)
+        
+        # The writes of this window grow the log too, however long it stays open
+        self.store.prune_change_log()
+        
+        data_version = self.store.data_version()
+        if data_version == self.data_version:
+            return
+        self.data_version = data_version
+        
+        changes = self.store.changes_since(self.last_change)
+        if changes is None:
+            # The log was pruned past what this window has seen
+            self.last_change = self.store.change_counter()
+            pages = {None: {None}}
+        else:
+            self.last_change, pages = changes
+            if not pages:
+                return  # Only thumbnails or settings were written
+        
+        # The grid size changed, or too much changed to tell
+        if None in pages:
+            self.reload()
+        else:
+            # Pages were created, renamed or deleted, or links opened (the "Most Used" page)
+            page_changed = any(None in positions for page_id, positions in pages.items() if page_id)
+            if page_changed:
+                self.store.load_page_index()
+            
+            if self.current_page_id == MOST_USED_PAGE_ID:
+                self.load_page(self.current_page_id)  # Any change may reorder it
+            elif self.current_page_id not in self.store.page_index:
+                self.load_initial_page()
+            elif self.current_page_id in pages or page_changed or MOST_USED_PAGE_ID in pages:
+                self.refresh_page(pages.get(self.current_page_id, ()))
+        
+        if self.all_links_view.window is not None:
+            self.all_links_view.refresh()
+    
+    def reload(self):
+        """Reads the settings, the pages and the current page again"""
+        self.store.load_settings()
+        self.store.load_page_index()
+        if (self.tile_grid.rows, self.tile_grid.columns) != (self.store.rows, self.store.columns):
+            self.build_tile_grid(self.store.rows, self.store.columns)
+        self.load_initial_page(self.current_page_id)
+    
+    def refresh_page(self, positions):
+        """Redraws the title, the navigation and the given tiles of the current page"""
+        page = self.store.get_page(self.current_page_id)
+        self.title_label.config(text=page.title)
+        for position in positions:
+            if position is None or position >= len(self.tile_grid):
+                continue
+            # Changes this window made itself are already on screen
+            link, shown = page.links.get(position), self.shown_links.get(position)
+            if (link is None and shown is None) or (link and shown and link[:5] == shown[:5]
+                                                    and link.health == shown.health):
+                continue
+            self.show_tile(position, link)
+        self.update_navigation_buttons(page)
+    
+    def report_error(self, exc_type, exc, tb):
+        """Shows a locked database as a message, other errors are printed as usual"""
+        if isinstance(exc, sqlite3.OperationalError) and is_busy(exc):
+            messagebox.showwarning("Database Busy",
+                                   "Another QuickLink window or command is writing to the database. "
+                                   "Please try again in a moment.")
+        else:
+            traceback.print_exception(exc_type, exc, tb)
+    
+    def prefetch_neighbours(self):
+        """Decodes the images of the previous and next pages once the current one is complete"""
+        if self.image_loader.busy():
+            self.prefetch_job = self.root.after(PREFETCH_DELAY, self.prefetch_neighbours)
+            return
+        self.prefetch_job = None
+        
+        page = self.store.get_page(self.current_page_id)
+        if page is None:
+            return
+        for page_id in (page.next_id, page.prev_id):
+            if page_id is not None:
+                self.image_loader.prefetch(
+                    (link.image_hash, link.thumbnail) for link in self.store.get_page(page_id).links.values()
+                    if link.image_hash
+                )
+    
+    def load_tile_image(self, position, link_id, image_hash, thumbnail):
+        """Decodes the image of a tile in the background"""
+        # Thumbnails missing from the cache are built by the worker on first view
+        self.image_loader.load(
+            image_hash, thumbnail,
+            lambda photo: self.tile_grid.set_image(position, link_id, photo),
+        )
+    
+    def add_link(self):
+        """Add a new link"""
+        # Check if the page is full
+        count = self.store.count_links(self.current_page_id)
+        
+        if count >= self.store.page_size:
+            messagebox.showinfo("Limit Reached",
+                                f"This page already contains the maximum of {self.store.page_size} links.")
+            return
+        
+        # Create custom dialog window
+        dialog = ttk.Toplevel(self.root)
+        dialog.title("Add New Link")
+        dialog.geometry("400x200")
+        dialog.resizable(False, False)
+        
+        # Make the window modal
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        # Variables to store values
+        url_var = tk.StringVar()
+        title_var = tk.StringVar()
+        
+        # Main frame
+        main_frame = ttk.Frame(dialog, padding=15)
+        main_frame.pack(fill=BOTH, expand=YES)
+        
+        # URL
+        url_frame = ttk.Frame(main_frame)
+        url_frame.pack(fill=X, pady=(0, 10))
+        ttk.Label(url_frame, text="Website URL:", width=12).pack(side=LEFT)
+        ttk.Entry(url_frame, textvariable=url_var, width=40).pack(side=LEFT, fill=X, expand=YES)
+        
+        # Title
+        title_frame = ttk.Frame(main_frame)
+        title_frame.pack(fill=X, pady=(0, 20))
+        ttk.Label(title_frame, text="Link title:", width=12).pack(side=LEFT)
+        ttk.Entry(title_frame, textvariable=title_var, width=40).pack(side=LEFT, fill=X, expand=YES)
+        
+        # Dialogue result
+        result = {"url": None, "title": None, "submitted": False}
+        
+        def on_submit():
+            # Validate basic URL
+            url = url_var.get()
+            if not url:
+                messagebox.showwarning("Invalid URL", "Please enter a valid URL.")
+                return
+            
+            # Comment this condition to open PDF files or other types of files
+            """ if not (url.startswith("http://") or url.startswith("https://")):
+                url = "https://" + url """
+                
+            result["url"] = url
+            result["title"] = title_var.get()
+            result["submitted"] = True
+            dialog.destroy()
+        
+        def on_cancel():
+            dialog.destroy()
+        
+        # Buttons
+        buttons_frame = ttk.Frame(main_frame)
+        buttons_frame.pack(fill=X)
+        
+        ttk.Button(buttons_frame, text="Cancel", command=on_cancel, 
+                bootstyle="secondary", width=10).pack(side=RIGHT, padx=(5, 0))
+        ttk.Button(buttons_frame, text="Add", command=on_submit, 
+                bootstyle="success", width=10).pack(side=RIGHT)
+        
+        # Centralize dialogue
+        dialog.update_idletasks()
+        width = dialog.winfo_width()
+        height = dialog.winfo_height()
+        x = (dialog.winfo_screenwidth() // 2) - (width // 2)
+        y = (dialog.winfo_screenheight() // 2) - (height // 2)
+        dialog.geometry('{}x{}+{}+{}'.format(width, height, x, y))
+        
+        # Wait until the dialog is closed
+        dialog.wait_window()
+        
+        # If the form has been submitted, continue with adding the link
+        if result["submitted"] and result["url"]:
+            url = result["url"]
+            title = result["title"]
+            
+            # Ask if you want to add an image
+            add_image = messagebox.askyesno("Add Image", "Want to add an image to this link?")
+            page_id = self.current_page_id
+            
+            if add_image:
+                file_path = filedialog.askopenfilename(title="Select an image", 
+                                                filetypes=[("Image Files", "*.png *.jpg *.jpeg *.gif *.bmp *.webp")])
+                if file_path:
+                    # The image is checked, scaled down and re-encoded in another process
+                    self.status_label.config(text="Preparing image...")
+                    future = self.ingest_pool().submit(ingest.normalize_file, file_path, *ingest.settings(self.store))
+                    
+                    def on_error(error):
+                        messagebox.showwarning("Image", f"The link is added without its image.\n\n{error}")
+                        self.finish_add_link(page_id, url, title, None)
+                    
+                    self.when_done(
+                        future, lambda data: self.finish_add_link(page_id, url, title, data),
+                        on_error,
+                    )
+                    return
+            
+            self.finish_add_link(page_id, url, title, None)
+    
+    def finish_add_link(self, page_id, url, title, image_data):
+        """Inserts a link and its prepared image (or None) on the first free tile of its page"""
+        # The page may have been deleted while the image was prepared
+        if page_id not in self.store.page_index:
+            page_id = self.store.first_page_id()
+        position = self.store.first_free_position(page_id)
+        if position is None:
+            messagebox.showinfo("Limit Reached",
+                                f"This page already contains the maximum of {self.store.page_size} links.")
+            return
+        
+        # Insert into database, the image only once it has a link
+        image_hash = self.store.add_image(image_data) if image_data is not None else None
+        link_id = self.store.add_link(page_id, url, position, title, image_hash)
+        self.status_label.config(text=f"Added {url}")
+        
+        # Only the new tile changes
+        if page_id == self.current_page_id:
+            self.show_tile(position, Link(link_id, url, position, title, image_hash, None))
+    
+    def ingest_pool(self):
+        """Process pool preparing uploaded images, started on first use
+
+        The worker is spawned, forking would copy the whole Tk process along
+        with locks its other threads may hold.
+        """
+        if self.image_pool is None:
+            self.image_pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        return self.image_pool
+
+    def delete_link(self):
+        """Deletes a link from the current page"""
+        # Check for links to delete
+        count = self.store.count_links(self.current_page_id)
+        
+        if count == 0:
+            messagebox.showinfo("No Link", "There are no links that can be deleted on this page.")
+            return
+        
+        # Create window for selecting links to delete
+        delete_window = ttk.Toplevel(self.root)
+        delete_window.title("Delete Link")
+        delete_window.geometry("450x500")
+        
+        ttk.Label(delete_window, text="Select a link to delete:").pack(pady=10)
+        
+        # List of links
+        links_listbox = ttk.Treeview(delete_window, columns=("title", "url"), show="headings")
+        links_listbox.heading("title", text="Title")
+        links_listbox.heading("url", text="URL")
+        links_listbox.column("title", width=150)
+        links_listbox.column("url", width=300)
+        links_listbox.pack(fill=BOTH, expand=YES, padx=10, pady=10)
+        
+        # Populate list with links from current page
+        links = self.store.list_links(self.current_page_id)
+        
+        for link in links:
+            # Truncate URL for display
+            display_url = link[1]
+            if len(display_url) > 40:
+                display_url = display_url[:37] + "..."
+                
+            # Use title or "Link" if there is no title
+            display_title = link[2] if link[2] else "Untitled link"
+            
+            links_listbox.insert("", "end", values=(display_title, display_url), iid=link[0])
+        
+        # Delete button
+        def confirm_delete():
+            selected = links_listbox.selection()
+            if selected:
+                link_id = selected[0]
+                
+                if messagebox.askyesno("Confirm Deletion", "Are you sure you want to delete this link??"):
+                    self.store.delete_link(int(link_id))
+                    delete_window.destroy()
+                    
+                    # Only the deleted tile changes
+                    position = self.tile_grid.find(int(link_id))
+                    if position is not None:
+                        self.show_tile(position, None)
+            else:
+                messagebox.showinfo("Selection required", "Please select a link to delete.")
+        
+        ttk.Button(delete_window, text="Delete Selected Link", bootstyle="danger", 
+                 command=confirm_delete).pack(pady=10)
+    
+    def change_page_title(self):
+        """Changes the title of the current page"""
+        current_title = self.title_label.cget("text")
+        new_title = simpledialog.askstring("Change Title", "Enter new page title:", initialvalue=current_title)
+        
+        if new_title:
+            self.store.rename_page(self.current_page_id, new_title)
+            self.title_label.config(text=new_title)
+    
+    def add_page(self):
+        """Add a new page"""
+        title = simpledialog.askstring("New Page", "Enter the title of the new page:", initialvalue="New Page")
+        
+        if title:
+            page_id = self.store.add_page(title)
+            self.current_page_id = page_id
+            self.load_page(page_id)
+    
+    def delete_page(self):
+        """Deletes the current page"""
+        # Count total pages
+        total_pages = self.store.count_pages()
+        
+        if total_pages <= 1:
+            messagebox.showinfo("Operation Denied", "Cannot delete last page.")
+            return
+        
+        # Confirm deletion
+        confirm = messagebox.askyesno("Confirm Deletion", 
+                                     "Are you sure you want to delete this page and all its links? This action cannot be undone.")
+        
+        if confirm:
+            # Find previous or next page to navigate after deletion
+            next_page_id = self.store.prev_page_id(self.current_page_id)
+            if next_page_id is None or next_page_id == MOST_USED_PAGE_ID:
+                next_page_id = self.store.next_page_id(self.current_page_id)
+            
+            if next_page_id is not None:
+                # Delete current page and its links
+                self.store.delete_page(self.current_page_id)
+                
+                # Load next page
+                self.current_page_id = next_page_id
+                self.load_page(next_page_id)
+    
+    def prev_page(self):
+        """Navigate to the previous page"""
+        prev_page_id = self.store.prev_page_id(self.current_page_id)
+        
+        if prev_page_id is not None:
+            self.current_page_id = prev_page_id
+            self.load_page(self.current_page_id)
+    
+    def next_page(self):
+        """Navigate to the next page"""
+        next_page_id = self.store.next_page_id(self.current_page_id)
+        
+        if next_page_id is not None:
+            self.current_page_id = next_page_id
+            self.load_page(self.current_page_id)
+    
+    def update_navigation_buttons(self, page):
+        """Updates the state of the navigation buttons"""
+        if page.prev_id is not None:
+            self.prev_btn.config(state="normal")
+        else:
+            self.prev_btn.config(state="disabled")
+        
+        if page.next_id is not None:
+            self.next_btn.config(state="normal")
+        else:
+            self.next_btn.config(state="disabled")
+    
+    def run_in_background(self, job, on_done, *args):
+        """Runs job(*args) on the background thread, then on_done(result) on the Tk thread"""
+        self.when_done(self.background.submit(job, *args), on_done)
+    
+    def when_done(self, future, on_done, on_error=None):
+        """Calls on_done(result) on the Tk thread once future is done, errors go to on_error or a message box"""
+        def poll():
+            if not future.done():
+                self.root.after(100, poll)
+            elif future.exception() is not None:
+                if on_error is not None:
+                    on_error(future.exception())
+                else:
+                    messagebox.showerror("Error", str(future.exception()))
+            else:
+                on_done(future.result())
+        
+        self.root.after(100, poll)
+    
+    def import_bookmarks(self):
+        """Imports a bookmark file into new pages"""
+        path = filedialog.askopenfilename(title="Import Bookmarks",
+                                          filetypes=[("Bookmark Files", "*.html *.htm *.json *.csv")])
+        if not path:
+            return
+        
+        def job():
+            # The worker thread needs its own connection
+            store = QuickLinkStore(self.db_path)
+            try:
+                return bookmarks.import_file(store, path)
+            finally:
+                store.close()
+        
+        def on_done(result):
+            page_ids, count = result
+            self.store.load_page_index()
+            messagebox.showinfo("Import Finished", f"Imported {count} links into {len(page_ids)} new pages.")
+            if page_ids:
+                self.current_page_id = page_ids[0]
+                self.load_page(self.current_page_id)
+        
+        self.run_in_background(job, on_done)
+    
+    def export_bookmarks(self):
+        """Exports every link to a bookmark file"""
+        path = filedialog.asksaveasfilename(title="Export Bookmarks", defaultextension=".html",
+                                            filetypes=[("Bookmarks HTML", "*.html"), ("JSON", "*.json"), ("CSV", "*.csv")])
+        if not path:
+            return
+        
+        def job():
+            store = QuickLinkStore(self.db_path)
+            try:
+                bookmarks.export_file(store, path)
+            finally:
+                store.close()
+        
+        self.run_in_background(job, lambda result: messagebox.showinfo("Export Finished", f"Links exported to {path}."))
+    
+    def show_most_used(self):
+        """Shows the links opened most often and most recently"""
+        if not self.store.has_launches():
+            messagebox.showinfo("Most Used", "Links you open will show up here.")
+            return
+        self.current_page_id = MOST_USED_PAGE_ID
+        self.load_page(MOST_USED_PAGE_ID)
+    
+    def flush_launches(self):
+        """Writes the launches recorded since the last flush"""
+        self.launch_flush = self.root.after(LAUNCH_FLUSH_INTERVAL, self.flush_launches)
+        if not self.store.pending_launches:
+            return
+        first_launch = not self.store.has_launches()
+        self.store.flush_launches()
+        
+        # The "Most Used" page now comes before the first page
+        if first_launch and self.current_page_id == self.store.first_page_id():
+            self.prev_btn.config(state="normal")
+    
+    def record_launch(self, link_id):
+        """Remembers a launch, a full batch is written once the click has been handled"""
+        if self.store.record_launch(link_id):
+            self.root.after_cancel(self.launch_flush)
+            self.launch_flush = self.root.after_idle(self.flush_launches)
+    
+    def scheduled_backup(self):
+        """Starts a backup when the newest one is older than the backup interval"""
+        self.root.after(BACKUP_CHECK_INTERVAL, self.scheduled_backup)
+        hours = float(self.store.get_setting("backup_interval_hours", backup.BACKUP_INTERVAL_HOURS))
+        newest = backup.newest_backup_time(backup.backup_dir(self.db_path))
+        if hours > 0 and (newest is None or time.time() - newest >= hours * 3600):
+            self.back_up(scheduled=True)
+    
+    def back_up(self, scheduled=False):
+        """Backs the database up on the background thread, a few pages at a time"""
+        if self.backing_up:
+            return
+        self.backing_up = True
+        self.store.flush_launches()
+        
+        progress = {"copied": 0, "total": 0}
+        future = self.background.submit(
+            backup.create_backup, self.db_path, None, "scheduled" if scheduled else "",
+            lambda copied, total: progress.update(copied=copied, total=total),
+        )
+        
+        def show_progress():
+            if not future.done():
+                percent = progress["copied"] * 100 // max(progress["total"], 1)
+                self.status_label.config(text=f"Backing up... {percent}%")
+                self.root.after(200, show_progress)
+        
+        def on_done(path):
+            self.backing_up = False
+            self.status_label.config(text=f"Backed up to {path}")
+        
+        def on_error(error):
+            self.backing_up = False
+            if scheduled:
+                self.status_label.config(text=f"Scheduled backup failed: {error}")
+            else:
+                messagebox.showerror("Backup Failed", str(error))
+        
+        show_progress()
+        self.when_done(future, on_done, on_error)
+    
+    def scheduled_link_check(self):
+        """Checks the next batch of links, unless turned off with the check_links setting"""
+        self.root.after(HEALTH_CHECK_INTERVAL, self.scheduled_link_check)
+        if int(self.store.get_setting("check_links", 1)):
+            self.check_links(scheduled=True)
+    
+    def check_links(self, scheduled=False):
+        """Checks the links due for a health check on a thread of their own
+
+        A batch can wait on slow servers for a while, it runs on a daemon thread
+        so it never holds up other jobs or closing the window.
+        """
+        if self.checking_links:
+            return
+        self.checking_links = True
+        
+        future = Future()
+        def run():
+            try:
+                future.set_result(health.check_due(self.db_path))
+            except BaseException as e:
+                future.set_exception(e)
+        threading.Thread(target=run, name="quicklink-health", daemon=True).start()
+        if not scheduled:
+            self.status_label.config(text="Checking links...")
+        
+        def on_done(checks):
+            self.checking_links = False
+            if not scheduled:
+                broken = sum(check.status == "broken" for check in checks)
+                self.status_label.config(text=f"Checked {len(checks)} links, {broken} broken")
+        
+        def on_error(error):
+            self.checking_links = False
+            if not scheduled:
+                messagebox.showerror("Link Check Failed", str(error))
+        
+        self.when_done(future, on_done, on_error)
+    
+    def restore_backup(self):
+        """Replaces every page and link with those of a backup"""
+        path = filedialog.askopenfilename(title="Restore Backup", initialdir=backup.backup_dir(self.db_path),
+                                          filetypes=[("QuickLink Backups", "*.db")])
+        if not path:
+            return
+        if not messagebox.askyesno("Restore Backup",
+                                   "Every page and link is replaced with those of the backup. "
+                                   "The current content is backed up first. Continue?"):
+            return
+        
+        self.store.flush_launches()
+        self.status_label.config(text="Restoring...")
+        
+        def on_done(safety):
+            self.reload()
+            self.status_label.config(text=f"Restored {os.path.basename(path)}, "
+                                          f"the previous content is in {os.path.basename(safety)}")
+        
+        self.run_in_background(backup.restore_backup, on_done, self.db_path, path)
+    
+    def sync_with(self):
+        """Merges the changes of another database into this one and back"""
+        path = filedialog.askopenfilename(title="Sync With", filetypes=[("QuickLink Databases", "*.db")])
+        if not path:
+            return
+        
+        self.store.flush_launches()
+        self.status_label.config(text="Syncing...")
+        
+        def on_done(result):
+            self.reload()
+            self.status_label.config(text=f"Synced with {os.path.basename(path)}: received {result.received}, "
+                                          f"sent {result.sent} changes")
+        
+        self.run_in_background(sync.sync_files, on_done, self.db_path, path)
+    
+    def open_url(self, url, link_id=None):
+        """Opens the URL with the default application, without waiting for it"""
+        self.status_label.config(text=f"Opening {url}")
+        self.launcher.open(url, link_id)
+    
+    def on_launch_result(self, link_id, url, error):
+        """Reports a finished launch in the status bar, only links that opened count as used"""
+        if error:
+            self.batch_failures.append(url)
+            self.status_label.config(text=f"Couldn't open {url}: {error}")
+        else:
+            if link_id is not None:
+                self.record_launch(link_id)
+            self.status_label.config(text=f"Opened {url}")
+    
+    def open_batch(self, links, concurrency=BATCH_CONCURRENCY, interval=BATCH_INTERVAL):
+        """Opens several (link_id, url) links a few at a time, the grid stays usable meanwhile"""
+        self.batch_failures = []
+        urls = [url for link_id, url in links]
+        
+        def done():
+            failed = len(self.batch_failures)
+            text = f"Opened {len(urls) - failed} of {len(urls)} links"
+            if failed:
+                text += f", {failed} failed"
+            self.status_label.config(text=text)
+        
+        self.status_label.config(text=f"Opening {len(urls)} links...")
+        self.launcher.open_batch(links, concurrency, interval, done)
+    
+    def open_all_links(self):
+        """Opens every link of the current page, in grid order"""
+        links = self.store.list_links(self.current_page_id)
+        if not links:
+            messagebox.showinfo("No Link", "There are no links to open on this page.")
+            return
+        self.open_batch([(link[0], link[1]) for link in links])
+    
+    def open_links(self):
+        """Opens the links picked from the current page, with a chosen pace"""
+        links = self.store.list_links(self.current_page_id)
+        if not links:
+            messagebox.showinfo("No Link", "There are no links to open on this page.")
+            return
+        
+        page_id = self.current_page_id
+        open_window = ttk.Toplevel(self.root)
+        open_window.title("Open Links")
+        open_window.geometry("450x550")
+        
+        ttk.Label(open_window, text="Select the links to open:").pack(pady=10)
+        
+        links_listbox = ttk.Treeview(open_window, columns=("title", "url"), show="headings", selectmode="extended")
+        links_listbox.heading("title", text="Title")
+        links_listbox.heading("url", text="URL")
+        links_listbox.column("title", width=150)
+        links_listbox.column("url", width=300)
+        links_listbox.pack(fill=BOTH, expand=YES, padx=10, pady=10)
+        
+        urls = {}
+        for link_id, url, title, position, image_hash in links:
+            display_url = url if len(url) <= 40 else url[:37] + "..."
+            links_listbox.insert("", "end", values=(title or "Untitled link", display_url), iid=link_id)
+            urls[str(link_id)] = url
+        
+        # The previous selection of this page, or every link
+        saved = [str(link_id) for link_id in self.saved_selections.get(page_id, ()) if str(link_id) in urls]
+        links_listbox.selection_set(saved or list(urls))
+        
+        options_frame = ttk.Frame(open_window)
+        options_frame.pack(pady=5)
+        ttk.Label(options_frame, text="At a time:").pack(side=LEFT, padx=5)
+        concurrency_var = tk.IntVar(value=BATCH_CONCURRENCY)
+        ttk.Spinbox(options_frame, from_=1, to=8, textvariable=concurrency_var, width=4).pack(side=LEFT)
+        ttk.Label(options_frame, text="Pause (ms):").pack(side=LEFT, padx=5)
+        interval_var = tk.IntVar(value=BATCH_INTERVAL)
+        ttk.Spinbox(options_frame, from_=0, to=5000, increment=50, textvariable=interval_var, width=6).pack(side=LEFT)
+        
+        def confirm_open():
+            selected = links_listbox.selection()
+            if not selected:
+                messagebox.showinfo("Selection required", "Please select the links to open.")
+                return
+            try:
+                concurrency = concurrency_var.get()
+                interval = interval_var.get()
+            except tk.TclError:
+                messagebox.showerror("Error", "Please enter whole numbers.")
+                return
+            
+            self.saved_selections[page_id] = [int(link_id) for link_id in selected]
+            open_window.destroy()
+            self.open_batch([(int(link_id), urls[link_id]) for link_id in selected], concurrency, interval)
+        
+        ttk.Button(open_window, text="Open Selected Links", bootstyle="success",
+                   command=confirm_open).pack(pady=10)
+    
+    def toggle_perf_overlay(self, event=None):
+        if self.perf_label.winfo_ismapped():
+            self.perf_label.pack_forget()
+        else:
+            self.perf_label.pack(side=RIGHT)
+    
+    def update_perf_overlay(self):
+        """Refreshes the timings shown in the status bar"""
+        if self.perf_label.winfo_ismapped():
+            cache = self.image_loader.cache.stats()
+            self.perf_label.config(text=perf.render_summary() + (
+                f" · images {cache['hits']} hits, {cache['misses']} misses, {cache['evictions']} evicted"
+            ))
+        self.root.after(250, self.update_perf_overlay)
+    
+    def dump_perf(self):
+        """Saves the histograms of every timed operation as JSON"""
+        path = filedialog.asksaveasfilename(title="Save Timings", defaultextension=".json",
+                                            filetypes=[("JSON", "*.json")])
+        if path:
+            perf.dump(path)
+            self.status_label.config(text=f"Timings saved to {path}")
+    
+    def toggle_profile(self):
+        """Starts cProfile, or stops it and writes a .prof file next to the database"""
+        if perf.profiler is None:
+            perf.start_profile()
+            self.status_label.config(text="Profiling... choose Start/Stop Profiling again to save")
+        else:
+            path = os.path.splitext(os.path.abspath(self.db_path))[0] + time.strftime("-%Y%m%d-%H%M%S.prof")
+            perf.stop_profile(path)
+            self.status_label.config(text=f"Profile saved to {path}")
+    
+    def save_snapshot(self):
+        """Saves the current page so the next launch can paint it right away"""
+        page = self.store.get_page(self.current_page_id) if self.current_page_id is not None else None
+        if page is None:
+            return
+        try:
+            save_snapshot(self.snapshot_path, page, self.store.change_counter(), self.store.thumbnail_size,
+                          (self.store.rows, self.store.columns))
+        except OSError as e:
+            print(f"Can't save the startup snapshot: {e}")
+    
+    def on_close(self):
+        """Closing the application"""
+        self.image_loader.close()
+        self.launcher.close()
+        if self.image_pool is not None:
+            self.image_pool.shutdown(wait=False, cancel_futures=True)
+        self.background.shutdown(wait=True)
+        self.store.flush_launches()  # Before the snapshot, so it matches the change counter
+        self.save_snapshot()
+        self.store.close()
+        self.root.destroy()
+        if perf.enabled:
+            perf.print_summary()
+            print("image cache: " + ", ".join(f"{key} {value}" for key, value in self.image_loader.cache.stats().items()),
+                  file=sys.stderr)
+
+def main(db_path=DEFAULT_DB_PATH, started=None, timing=False):
+    root = ttk.Window(themename="journal")
+    app = QuickLink(root, db_path, started)
+    if timing:
+        print(", ".join(f"{name}: {ms:.1f} ms" for name, ms in app.startup_times.items()))
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
+    root.mainloop()
@@ -0,0 +1,320 @@
+"""Health checks of links: web pages still answer, local files still exist
+
+Links are checked in batches, those never checked first, then those checked
+the longest ago, so thousands of links are covered a batch at a time without
+keeping the network or the disk busy. Web links get HEAD requests on an
+asyncio event loop, at most CONCURRENCY at a time and at most one request
+every HOST_INTERVAL to the same host. The ETag and Last-Modified of the last
+answer make a check conditional. Local paths are all checked in a single job
+on a worker thread, and a missing folder is looked up only once.
+
+    python quicklink.py check --limit 200
+    python quicklink.py broken
+"""
+import asyncio
+import os
+import ssl
+import time
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+from store import connect
+
+# Links checked per batch
+BATCH_SIZE = 100
+
+# Web requests in flight at once, and the seconds between two requests to the same host
+CONCURRENCY = 8
+HOST_INTERVAL = 1.0
+
+# Seconds a web request may take, redirects followed
+TIMEOUT = 10.0
+MAX_REDIRECTS = 5
+
+# Hours before a checked link is due again
+RECHECK_HOURS = 24
+
+# Checks in a row that found a link unreachable (timeouts, server errors) before it is flagged
+FAILURES_BROKEN = 3
+
+USER_AGENT = "QuickLink-LinkCheck/1.0"
+
+# Answers worth a GET when a server refuses HEAD
+RETRY_GET = {403, 405, 501}
+
+# Statuses of a check: ok, redirected (permanently, to the URL in detail), broken,
+# unreachable (may work again later), skipped (a link that can't be checked)
+Check = namedtuple("Check", "link_id url status detail etag last_modified")
+
+
+def link_target(url):
+    """Returns ("web", url), ("file", path) or (None, None) for links that can't be checked"""
+    url = url.strip()
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme in ("http", "https") and parts.hostname:
+        return "web", url
+    if parts.scheme == "file":
+        path = urllib.request.url2pathname(parts.path)
+        if parts.netloc and parts.netloc != "localhost":
+            path = f"//{parts.netloc}{path}"  # A network share
+        return "file", path
+    # Windows paths (C:\...) parse with a one-letter scheme
+    if len(parts.scheme) == 1 or not parts.scheme:
+        path = os.path.expanduser(url)
+        if os.path.isabs(path):
+            return "file", path
+    return None, None
+
+
+# === WEB ===
+
+class HostLimiter:
+    """Spaces out the requests to each host, every request books the next free slot"""
+
+    def __init__(self, interval=HOST_INTERVAL):
+        self.interval = interval
+        self.next_slot = {}
+
+    async def wait(self, host):
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self.next_slot.get(host, now))
+        self.next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+async def request(method, url, headers, ssl_context):
+    """Sends one request, returns (status, {header: value}) without reading the body"""
+    parts = urllib.parse.urlsplit(url)
+    https = parts.scheme == "https"
+    host = parts.hostname.encode("idna").decode("ascii")
+    port = parts.port or (443 if https else 80)
+    target = urllib.parse.quote(parts.path or "/", safe="/%:@!$&'()*+,;=-._~")
+    if parts.query:
+        target += "?" + urllib.parse.quote(parts.query, safe="/%:@!$&'()*+,;=-._~?")
+
+    reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context if https else None)
+    try:
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {host if parts.port is None else f'{host}:{port}'}",
+                 f"User-Agent: {USER_AGENT}", "Accept: */*", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+        status_line = (await reader.readline()).decode("latin-1").split(None, 2)
+        if len(status_line) < 2 or not status_line[0].startswith("HTTP/") or not status_line[1].isdigit():
+            raise ConnectionError("Not an HTTP server")
+        response_headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        return int(status_line[1]), response_headers
+    finally:
+        writer.close()
+
+
+async def check_web(link_id, url, etag, last_modified, limiter, semaphore, ssl_context, timeout=TIMEOUT):
+    """Checks a web link, following redirects, returns a Check"""
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    current = url
+    moved = False
+    try:
+        for _ in range(MAX_REDIRECTS + 1):
+            host = urllib.parse.urlsplit(current).hostname
+            await limiter.wait(host)
+            async with semaphore:
+                status, response = await asyncio.wait_for(request("HEAD", current, headers, ssl_context), timeout)
+            if status in RETRY_GET:
+                # A second request to the same host, spaced out like any other
+                await limiter.wait(host)
+                async with semaphore:
+                    status, response = await asyncio.wait_for(request("GET", current, headers, ssl_context), timeout)
+
+            if status in (301, 302, 303, 307, 308) and "location" in response:
+                moved = moved or status in (301, 308)
+                current = urllib.parse.urljoin(current, response["location"])
+                headers = {}  # The validators belong to the first URL
+                if urllib.parse.urlsplit(current).scheme not in ("http", "https"):
+                    return Check(link_id, url, "ok", f"Redirected to {current}", None, None)
+                continue
+
+            if status == 304:
+                return Check(link_id, url, "ok", "Not modified", etag, last_modified)
+            if 200 <= status < 300 or status in (401, 403):
+                if moved:
+                    return Check(link_id, url, "redirected", current, None, None)
+                return Check(link_id, url, "ok", f"HTTP {status}", response.get("etag"), response.get("last-modified"))
+            # 408 and 429 ask to come back later
+            if 400 <= status < 500 and status not in (408, 429):
+                return Check(link_id, url, "broken", f"HTTP {status}", None, None)
+            return Check(link_id, url, "unreachable", f"HTTP {status}", None, None)
+
+        return Check(link_id, url, "broken", "Too many redirects", None, None)
+    except asyncio.TimeoutError:
+        return Check(link_id, url, "unreachable", "Timed out", None, None)
+    except (OSError, ValueError, UnicodeError) as e:
+        # DNS failures, refused connections and certificate errors may be those of the network
+        return Check(link_id, url, "unreachable", str(e) or type(e).__name__, None, None)
+
+
+async def check_web_links(links, concurrency=CONCURRENCY, host_interval=HOST_INTERVAL, timeout=TIMEOUT):
+    """Checks (link_id, url, etag, last_modified) web links concurrently, returns their Checks"""
+    limiter = HostLimiter(host_interval)
+    semaphore = asyncio.Semaphore(concurrency)
+    ssl_context = ssl.create_default_context()
+    return await asyncio.gather(*(
+        check_web(link_id, url, etag, last_modified, limiter, semaphore, ssl_context, timeout)
+        for link_id, url, etag, last_modified in links
+    ))
+
+
+# === FILES ===
+
+def check_paths(paths):
+    """Checks (link_id, url, path) local targets, returns their Checks
+
+    Runs on a worker thread. A folder found missing isn't looked up again for
+    the other files in it.
+    """
+    checks = []
+    missing = set()
+    for link_id, url, path in paths:
+        path = os.path.normpath(path)
+        folder = os.path.dirname(path)
+        if folder in missing:
+            checks.append(Check(link_id, url, "broken", "Folder not found", None, None))
+            continue
+        try:
+            os.stat(path)
+            checks.append(Check(link_id, url, "ok", None, None, None))
+        except (FileNotFoundError, NotADirectoryError):
+            # An unplugged drive or share isn't a moved file
+            anchor = os.path.splitdrive(path)[0] or os.sep
+            if not os.path.exists(anchor):
+                checks.append(Check(link_id, url, "unreachable", "Drive not found", None, None))
+            elif folder and not os.path.isdir(folder):
+                missing.add(folder)
+                checks.append(Check(link_id, url, "broken", "Folder not found", None, None))
+            else:
+                checks.append(Check(link_id, url, "broken", "File not found", None, None))
+        except OSError as e:
+            checks.append(Check(link_id, url, "unreachable", e.strerror or str(e), None, None))
+    return checks
+
+
+# === BATCHES ===
+
+async def check_links(links, **options):
+    """Checks (link_id, url, etag, last_modified) links of any kind, returns their Checks"""
+    web, paths, checks = [], [], []
+    for link_id, url, etag, last_modified in links:
+        kind, target = link_target(url or "")
+        if kind == "web":
+            web.append((link_id, url, etag, last_modified))
+        elif kind == "file":
+            paths.append((link_id, url, target))
+        else:
+            checks.append(Check(link_id, url, "skipped", None, None, None))
+
+    # The disk is checked meanwhile
+    file_checks = asyncio.get_running_loop().run_in_executor(None, check_paths, paths)
+    web_checks = await check_web_links(web, **options)
+    return checks + await file_checks + web_checks
+
+
+def due_links(conn, limit=BATCH_SIZE, recheck_hours=RECHECK_HOURS):
+    """Returns (link_id, url, etag, last_modified) of the links to check next, never checked ones first"""
+    links = conn.execute("""
+        SELECT l.id, l.url, NULL, NULL FROM links l
+        WHERE NOT EXISTS (SELECT 1 FROM link_health h WHERE h.link_id = l.id)
+        LIMIT ?
+    """, (limit,)).fetchall()
+    if len(links) < limit:
+        links += conn.execute("""
+            SELECT l.id, l.url, h.etag, h.last_modified FROM link_health h
+            JOIN links l ON l.id = h.link_id
+            WHERE h.checked_at < ?
+            ORDER BY h.checked_at
+            LIMIT ?
+        """, (time.time() - recheck_hours * 3600, limit - len(links))).fetchall()
+    return links
+
+
+def write_checks(conn, checks, now=None):
+    """Stores Checks in the caller's transaction, skipping links deleted or changed meanwhile"""
+    now = time.time() if now is None else now
+    failures = dict(conn.execute(
+        f"SELECT link_id, failures FROM link_health WHERE link_id IN ({', '.join('?' * len(checks))})",
+        [check.link_id for check in checks],
+    )) if checks else {}
+
+    rows = []
+    for check in checks:
+        count = failures.get(check.link_id, 0) + 1 if check.status == "unreachable" else 0
+        if check.status == "broken" or count >= FAILURES_BROKEN:
+            flag = "broken"
+        elif check.status == "redirected":
+            flag = "redirected"
+        else:
+            flag = None
+        rows.append((check.link_id, now, check.status, check.detail, count, flag, check.etag, check.last_modified,
+                     check.link_id, check.url))
+
+    conn.executemany("""
+        INSERT INTO link_health (link_id, checked_at, status, detail, failures, flag, etag, last_modified)
+        SELECT ?, ?, ?, ?, ?, ?, ?, ?
+        WHERE EXISTS (SELECT 1 FROM links WHERE id = ? AND url = ?)
+        ON CONFLICT (link_id) DO UPDATE SET
+            checked_at = excluded.checked_at, status = excluded.status, detail = excluded.detail,
+            failures = excluded.failures, flag = excluded.flag, etag = excluded.etag,
+            last_modified = excluded.last_modified
+    """, rows)
+
+
+def offline(checks):
+    """Tells whether every web check failed to connect, the computer is offline then rather than the links broken"""
+    web = [check for check in checks if link_target(check.url or "")[0] == "web"]
+    return len(web) >= 3 and all(check.status == "unreachable" and not check.detail.startswith("HTTP")
+                                 for check in web)
+
+
+def check_due(db_path, limit=BATCH_SIZE, **options):
+    """Checks the next batch of due links of a database, returns their Checks
+
+    Opens its own connection, so it can run on any thread. The database isn't
+    locked while the checks run.
+    """
+    conn = connect(db_path)
+    try:
+        links = due_links(conn, limit)
+        if not links:
+            return []
+        checks = asyncio.run(check_links(links, **options))
+
+        # Nothing is learnt about web links while offline, they stay due
+        if offline(checks):
+            checks = [check for check in checks if link_target(check.url or "")[0] != "web"]
+        with conn:
+            write_checks(conn, checks)
+        return checks
+    finally:
+        conn.close()
+
+
+def flagged_links(conn):
+    """Returns (link_id, page_id, url, title, flag, status, detail, checked_at) of the broken and redirected links"""
+    return conn.execute("""
+        SELECT l.id, l.page_id, l.url, l.title, h.flag, h.status, h.detail, h.checked_at
+        FROM link_health h
+        JOIN links l ON l.id = h.link_id
+        WHERE h.flag IS NOT NULL
+        ORDER BY h.flag, l.page_id, l.position
+    """).fetchall()
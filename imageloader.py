@@ -0,0 +1,206 @@
+import io
+import os
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageTk
+import perf
+from store import connect
+from thumbnails import ThumbnailCache
+
+# Bytes of decoded images kept for pages shown again, QUICKLINK_IMAGE_CACHE_MB overrides it
+CACHE_BYTES = int(float(os.environ.get("QUICKLINK_IMAGE_CACHE_MB", 32)) * 1024 * 1024)
+
+
+@perf.timed("image.decode", "decode")
+def decode(thumbnail):
+    """Decodes thumbnail bytes into a loaded PIL image"""
+    img = Image.open(io.BytesIO(thumbnail))
+    img.load()
+    return img
+
+
+@perf.timed("image.photo", "photo")
+def make_photo(img):
+    """Hands a decoded image to Tk, must run on the Tk thread"""
+    return ImageTk.PhotoImage(img)
+
+
+def photo_image(thumbnail):
+    """Decodes thumbnail bytes right away, on the Tk thread"""
+    return make_photo(decode(thumbnail))
+
+
+class PhotoCache:
+    """Decoded images by content hash, least recently used first out once over budget
+
+    Only used on the Tk thread, like the PhotoImages it holds. A tile keeps its
+    own reference, so evicting an image never blanks a tile showing it.
+    """
+
+    def __init__(self, budget=CACHE_BYTES):
+        self.budget = budget
+        self.size = 0
+        self.photos = OrderedDict()  # Image hash -> (photo, bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, image_hash):
+        entry = self.photos.get(image_hash)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.photos.move_to_end(image_hash)
+        return entry[0]
+
+    def put(self, image_hash, photo):
+        if image_hash in self.photos:
+            self.size -= self.photos.pop(image_hash)[1]
+        # Tk keeps 4 bytes per pixel
+        size = photo.width() * photo.height() * 4
+        self.photos[image_hash] = (photo, size)
+        self.size += size
+        self.evict()
+
+    def evict(self):
+        while self.size > self.budget and self.photos:
+            self.size -= self.photos.popitem(last=False)[1][1]
+            self.evictions += 1
+
+    def __contains__(self, image_hash):
+        return image_hash in self.photos
+
+    def clear(self):
+        self.photos.clear()
+        self.size = 0
+
+    def stats(self):
+        """Returns the counters and the size of the cache"""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "images": len(self.photos), "bytes": self.size, "budget": self.budget}
+
+
+class ImageLoader:
+    """Decodes tile images on worker threads and hands them back to the Tk thread
+
+    Decoded images go to a PhotoCache, which several loaders can share. An image
+    shown on several tiles, or requested again while decoding, is decoded once.
+    """
+
+    def __init__(self, root, db_path, size, workers=4, poll_interval=15, cache=None, report_render=True):
+        self.root = root
+        self.db_path = db_path
+        self.size = size
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quicklink-decode")
+        self.cache = PhotoCache() if cache is None else cache
+
+        # Only the loader of the main grid ends the timing of the page shown
+        self.report_render = report_render
+
+        # Results travel through a queue that the Tk thread drains with root.after
+        self.results = queue.SimpleQueue()
+        self.poll_job = None
+
+        # Image hash -> (future, callbacks waiting for it), prefetches have no callbacks
+        self.pending = {}
+        self.local = threading.local()
+
+    def load(self, image_hash, thumbnail, callback):
+        """Calls callback(photo) on the Tk thread, right away if the image is cached
+
+        Otherwise the thumbnail is decoded in the background. If thumbnail is
+        None it is built from the original image on the worker.
+        """
+        photo = self.cache.get(image_hash)
+        if photo is not None:
+            callback(photo)
+        elif image_hash in self.pending:
+            self.pending[image_hash][1].append(callback)
+        else:
+            self._submit(image_hash, thumbnail, [callback])
+
+    def load_now(self, image_hash, thumbnail):
+        """Returns the photo of a thumbnail, decoded on the Tk thread unless cached"""
+        photo = self.cache.get(image_hash)
+        if photo is None:
+            photo = photo_image(thumbnail)
+            self.cache.put(image_hash, photo)
+        return photo
+
+    def prefetch(self, images):
+        """Decodes (image_hash, thumbnail) pairs into the cache, behind the images already requested"""
+        for image_hash, thumbnail in images:
+            if image_hash not in self.cache and image_hash not in self.pending:
+                self._submit(image_hash, thumbnail, [])
+
+    def busy(self):
+        """Tells whether images requested with load() are still on their way"""
+        return any(callbacks for future, callbacks in self.pending.values())
+
+    def cancel(self):
+        """Drops every queued job, images already decoding still go to the cache"""
+        for image_hash, (future, callbacks) in list(self.pending.items()):
+            if future.cancel():
+                del self.pending[image_hash]
+            else:
+                callbacks.clear()
+
+    def _submit(self, image_hash, thumbnail, callbacks):
+        self.pending[image_hash] = (self.executor.submit(self._decode, image_hash, thumbnail), callbacks)
+        if self.poll_job is None:
+            self.poll_job = self.root.after(self.poll_interval, self._poll)
+
+    def close(self):
+        """Stops the worker threads and the polling of their results"""
+        self.cancel()
+        if self.poll_job is not None:
+            self.root.after_cancel(self.poll_job)
+            self.poll_job = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _thumbnails(self):
+        """Returns the thumbnail cache of the current worker thread"""
+        # SQLite connections can't be shared between threads, each worker opens its own
+        if not hasattr(self.local, "thumbnails"):
+            self.local.thumbnails = ThumbnailCache(connect(self.db_path), self.size)
+        return self.local.thumbnails
+
+    def _decode(self, image_hash, thumbnail):
+        """Runs on a worker thread, always queues a result so the job leaves pending"""
+        img = None
+        try:
+            if thumbnail is None:
+                thumbnail = self._thumbnails().get(image_hash)
+            if thumbnail:
+                img = decode(thumbnail)
+        except (OSError, ValueError, sqlite3.Error):
+            pass
+        self.results.put((image_hash, img))
+
+    def _poll(self):
+        """Runs on the Tk thread, delivers the finished images"""
+        while True:
+            try:
+                image_hash, img = self.results.get_nowait()
+            except queue.Empty:
+                break
+            _, callbacks = self.pending.pop(image_hash, (None, ()))
+            if img is None:
+                continue
+            # PhotoImage must be created on the Tk thread
+            photo = make_photo(img)
+            self.cache.put(image_hash, photo)
+            for callback in callbacks:
+                callback(photo)
+
+        if self.report_render and not self.busy():
+            perf.end_render()
+        if self.pending:
+            self.poll_job = self.root.after(self.poll_interval, self._poll)
+        else:
+            self.poll_job = None
@@ -0,0 +1,144 @@
+"""Normalizes images before they are stored
+
+Tiles are shown at 120x120, so originals are checked, turned upright, reduced
+to a still image, scaled down and re-encoded to a compact format. Decoding and
+encoding run in a separate process so the window stays responsive.
+"""
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps, features
+
+# Longest side (in pixels) of a stored image
+MAX_IMAGE_SIZE = 512
+
+# Formats images are re-encoded to, WebP needs a Pillow built with libwebp
+FORMATS = ("webp", "png")
+DEFAULT_FORMAT = "webp" if features.check("webp") else "png"
+
+# EXIF tag telling how the camera was held
+ORIENTATION = 0x0112
+
+# Images sent to the worker processes at a time, per worker, while re-encoding the store
+QUEUE_DEPTH = 2
+
+
+def settings(store):
+    """Returns the (max_size, image_format) used for new images of a database"""
+    max_size = int(store.get_setting("image_max_size", MAX_IMAGE_SIZE))
+    image_format = store.get_setting("image_format", DEFAULT_FORMAT)
+    if image_format not in FORMATS or (image_format == "webp" and not features.check("webp")):
+        image_format = "png"
+    return max_size, image_format
+
+
+def normalize(data, max_size=MAX_IMAGE_SIZE, image_format=DEFAULT_FORMAT):
+    """Returns the bytes of a compact, upright, still version of an image
+
+    The original bytes are returned when re-encoding wouldn't make them smaller
+    and the image needs no change. Raises ValueError if data isn't an image.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.load()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Not a usable image: {e}")
+
+    # Tiles are still images, an animation is shown by its first frame
+    animated = getattr(img, "n_frames", 1) > 1
+    if animated:
+        img.seek(0)
+        img = img.copy()
+
+    # Camera photos are often stored sideways with an EXIF orientation tag
+    rotated = img.getexif().get(ORIENTATION, 1) != 1
+    if rotated:
+        img = ImageOps.exif_transpose(img)
+
+    # Transparency survives, everything else is stored without an alpha channel
+    if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+
+    too_large = max(img.size) > max_size
+    if too_large:
+        img.thumbnail((max_size, max_size), Image.LANCZOS)
+
+    output = io.BytesIO()
+    if image_format == "webp":
+        # Method 6 is ~80x slower on images with an alpha channel for ~5% smaller files
+        img.save(output, format="WEBP", quality=90, method=4)
+    else:
+        img.save(output, format="PNG", optimize=True)
+    encoded = output.getvalue()
+
+    if len(encoded) >= len(data) and not (animated or rotated or too_large):
+        return data
+    return encoded
+
+
+def normalize_file(path, max_size=MAX_IMAGE_SIZE, image_format=DEFAULT_FORMAT):
+    """Reads and normalizes an image file, see normalize"""
+    with open(path, "rb") as f:
+        return normalize(f.read(), max_size, image_format)
+
+
+def reencode_images(store, max_size=MAX_IMAGE_SIZE, image_format=DEFAULT_FORMAT, workers=None, progress=None):
+    """Re-encodes every stored image on a process pool
+
+    Returns (images changed, images kept, bytes before, bytes after), an image
+    is kept as it was when re-encoding doesn't make it smaller. Links move to
+    the new image, the triggers on links then drop the old one together with
+    its thumbnails. Originals are read one at a time and only a few are in
+    flight, so memory stays bounded whatever the size of the store.
+    """
+    conn = store.conn
+    image_hashes = [row[0] for row in conn.execute("SELECT hash FROM images ORDER BY rowid")]
+    before = conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM images").fetchone()[0]
+    changed = 0
+    kept = 0
+    done = 0
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        hashes = iter(image_hashes)
+
+        def submit():
+            """Sends the next image to the pool, returns False once there are none left"""
+            old_hash = next(hashes, None)
+            if old_hash is None:
+                return False
+            with store.open_image(old_hash) as blob:
+                data = blob.read()
+            pending.append((old_hash, len(data), pool.submit(normalize, data, max_size, image_format)))
+            return True
+
+        while len(pending) < QUEUE_DEPTH * workers and submit():
+            pass
+
+        while pending:
+            old_hash, size, future = pending.popleft()
+            submit()
+            try:
+                data = future.result()
+            except ValueError:
+                data = None  # Undecodable images are left as they are
+
+            if data is not None and len(data) < size:
+                new_hash = store.add_image(data)
+                if new_hash != old_hash:
+                    conn.execute("UPDATE links SET image_hash = ? WHERE image_hash = ?", (new_hash, old_hash))
+                    changed += 1
+                conn.commit()
+            elif data is not None:
+                kept += 1
+
+            done += 1
+            if progress:
+                progress(done, len(image_hashes))
+
+    after = conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM images").fetchone()[0]
+    return changed, kept, before, after
@@ -0,0 +1,100 @@
+import queue
+import time
+import webbrowser
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Links of a batch opened at the same time, and the pause between two of them
+BATCH_CONCURRENCY = 2
+BATCH_INTERVAL = 250  # Milliseconds
+
+
+class Launcher:
+    """Opens links on worker threads, so a slow platform handler never blocks the Tk thread"""
+
+    def __init__(self, root, on_result, workers=4, poll_interval=50):
+        self.root = root
+        self.on_result = on_result  # Called as on_result(link_id, url, error) on the Tk thread, error is None on success
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quicklink-launch")
+
+        # Results travel through a queue that the Tk thread drains with root.after
+        self.results = queue.SimpleQueue()
+        self.running = 0
+        self.polling = False
+
+        # (link_id, url) of the current batch not started yet, they are fed to the pool a few at a time
+        self.batch = deque()
+        self.batch_running = 0
+        self.batch_concurrency = BATCH_CONCURRENCY
+        self.batch_interval = BATCH_INTERVAL
+        self.next_batch_start = 0.0
+        self.on_batch_done = None
+
+    def open(self, url, link_id=None):
+        """Opens a single link, link_id is handed back to on_result"""
+        self.running += 1
+        self.executor.submit(self._launch, link_id, url, False)
+        self._schedule()
+
+    def open_batch(self, links, concurrency=BATCH_CONCURRENCY, interval=BATCH_INTERVAL, on_done=None):
+        """Opens several (link_id, url) links, at most concurrency at a time and interval milliseconds apart
+
+        A new batch replaces the links of the previous one that haven't started yet.
+        on_done is called on the Tk thread once every link of the batch was launched.
+        """
+        self.batch = deque(links)
+        self.batch_concurrency = max(1, concurrency)
+        self.batch_interval = max(0, interval)
+        self.next_batch_start = 0.0
+        self.on_batch_done = on_done
+        self._schedule()
+
+    def cancel_batch(self):
+        """Drops the links of the batch that haven't started yet"""
+        self.batch.clear()
+
+    def close(self):
+        self.cancel_batch()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _schedule(self):
+        if not self.polling:
+            self.polling = True
+            self.root.after(0 if self.batch else self.poll_interval, self._poll)
+
+    def _launch(self, link_id, url, in_batch):
+        """Runs on a worker thread"""
+        try:
+            error = None if webbrowser.open(url) else "No application could open it"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        self.results.put((link_id, url, in_batch, error))
+
+    def _poll(self):
+        """Runs on the Tk thread, reports finished launches and starts the next links of the batch"""
+        while True:
+            try:
+                link_id, url, in_batch, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.running -= 1
+            if in_batch:
+                self.batch_running -= 1
+            self.on_result(link_id, url, error)
+
+        now = time.monotonic()
+        while self.batch and self.batch_running < self.batch_concurrency and now >= self.next_batch_start:
+            self.running += 1
+            self.batch_running += 1
+            self.executor.submit(self._launch, *self.batch.popleft(), True)
+            self.next_batch_start = now + self.batch_interval / 1000
+
+        if not self.batch and not self.batch_running and self.on_batch_done:
+            on_batch_done, self.on_batch_done = self.on_batch_done, None
+            on_batch_done()
+
+        if self.running or self.batch:
+            self.root.after(self.poll_interval, self._poll)
+        else:
+            self.polling = False
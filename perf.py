@@ -0,0 +1,210 @@
+"""Timing hooks for the hot paths of QuickLink
+
+Off unless QUICKLINK_PERF=1 is set or --perf is given. When off, a timed
+function costs one extra call and a flag check, and SQLite connections are
+plain sqlite3 connections.
+
+Every timed operation feeds a histogram (count, p50, p95, max). The timings of
+the page being shown are also collected in `render`, which the window shows
+in its status bar.
+"""
+import cProfile
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from functools import wraps
+
+enabled = os.environ.get("QUICKLINK_PERF", "") not in ("", "0")
+
+# Samples kept per operation, older ones are overwritten
+MAX_SAMPLES = 10000
+
+# Length of the SQL text used as the name of a statement
+SQL_NAME_LENGTH = 60
+
+
+class Histogram:
+    """Durations of one operation, in seconds"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def add(self, seconds):
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(seconds)
+        else:
+            self.samples[self.count % MAX_SAMPLES] = seconds
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self):
+        """Returns count, p50, p95, max and total, in milliseconds"""
+        samples = sorted(self.samples)
+        n = len(samples)
+        return {
+            "count": self.count,
+            "p50_ms": samples[n // 2] * 1000,
+            "p95_ms": samples[min(n - 1, int(n * 0.95))] * 1000,
+            "max_ms": self.max * 1000,
+            "total_ms": self.total * 1000,
+        }
+
+
+histograms = {}
+lock = threading.Lock()
+
+# Time spent per stage on the page being shown, and how often each stage ran
+render = {}
+render_counts = {}
+render_started = None
+
+profiler = None
+
+
+def enable():
+    """Turns the hooks on, connections opened from now on time their statements"""
+    global enabled
+    enabled = True
+
+
+def record(name, seconds, stage=None):
+    """Adds a duration to the histogram of name, and to the page render under stage"""
+    with lock:
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram()
+        histogram.add(seconds)
+        if stage is not None and render_started is not None:
+            render[stage] = render.get(stage, 0.0) + seconds
+            render_counts[stage] = render_counts.get(stage, 0) + 1
+
+
+def timed(name, stage=None):
+    """Decorator recording the duration of every call"""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start, stage)
+        return wrapper
+    return decorate
+
+
+def begin_render():
+    """Starts collecting the stages of a new page"""
+    global render_started
+    with lock:
+        render.clear()
+        render_counts.clear()
+        render_started = time.perf_counter()
+
+
+def end_render():
+    """Marks the page as complete (every image shown)"""
+    global render_started
+    if render_started is None:
+        return
+    with lock:
+        render["total"] = time.perf_counter() - render_started
+        render_started = None
+
+
+def render_summary():
+    """Returns the stages of the last page as text"""
+    with lock:
+        stages = dict(render)
+        counts = dict(render_counts)
+    parts = []
+    for stage, seconds in stages.items():
+        count = counts.get(stage, 1)
+        parts.append(f"{stage} {seconds * 1000:.1f} ms" + (f" ({count})" if count > 1 else ""))
+    return " · ".join(parts)
+
+
+def summary():
+    """Returns the histogram of every operation, slowest total first"""
+    with lock:
+        items = [(name, histogram.summary()) for name, histogram in histograms.items()]
+    items.sort(key=lambda item: -item[1]["total_ms"])
+    return dict(items)
+
+
+def print_summary(file=sys.stderr):
+    for name, stats in summary().items():
+        print(f"{stats['count']:>7}  p50 {stats['p50_ms']:>8.3f}  p95 {stats['p95_ms']:>8.3f}  "
+              f"max {stats['max_ms']:>8.3f} ms  {name}", file=file)
+
+
+def dump(path):
+    """Writes the histograms as JSON"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary(), f, indent=2)
+        f.write("\n")
+
+
+def start_profile():
+    """Starts cProfile on the calling (Tk) thread"""
+    global profiler
+    if profiler is None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+
+def stop_profile(path):
+    """Stops cProfile and writes its stats, readable with pstats or snakeviz"""
+    global profiler
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(path)
+        profiler = None
+
+
+# === SQL ===
+
+def sql_name(sql):
+    """Names a statement by its first characters, with whitespace collapsed"""
+    return "sql: " + re.sub(r"\s+", " ", sql).strip()[:SQL_NAME_LENGTH]
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor timing execute() calls, rows fetched later are not included"""
+
+    def execute(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            record(sql_name(sql), time.perf_counter() - start, "sql")
+
+    def executemany(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            record(sql_name(sql), time.perf_counter() - start, "sql")
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose statements are timed, only used while the hooks are on"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
@@ -1,532 +1,470 @@
-import tkinter as tk
-from tkinter import filedialog, simpledialog, messagebox
-import ttkbootstrap as ttk
-from ttkbootstrap.constants import *
-import sqlite3
+#!/usr/bin/env python3
+"""QuickLink - Quick Access to Everything
+
+Without a command the window is launched. Commands work on the same
+database without a display, and never import Tk, ttkbootstrap or Pillow:
+
+    python quicklink.py pages
+    python -m quicklink search github --json
+"""
+import time
+
+# Taken first, so the reported startup times include the interpreter imports
+STARTED = time.perf_counter()
+
+import argparse
+import json
 import os
-import webbrowser
-from PIL import Image, ImageTk
-import io
-
-class QuickLink:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("QuickLink - Quick Access to Everything")
-        self.root.geometry("1100x700")
-        
-        # Initialize database
-        self.setup_database()
-        
-        # Variables
-        self.current_page_id = None
-        self.links_buttons = []
-        
-        # Create main layout
-        self.create_ui()
-        
-        # Upload or create first page
-        self.load_initial_page()
-    
-    def setup_database(self):
-        """Configure the SQLite database"""
-        self.conn = sqlite3.connect('quicklink.db')
-        self.cursor = self.conn.cursor()
-        
-        # Check if the "title" column exists in the links table
-        self.cursor.execute("PRAGMA table_info(links)")
-        columns = self.cursor.fetchall()
-        has_title_column = any(column[1] == 'title' for column in columns)
-        
-        # Create page table if not exists
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT DEFAULT 'New Page'
-            )
-        ''')
-        
-        # Create link table if not exists
-        if not has_title_column:
-            # If the table already exists but does not have the "title" column
-            try:
-                self.cursor.execute("ALTER TABLE links ADD COLUMN title TEXT")
-            except sqlite3.OperationalError:
-                # If the table does not yet exist, create it with the new column
-                self.cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS links (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        page_id INTEGER,
-                        url TEXT,
-                        position INTEGER,
-                        image BLOB,
-                        title TEXT,
-                        FOREIGN KEY (page_id) REFERENCES pages (id)
-                    )
-                ''')
-        else:
-            # If the table does not exist, create it with the "title" column
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS links (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    page_id INTEGER,
-                    url TEXT,
-                    position INTEGER,
-                    image BLOB,
-                    title TEXT,
-                    FOREIGN KEY (page_id) REFERENCES pages (id)
-                )
-            ''')
-        
-        self.conn.commit()
-    
-    def create_ui(self):
-        """Creates the user interface"""
-        # Main frame
-        self.main_frame = ttk.Frame(self.root, padding=10)
-        self.main_frame.pack(fill=BOTH, expand=YES)
-
-        # === ROW 1: CENTERED BUTTONS ===
-        self.buttons_frame = ttk.Frame(self.main_frame)
-        self.buttons_frame.pack(pady=(0, 15))  # Without fill=X, so as not to expand to the full width
-
-        # Centered buttons
-        self.add_link_btn = ttk.Button(
-            self.buttons_frame, text="New Link", command=self.add_link, bootstyle="success", width=15
-        )
-        self.add_link_btn.pack(side=LEFT, padx=5)
-
-        self.del_link_btn = ttk.Button(
-            self.buttons_frame, text="Delete Link", command=self.delete_link, bootstyle="danger", width=12
-        )
-        self.del_link_btn.pack(side=LEFT, padx=5)
-
-        self.change_title_btn = ttk.Button(
-            self.buttons_frame, text="Page Title", command=self.change_page_title, bootstyle="info", width=18
-        )
-        self.change_title_btn.pack(side=LEFT, padx=5)
-
-        self.add_page_btn = ttk.Button(
-            self.buttons_frame, text="New Page", command=self.add_page, bootstyle="success", width=18
-        )
-        self.add_page_btn.pack(side=LEFT, padx=5)
-
-        self.del_page_btn = ttk.Button(
-            self.buttons_frame, text="Del. Current Page", command=self.delete_page, bootstyle="danger", width=15
-        )
-        self.del_page_btn.pack(side=LEFT, padx=5)
-        
-        # === LINE 2: PAGE TITLE ===
-        self.title_frame = ttk.Frame(self.main_frame)
-        self.title_frame.pack(fill=X, pady=(0, 20))
-        
-        self.title_label = ttk.Label(self.title_frame, text="Untitled page", 
-                                    font=("Helvetica", 22, "bold"))
-        self.title_label.pack(anchor=CENTER)
-        
-        # === LINE 3: LINKS AND NAVIGATION ===
-        self.content_frame = ttk.Frame(self.main_frame)
-        self.content_frame.pack(fill=BOTH, expand=YES)
-        
-        # Navigation button on the left
-        self.prev_btn = ttk.Button(self.content_frame, text="<", command=self.prev_page, 
-                                  bootstyle="secondary", width=4, padding=10)
-        self.prev_btn.pack(side=LEFT, fill=Y, padx=(0, 15))
-        
-        # Central container for links
-        self.links_container = ttk.Frame(self.content_frame)
-        self.links_container.pack(side=LEFT, fill=BOTH, expand=YES)
-        
-        # Link grid (4x4)
-        self.links_frame = ttk.Frame(self.links_container)
-        self.links_frame.pack(fill=BOTH, expand=YES)
-        
-        # Configure 4x4 grid
-        for i in range(4):
-            self.links_frame.columnconfigure(i, weight=1, uniform="column")
-            self.links_frame.rowconfigure(i, weight=1, uniform="row")
-        
-        # Navigation button on the right
-        self.next_btn = ttk.Button(self.content_frame, text=">", command=self.next_page, 
-                                  bootstyle="secondary", width=4, padding=10)
-        self.next_btn.pack(side=RIGHT, fill=Y, padx=(15, 0))
-    
-    def load_initial_page(self):
-        """Loads the first page or creates one if it doesn't exist"""
-        self.cursor.execute("SELECT id FROM pages LIMIT 1")
-        result = self.cursor.fetchone()
-        
-        if result:
-            self.current_page_id = result[0]
-            self.load_page(self.current_page_id)
-        else:
-            # Create first page if not exists
-            self.cursor.execute("INSERT INTO pages (title) VALUES ('Quick Access to Everything')")
-            self.conn.commit()
-            self.current_page_id = self.cursor.lastrowid
-            self.load_page(self.current_page_id)
-    
-    def load_page(self, page_id):
-        """Loads a specific page"""
-        # Clear current grid
-        self.clear_links_grid()
-        
-        # Load page title
-        self.cursor.execute("SELECT title FROM pages WHERE id = ?", (page_id,))
-        title = self.cursor.fetchone()[0]
-        self.title_label.config(text=title)
-        
-        # Load page links
-        self.cursor.execute("SELECT id, url, position, image, title FROM links WHERE page_id = ? ORDER BY position", (page_id,))
-        links = self.cursor.fetchall()
-        
-        # Create empty 4x4 grid
-        self.links_buttons = []
-        for i in range(16):
-            row = i // 4
-            col = i % 4
-            
-            # Find link to this position (if it exists)
-            link_data = None
-            for link in links:
-                if link[2] == i:  # position = i
-                    link_data = link
-                    break
-            
-            # Create frame for the link
-            link_frame = ttk.Frame(self.links_frame, bootstyle="default")
-            link_frame.grid(row=row, column=col, padx=10, pady=10, sticky="nsew")
-            
-            if link_data:
-                # Add button with image (if available) or title
-                if link_data[3]:  # If you have an image
-                    img = Image.open(io.BytesIO(link_data[3]))
-                    img = img.resize((120, 120), Image.LANCZOS)
-                    photo = ImageTk.PhotoImage(img)
-                    
-                    btn = ttk.Button(link_frame, image=photo, bootstyle="success-outline", command=lambda url=link_data[1]: self.open_url(url))
-                    btn.image = photo  # Keep reference
-                else:
-                    # Use title or URL if no image
-                    link_title = link_data[4] if link_data[4] else "Link"
-                    btn = ttk.Button(link_frame, text=link_title, bootstyle="success-outline",
-                                   command=lambda url=link_data[1]: self.open_url(url))
-                
-                btn.link_id = link_data[0]  # Store Link ID for Deletion
-                btn.position = link_data[2]  # Store position
-                btn.pack(fill=BOTH, expand=YES)
-                self.links_buttons.append(btn)
-            else:
-                # Create empty button if there is no link at this position
-                empty_btn = ttk.Button(link_frame, text="Empty", state="disabled", bootstyle="light")
-                empty_btn.position = i  # Store position
-                empty_btn.link_id = None  # No link ID
-                empty_btn.pack(fill=BOTH, expand=YES)
-                self.links_buttons.append(empty_btn)
-        
-        # Update navigation buttons
-        self.update_navigation_buttons()
-    
-    def clear_links_grid(self):
-        """Clear the link grid"""
-        for widget in self.links_frame.winfo_children():
-            widget.destroy()
-        self.links_buttons = []
-    
-    def add_link(self):
-        """Add a new link"""
-        # Check if we already have 16 links on the page
-        self.cursor.execute("SELECT COUNT(*) FROM links WHERE page_id = ?", (self.current_page_id,))
-        count = self.cursor.fetchone()[0]
-        
-        if count >= 16:
-            messagebox.showinfo("Limit Reached", "This page already contains the maximum of 16 links.")
-            return
-        
-        # Create custom dialog window
-        dialog = ttk.Toplevel(self.root)
-        dialog.title("Add New Link")
-        dialog.geometry("400x200")
-        dialog.resizable(False, False)
-        
-        # Make the window modal
-        dialog.transient(self.root)
-        dialog.grab_set()
-        
-        # Variables to store values
-        url_var = tk.StringVar()
-        title_var = tk.StringVar()
-        
-        # Main frame
-        main_frame = ttk.Frame(dialog, padding=15)
-        main_frame.pack(fill=BOTH, expand=YES)
-        
-        # URL
-        url_frame = ttk.Frame(main_frame)
-        url_frame.pack(fill=X, pady=(0, 10))
-        ttk.Label(url_frame, text="Website URL:", width=12).pack(side=LEFT)
-        ttk.Entry(url_frame, textvariable=url_var, width=40).pack(side=LEFT, fill=X, expand=YES)
-        
-        # Title
-        title_frame = ttk.Frame(main_frame)
-        title_frame.pack(fill=X, pady=(0, 20))
-        ttk.Label(title_frame, text="Link title:", width=12).pack(side=LEFT)
-        ttk.Entry(title_frame, textvariable=title_var, width=40).pack(side=LEFT, fill=X, expand=YES)
-        
-        # Dialogue result
-        result = {"url": None, "title": None, "submitted": False}
-        
-        def on_submit():
-            # Validate basic URL
-            url = url_var.get()
-            if not url:
-                messagebox.showwarning("Invalid URL", "Please enter a valid URL.")
-                return
-            
-            # Comment this condition to open PDF files or other types of files
-            """ if not (url.startswith("http://") or url.startswith("https://")):
-                url = "https://" + url """
-                
-            result["url"] = url
-            result["title"] = title_var.get()
-            result["submitted"] = True
-            dialog.destroy()
-        
-        def on_cancel():
-            dialog.destroy()
-        
-        # Buttons
-        buttons_frame = ttk.Frame(main_frame)
-        buttons_frame.pack(fill=X)
-        
-        ttk.Button(buttons_frame, text="Cancel", command=on_cancel, 
-                bootstyle="secondary", width=10).pack(side=RIGHT, padx=(5, 0))
-        ttk.Button(buttons_frame, text="Add", command=on_submit, 
-                bootstyle="success", width=10).pack(side=RIGHT)
-        
-        # Centralize dialogue
-        dialog.update_idletasks()
-        width = dialog.winfo_width()
-        height = dialog.winfo_height()
-        x = (dialog.winfo_screenwidth() // 2) - (width // 2)
-        y = (dialog.winfo_screenheight() // 2) - (height // 2)
-        dialog.geometry('{}x{}+{}+{}'.format(width, height, x, y))
-        
-        # Wait until the dialog is closed
-        dialog.wait_window()
-        
-        # If the form has been submitted, continue with adding the link
-        if result["submitted"] and result["url"]:
-            url = result["url"]
-            title = result["title"]
-            
-            # Ask if you want to add an image
-            add_image = messagebox.askyesno("Add Image", "Want to add an image to this link?")
-            image_data = None
-            
-            if add_image:
-                file_path = filedialog.askopenfilename(title="Select an image", 
-                                                filetypes=[("Image Files", "*.png *.jpg *.jpeg *.gif *.bmp")])
-                if file_path:
-                    with open(file_path, "rb") as f:
-                        image_data = f.read()
-            
-            # Find the next available position
-            position = None
-            for i, btn in enumerate(self.links_buttons):
-                if btn.link_id is None:
-                    position = btn.position
-                    break
-            
-            if position is None:
-                position = 0  # Fallback (should not happen)
-            
-            # Insert into database
-            self.cursor.execute("""
-                INSERT INTO links (page_id, url, position, image, title) 
-                VALUES (?, ?, ?, ?, ?)
-            """, (self.current_page_id, url, position, image_data, title))
-            self.conn.commit()
-            
-            # Reload page
-            self.load_page(self.current_page_id)
-
-    def delete_link(self):
-        """Deletes a link from the current page"""
-        # Check for links to delete
-        self.cursor.execute("SELECT COUNT(*) FROM links WHERE page_id = ?", (self.current_page_id,))
-        count = self.cursor.fetchone()[0]
-        
-        if count == 0:
-            messagebox.showinfo("No Link", "There are no links that can be deleted on this page.")
-            return
-        
-        # Create window for selecting links to delete
-        delete_window = ttk.Toplevel(self.root)
-        delete_window.title("Delete Link")
-        delete_window.geometry("450x500")
-        
-        ttk.Label(delete_window, text="Select a link to delete:").pack(pady=10)
-        
-        # List of links
-        links_listbox = ttk.Treeview(delete_window, columns=("title", "url"), show="headings")
-        links_listbox.heading("title", text="Title")
-        links_listbox.heading("url", text="URL")
-        links_listbox.column("title", width=150)
-        links_listbox.column("url", width=300)
-        links_listbox.pack(fill=BOTH, expand=YES, padx=10, pady=10)
-        
-        # Populate list with links from current page
-        self.cursor.execute("SELECT id, url, title FROM links WHERE page_id = ? ORDER BY position", (self.current_page_id,))
-        links = self.cursor.fetchall()
-        
-        for link in links:
-            # Truncate URL for display
-            display_url = link[1]
-            if len(display_url) > 40:
-                display_url = display_url[:37] + "..."
-                
-            # Use title or "Link" if there is no title
-            display_title = link[2] if link[2] else "Untitled link"
-            
-            links_listbox.insert("", "end", values=(display_title, display_url), iid=link[0])
-        
-        # Delete button
-        def confirm_delete():
-            selected = links_listbox.selection()
-            if selected:
-                link_id = selected[0]
-                
-                if messagebox.askyesno("Confirm Deletion", "Are you sure you want to delete this link??"):
-                    self.cursor.execute("DELETE FROM links WHERE id = ?", (link_id,))
-                    self.conn.commit()
-                    delete_window.destroy()
-                    self.load_page(self.current_page_id)
-            else:
-                messagebox.showinfo("Selection required", "Please select a link to delete.")
-        
-        ttk.Button(delete_window, text="Delete Selected Link", bootstyle="danger", 
-                 command=confirm_delete).pack(pady=10)
-    
-    def change_page_title(self):
-        """Changes the title of the current page"""
-        current_title = self.title_label.cget("text")
-        new_title = simpledialog.askstring("Change Title", "Enter new page title:", initialvalue=current_title)
-        
-        if new_title:
-            self.cursor.execute("UPDATE pages SET title = ? WHERE id = ?", (new_title, self.current_page_id))
-            self.conn.commit()
-            self.title_label.config(text=new_title)
-    
-    def add_page(self):
-        """Add a new page"""
-        title = simpledialog.askstring("New Page", "Enter the title of the new page:", initialvalue="New Page")
-        
-        if title:
-            self.cursor.execute("INSERT INTO pages (title) VALUES (?)", (title,))
-            self.conn.commit()
-            page_id = self.cursor.lastrowid
-            self.current_page_id = page_id
-            self.load_page(page_id)
-    
-    def delete_page(self):
-        """Deletes the current page"""
-        # Count total pages
-        self.cursor.execute("SELECT COUNT(*) FROM pages")
-        total_pages = self.cursor.fetchone()[0]
-        
-        if total_pages <= 1:
-            messagebox.showinfo("Operation Denied", "Cannot delete last page.")
-            return
-        
-        # Confirm deletion
-        confirm = messagebox.askyesno("Confirm Deletion", 
-                                     "Are you sure you want to delete this page and all its links? This action cannot be undone.")
-        
-        if confirm:
-            # Find previous or next page to navigate after deletion
-            self.cursor.execute("SELECT id FROM pages WHERE id < ? ORDER BY id DESC LIMIT 1", (self.current_page_id,))
-            prev_page = self.cursor.fetchone()
-            
-            if not prev_page:
-                self.cursor.execute("SELECT id FROM pages WHERE id > ? ORDER BY id LIMIT 1", (self.current_page_id,))
-                prev_page = self.cursor.fetchone()
-            
-            if prev_page:
-                next_page_id = prev_page[0]
-                
-                # Delete links from current page
-                self.cursor.execute("DELETE FROM links WHERE page_id = ?", (self.current_page_id,))
-                
-                # Delete current page
-                self.cursor.execute("DELETE FROM pages WHERE id = ?", (self.current_page_id,))
-                self.conn.commit()
-                
-                # Load next page
-                self.current_page_id = next_page_id
-                self.load_page(next_page_id)
-    
-    def prev_page(self):
-        """Navigate to the previous page"""
-        self.cursor.execute("SELECT id FROM pages WHERE id < ? ORDER BY id DESC LIMIT 1", (self.current_page_id,))
-        prev_page = self.cursor.fetchone()
-        
-        if prev_page:
-            self.current_page_id = prev_page[0]
-            self.load_page(self.current_page_id)
-    
-    def next_page(self):
-        """Navigate to the next page"""
-        self.cursor.execute("SELECT id FROM pages WHERE id > ? ORDER BY id LIMIT 1", (self.current_page_id,))
-        next_page = self.cursor.fetchone()
-        
-        if next_page:
-            self.current_page_id = next_page[0]
-            self.load_page(self.current_page_id)
-    
-    def update_navigation_buttons(self):
-        """Updates the state of the navigation buttons"""
-        # Check for previous page
-        self.cursor.execute("SELECT EXISTS(SELECT 1 FROM pages WHERE id < ?)", (self.current_page_id,))
-        has_prev = self.cursor.fetchone()[0]
-        
-        # Check for next page
-        self.cursor.execute("SELECT EXISTS(SELECT 1 FROM pages WHERE id > ?)", (self.current_page_id,))
-        has_next = self.cursor.fetchone()[0]
-        
-        # Update button state
-        if has_prev:
-            self.prev_btn.config(state="normal")
-        else:
-            self.prev_btn.config(state="disabled")
-        
-        if has_next:
-            self.next_btn.config(state="normal")
-        else:
-            self.next_btn.config(state="disabled")
-    
-    def open_url(self, url):
-        """Opens the URL in the default browser"""
-        webbrowser.open(url)
-    
-    def on_close(self):
-        """Closing the application"""
-        self.conn.close()
-        self.root.destroy()
-
-def main():
-    # Check dependencies
+import sqlite3
+import sys
+import perf
+import usage
+from store import DEFAULT_DB_PATH, QuickLinkStore
+
+
+class CommandError(Exception):
+    """A command that can't be carried out, reported without a traceback"""
+
+
+def output(args, data, lines):
+    """Prints data as JSON with --json, otherwise the human readable lines"""
+    if args.json:
+        json.dump(data, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        for line in lines:
+            print(line)
+
+
+def link_dict(link_id, page_id, url, title, position, image_hash):
+    return {"id": link_id, "page_id": page_id, "position": position, "title": title, "url": url,
+            "has_image": image_hash is not None}
+
+
+def link_line(link):
+    return f"{link['id']:>7}  {link['page_id']:>5}:{link['position']:<2}  {link['title'] or '-'}  {link['url']}"
+
+
+# === COMMANDS ===
+
+def cmd_pages(store, args):
+    pages = [{"id": page_id, "title": title, "links": count} for page_id, title, count in store.list_pages()]
+    output(args, pages, (f"{page['id']:>5}  {page['links']:>2} links  {page['title']}" for page in pages))
+
+
+def cmd_list(store, args):
+    page_ids = [args.page] if args.page is not None else store.page_ids
+    links = []
+    for page_id in page_ids:
+        if page_id not in store.page_index:
+            raise CommandError(f"No page with id {page_id}")
+        for link_id, url, title, position, image_hash in store.list_links(page_id):
+            links.append(link_dict(link_id, page_id, url, title, position, image_hash))
+    output(args, links, (link_line(link) for link in links))
+
+
+def cmd_add(store, args):
+    page_id = args.page
+    if page_id is None:
+        # First page with room, or a new page when every page is full
+        page_id = store.first_page_with_room()
+        if page_id is None:
+            page_id = store.add_page("New Page")
+    elif page_id not in store.page_index:
+        raise CommandError(f"No page with id {page_id}")
+
+    position = store.first_free_position(page_id)
+    if position is None:
+        raise CommandError(f"Page {page_id} already contains the maximum of {store.page_size} links")
+
+    image_hash = None
+    if args.image:
+        import ingest
+        try:
+            image_hash = store.add_image(ingest.normalize_file(args.image, *ingest.settings(store)))
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Can't use image: {e}")
+
+    link_id = store.add_link(page_id, args.url, position, args.title, image_hash)
+    link = link_dict(link_id, page_id, args.url, args.title, position, image_hash)
+    output(args, link, [link_line(link)])
+
+
+def cmd_rm(store, args):
+    removed = []
+    for link_id in args.link_ids:
+        if store.get_link(link_id) is None:
+            raise CommandError(f"No link with id {link_id}")
+        store.delete_link(link_id)
+        removed.append(link_id)
+    output(args, {"removed": removed}, (f"Removed link {link_id}" for link_id in removed))
+
+
+def cmd_open(store, args):
+    # A single number is a link id, anything else is searched for
+    text = " ".join(args.target)
+    if text.isdigit():
+        link = store.get_link(int(text))
+        if link is None:
+            raise CommandError(f"No link with id {text}")
+        link = link_dict(*link)
+    else:
+        results = store.search(text, 1)
+        if not results:
+            raise CommandError(f"No link matches {text!r}")
+        link = link_dict(*store.get_link(results[0].link_id))
+
+    import webbrowser
+    webbrowser.open(link["url"])
+    store.record_launch(link["id"])
+    output(args, link, [f"Opened {link['url']}"])
+
+
+def cmd_top(store, args):
+    now = time.time()
+    links = [
+        {"id": link_id, "page_id": page_id, "title": title, "url": url, "launches": launches,
+         "last_opened": time.strftime("%Y-%m-%d %H:%M", time.localtime(last_opened)),
+         "score": round(usage.decayed_launches(frecency, now), 2)}
+        for link_id, page_id, url, title, image_hash, launches, last_opened, frecency in store.most_used(args.limit)
+    ]
+    output(args, links, (
+        f"{link['id']:>7}  {link['score']:>7.2f}  {link['launches']:>5}x  {link['last_opened']}  "
+        f"{link['title'] or '-'}  {link['url']}"
+        for link in links
+    ))
+
+
+def cmd_prune(store, args):
+    import sync
+    file_before = store.stats()["database_bytes"]
+    deleted = store.prune_usage(args.days)
+    with store.conn:
+        forgotten = sync.prune_tombstones(store.conn)
+    store.vacuum()
+    file_after = store.stats()["database_bytes"]
+    result = {"launches_deleted": deleted, "deletions_forgotten": forgotten,
+              "database_bytes_before": file_before, "database_bytes_after": file_after}
+    output(args, result, [
+        f"Deleted {deleted} launches older than {args.days} days or of deleted links",
+        f"Forgot {forgotten} pages and links deleted more than {sync.TOMBSTONE_KEEP_DAYS} days ago",
+        f"Database: {file_before} -> {file_after} bytes",
+    ])
+
+
+def cmd_search(store, args):
+    results = [
+        {"id": result.link_id, "page_id": result.page_id, "title": result.title, "url": result.url,
+         "page_title": result.page_title}
+        for result in store.search(" ".join(args.query), args.limit)
+    ]
+    output(args, results, (
+        f"{result['id']:>7}  {result['title'] or '-'}  {result['url']}  [{result['page_title']}]"
+        for result in results
+    ))
+
+
+def cmd_stats(store, args):
+    stats = store.stats()
+    output(args, stats, (f"{key}: {value}" for key, value in stats.items()))
+
+
+def cmd_grid(store, args):
+    moved = 0
+    if args.size:
+        try:
+            rows, columns = (int(part) for part in args.size.lower().split("x"))
+        except ValueError:
+            raise CommandError(f"Grid size must look like 4x4, not {args.size!r}")
+        moved = store.set_grid(rows, columns)
+    grid = {"rows": store.rows, "columns": store.columns, "moved": moved}
+    lines = [f"{store.rows}x{store.columns}"]
+    if moved:
+        lines.append(f"Moved {moved} links that no longer fit their page")
+    output(args, grid, lines)
+
+
+def cmd_reencode(store, args):
+    import ingest
+    max_size, image_format = ingest.settings(store)
+    max_size = args.max_size or max_size
+    image_format = args.format or image_format
+    if max_size < 1:
+        raise CommandError("--max-size must be at least 1 pixel")
+
+    # New images follow the options used for the existing ones
+    store.set_setting("image_max_size", max_size)
+    store.set_setting("image_format", image_format)
+
+    file_before = store.stats()["database_bytes"]
+
+    def progress(done, total):
+        if not args.json and sys.stderr.isatty():
+            print(f"\rRe-encoding images: {done}/{total}", end="", file=sys.stderr)
+
+    changed, kept, before, after = ingest.reencode_images(store, max_size, image_format, args.workers, progress)
+    if not args.json and sys.stderr.isatty():
+        print(file=sys.stderr)
+    store.vacuum()
+    file_after = store.stats()["database_bytes"]
+
+    result = {"images_changed": changed, "images_kept": kept, "image_bytes_before": before, "image_bytes_after": after,
+              "database_bytes_before": file_before, "database_bytes_after": file_after,
+              "bytes_reclaimed": file_before - file_after}
+    output(args, result, [
+        f"Re-encoded {changed} images to {image_format} of at most {max_size}px",
+        f"Kept {kept} images as they were, re-encoding didn't make them smaller",
+        f"Images: {before} -> {after} bytes",
+        f"Database: {file_before} -> {file_after} bytes ({file_before - file_after} bytes reclaimed)",
+    ])
+
+
+def cmd_backup(store, args):
+    import backup
+    store.flush_launches()
+
+    def progress(copied, total):
+        if not args.json and sys.stderr.isatty():
+            print(f"\rBacking up: {copied * 100 // max(total, 1)}%", end="", file=sys.stderr)
+
+    path = backup.create_backup(store.path, args.dir, progress=progress)
+    if not args.json and sys.stderr.isatty():
+        print(file=sys.stderr)
+    output(args, {"file": path, "bytes": os.path.getsize(path)}, [f"Backed up to {path}"])
+
+
+def cmd_backups(store, args):
+    import backup
+    backups = []
+    for path, when in backup.list_backups(args.dir or backup.backup_dir(store.path)):
+        item = {"file": path, "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(when)),
+                "bytes": os.path.getsize(path)}
+        if args.check:
+            item["problems"] = backup.check_backup(path)
+        backups.append(item)
+    output(args, backups, (
+        f"{item['time']}  {item['bytes']:>12}  {item['file']}"
+        + (("  OK" if not item["problems"] else "  DAMAGED: " + item["problems"][0]) if args.check else "")
+        for item in backups
+    ))
+
+
+def cmd_restore(store, args):
+    import backup
+    store.flush_launches()
+    safety = backup.restore_backup(store.path, args.file)
+    output(args, {"restored": args.file, "previous": safety}, [
+        f"Restored {args.file}",
+        f"The previous content was backed up to {safety}",
+    ])
+
+
+def cmd_sync(store, args):
+    import sync
+    store.flush_launches()
+    result = sync.sync_files(store.path, args.file)
+    store.load_page_index()
+    output(args, result._asdict(), [
+        f"Received {result.received} changed pages and links, {result.images_received} images",
+        f"Sent {result.sent} changed pages and links, {result.images_sent} images",
+    ] + ([f"Moved {result.moved} links that claimed the same tile"] if result.moved else []))
+
+
+def cmd_check(store, args):
+    import health
+    checks = []
+    while True:
+        batch = health.check_due(store.path, args.limit)
+        checks += batch
+        if not args.all or not batch:
+            break
+    results = [{"id": check.link_id, "url": check.url, "status": check.status, "detail": check.detail}
+               for check in checks]
+    output(args, results, (
+        f"{result['id']:>7}  {result['status']:<11}  {result['url']}"
+        + (f"  ({result['detail']})" if result["detail"] else "")
+        for result in results if args.verbose or result["status"] in ("broken", "redirected", "unreachable")
+    ))
+    if not args.json:
+        broken = sum(result["status"] == "broken" for result in results)
+        print(f"Checked {len(results)} links, {broken} broken")
+
+
+def cmd_broken(store, args):
+    import health
+    links = [
+        {"id": link_id, "page_id": page_id, "url": url, "title": title, "flag": flag, "status": status,
+         "detail": detail, "checked_at": time.strftime("%Y-%m-%d %H:%M", time.localtime(checked_at))}
+        for link_id, page_id, url, title, flag, status, detail, checked_at in health.flagged_links(store.conn)
+    ]
+    output(args, links, (
+        f"{link['id']:>7}  {link['page_id']:>5}  {link['flag']:<10}  {link['checked_at']}  {link['url']}"
+        + (f"  ({link['detail']})" if link["detail"] else "")
+        for link in links
+    ))
+
+
+def cmd_import(store, args):
+    import bookmarks
+    page_ids, count = bookmarks.import_file(store, args.file)
+    output(args, {"links": count, "page_ids": page_ids}, [f"Imported {count} links into {len(page_ids)} new pages"])
+
+
+def cmd_export(store, args):
+    import bookmarks
+    bookmarks.export_file(store, args.file)
+    output(args, {"file": args.file}, [f"Exported links to {args.file}"])
+
+
+def launch_gui(db_path, timing=False):
+    """Opens the window, GUI modules are only imported here"""
     try:
-        import ttkbootstrap
-        import PIL
+        import gui
     except ImportError:
         print("Installing required dependencies...")
         import subprocess
-        subprocess.call(['pip', 'install', 'ttkbootstrap', 'pillow'])
-    
-    root = ttk.Window(themename="journal")
-    app = QuickLink(root)
-    root.protocol("WM_DELETE_WINDOW", app.on_close)
-    root.mainloop()
+        subprocess.call([sys.executable, '-m', 'pip', 'install', 'ttkbootstrap', 'pillow'])
+        import gui
+    gui.main(db_path, STARTED, timing)
+
+
+def build_parser():
+    # Global options are accepted before or after the command, the defaults
+    # are applied in main() so a subcommand never overwrites a value given earlier
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--db", default=argparse.SUPPRESS,
+                        help=f"database file (default: $QUICKLINK_DB or {DEFAULT_DB_PATH})")
+    common.add_argument("--json", action="store_true", default=argparse.SUPPRESS, help="print results as JSON")
+    common.add_argument("--perf", action="store_true", default=argparse.SUPPRESS,
+                        help="time the hot paths and print a summary on exit (also QUICKLINK_PERF=1)")
+
+    parser = argparse.ArgumentParser(prog="quicklink", description="QuickLink - Quick Access to Everything",
+                                     parents=[common])
+    parser.add_argument("--timing", action="store_true", help="print the startup times of the window")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    command = commands.add_parser("pages", parents=[common], help="list pages")
+    command.set_defaults(run=cmd_pages)
+
+    command = commands.add_parser("list", parents=[common], help="list links")
+    command.add_argument("--page", type=int, help="only the links of this page")
+    command.set_defaults(run=cmd_list)
+
+    command = commands.add_parser("add", parents=[common], help="add a link")
+    command.add_argument("url")
+    command.add_argument("--title")
+    command.add_argument("--page", type=int, help="page id (default: first page with room)")
+    command.add_argument("--image", help="image file shown on the tile")
+    command.set_defaults(run=cmd_add)
+
+    command = commands.add_parser("rm", parents=[common], help="delete links")
+    command.add_argument("link_ids", type=int, nargs="+", metavar="LINK_ID")
+    command.set_defaults(run=cmd_rm)
+
+    command = commands.add_parser("open", parents=[common], help="open a link by id, or the best search match")
+    command.add_argument("target", nargs="+", metavar="LINK_ID_OR_QUERY")
+    command.set_defaults(run=cmd_open)
+
+    command = commands.add_parser("search", parents=[common], help="search links")
+    command.add_argument("query", nargs="+")
+    command.add_argument("--limit", type=int, default=20)
+    command.set_defaults(run=cmd_search)
+
+    command = commands.add_parser("top", parents=[common], help="list the most used links")
+    command.add_argument("--limit", type=int, default=20)
+    command.set_defaults(run=cmd_top)
+
+    command = commands.add_parser("prune", parents=[common],
+                                  help="delete old launch history and sync records, then compact the database")
+    command.add_argument("--days", type=int, default=usage.KEEP_DAYS,
+                         help=f"days of history kept (default: {usage.KEEP_DAYS})")
+    command.set_defaults(run=cmd_prune)
+
+    command = commands.add_parser("check", parents=[common],
+                                  help="check the links due for a health check, never checked and oldest first")
+    command.add_argument("--limit", type=int, default=100, help="links per batch (default: 100)")
+    command.add_argument("--all", action="store_true", help="check batches until no link is due")
+    command.add_argument("--verbose", action="store_true", help="also list the links that are fine")
+    command.set_defaults(run=cmd_check)
+
+    command = commands.add_parser("broken", parents=[common], help="list the links the health checks flagged")
+    command.set_defaults(run=cmd_broken)
+
+    command = commands.add_parser("stats", parents=[common], help="database statistics")
+    command.set_defaults(run=cmd_stats)
+
+    command = commands.add_parser("grid", parents=[common], help="show or change the grid size of every page")
+    command.add_argument("size", nargs="?", metavar="ROWSxCOLUMNS")
+    command.set_defaults(run=cmd_grid)
+
+    command = commands.add_parser("reencode", parents=[common],
+                                  help="scale down and re-encode every stored image, then compact the database")
+    command.add_argument("--max-size", type=int, help="longest side in pixels (default: 512, or the last value used)")
+    command.add_argument("--format", choices=["webp", "png"], help="image format (default: webp if available)")
+    command.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    command.set_defaults(run=cmd_reencode)
+
+    command = commands.add_parser("backup", parents=[common], help="back the database up, even while it is in use")
+    command.add_argument("--dir", help="backup directory (default: next to the database)")
+    command.set_defaults(run=cmd_backup)
+
+    command = commands.add_parser("backups", parents=[common], help="list the backups of the database")
+    command.add_argument("--dir", help="backup directory (default: next to the database)")
+    command.add_argument("--check", action="store_true", help="check the integrity of every backup")
+    command.set_defaults(run=cmd_backups)
+
+    command = commands.add_parser("restore", parents=[common],
+                                  help="replace the database with a backup, the current content is backed up first")
+    command.add_argument("file")
+    command.set_defaults(run=cmd_restore)
+
+    command = commands.add_parser("sync", parents=[common],
+                                  help="merge the changes of another database into this one and back")
+    command.add_argument("file")
+    command.set_defaults(run=cmd_sync)
+
+    command = commands.add_parser("import", parents=[common], help="import a bookmark file (.html, .json, .csv)")
+    command.add_argument("file")
+    command.set_defaults(run=cmd_import)
+
+    command = commands.add_parser("export", parents=[common], help="export every link (.html, .json, .csv)")
+    command.add_argument("file")
+    command.set_defaults(run=cmd_export)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.db = os.path.abspath(getattr(args, "db", DEFAULT_DB_PATH))
+    args.json = getattr(args, "json", False)
+    if getattr(args, "perf", False):
+        perf.enable()
+    if args.command is None:
+        launch_gui(args.db, args.timing)
+        return 0
+
+    # Opening fails too on a file that isn't a database, a locked one or a failed migration
+    store = None
+    try:
+        store = QuickLinkStore(args.db)
+        for message in store.migration_messages:
+            print(f"quicklink: {message}", file=sys.stderr)
+        args.run(store, args)
+    except (CommandError, ValueError, OSError, sqlite3.DatabaseError) as e:
+        print(f"quicklink: {e}", file=sys.stderr)
+        return 1
+    except KeyError as e:
+        # Records of an import file without a required field
+        print(f"quicklink: missing key {e}", file=sys.stderr)
+        return 1
+    finally:
+        if store is not None:
+            store.close()
+        if perf.enabled:
+            perf.print_summary()
+    return 0
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,541 @@
+import hashlib
+import sqlite3
+import uuid
+
+# Positions available on the 4x4 grid of databases created before schema versioning
+LEGACY_GRID_SLOTS = 16
+
+
+def image_hash(data):
+    """Returns the key of an image in the content-addressed store"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def new_uid():
+    """Returns a random identifier for a database or a row, kept by every copy of it"""
+    return uuid.uuid4().hex
+
+
+def create_link_triggers(conn):
+    """(Re)creates the triggers that live on the links table"""
+    # Images no longer used by any link are dropped, together with their thumbnails
+    for event in ("DELETE", "UPDATE OF image_hash"):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS images_on_link_{event.split()[0].lower()}
+            AFTER {event} ON links
+            WHEN OLD.image_hash IS NOT NULL
+            BEGIN
+                DELETE FROM images
+                WHERE hash = OLD.image_hash
+                  AND NOT EXISTS (SELECT 1 FROM links WHERE image_hash = OLD.image_hash);
+            END
+        ''')
+
+
+# === MIGRATIONS ===
+# Each step runs in its own transaction and moves the database to the next
+# PRAGMA user_version. A step returns a message when it moved data around,
+# the database is then vacuumed once all steps are done.
+
+def migrate_legacy(conn):
+    """Brings a database from before schema versioning to version 1"""
+    # Columns of an existing links table, empty on a new database
+    columns = [column[1] for column in conn.execute("PRAGMA table_info(links)")]
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT DEFAULT 'New Page'
+        )
+    ''')
+
+    # Content-addressed image store, an image used by many links is stored once
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS images (
+            hash TEXT PRIMARY KEY,
+            data BLOB NOT NULL
+        )
+    ''')
+
+    # Create link table if not exists, or add the missing columns to an older one
+    if not columns:
+        conn.execute('''
+            CREATE TABLE links (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                page_id INTEGER,
+                url TEXT,
+                position INTEGER,
+                image_hash TEXT REFERENCES images (hash),
+                title TEXT,
+                FOREIGN KEY (page_id) REFERENCES pages (id)
+            )
+        ''')
+    else:
+        if 'title' not in columns:
+            conn.execute("ALTER TABLE links ADD COLUMN title TEXT")
+        if 'image_hash' not in columns:
+            conn.execute("ALTER TABLE links ADD COLUMN image_hash TEXT REFERENCES images (hash)")
+
+    # Foreign keys were never enforced, older versions left links of deleted pages behind
+    conn.execute("DELETE FROM links WHERE page_id IS NULL OR page_id NOT IN (SELECT id FROM pages)")
+
+    # Thumbnails used to be keyed by link id, they are rebuilt keyed by image hash
+    thumbnail_columns = [column[1] for column in conn.execute("PRAGMA table_info(thumbnails)")]
+    if 'link_id' in thumbnail_columns:
+        conn.execute("DROP TRIGGER IF EXISTS thumbnails_on_image_update")
+        conn.execute("DROP TRIGGER IF EXISTS thumbnails_on_link_delete")
+        conn.execute("DROP TABLE thumbnails")
+
+    # Pre-scaled tiles, one row per image and target size so HiDPI variants can coexist
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS thumbnails (
+            image_hash TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (image_hash, size)
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS thumbnails_on_image_delete
+        AFTER DELETE ON images
+        BEGIN
+            DELETE FROM thumbnails WHERE image_hash = OLD.hash;
+        END
+    ''')
+
+    # Older databases keep the original image bytes inline in links
+    if 'image' not in columns:
+        return None
+
+    conn.create_function("sha256", 1, image_hash, deterministic=True)
+    before = conn.execute("SELECT COALESCE(SUM(LENGTH(image)), 0) FROM links").fetchone()[0]
+    conn.execute('''
+        INSERT OR IGNORE INTO images (hash, data)
+        SELECT sha256(image), image FROM links WHERE image IS NOT NULL
+    ''')
+    conn.execute("UPDATE links SET image_hash = sha256(image) WHERE image IS NOT NULL")
+
+    # DROP COLUMN needs SQLite 3.35, older versions just empty it
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        conn.execute("ALTER TABLE links DROP COLUMN image")
+    else:
+        conn.execute("UPDATE links SET image = NULL")
+    after = conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM images").fetchone()[0]
+
+    return f"Images moved to the deduplicated store: {before} -> {after} bytes ({before - after} bytes saved)"
+
+
+def fix_link_positions(conn, slots=LEGACY_GRID_SLOTS):
+    """Moves links sharing a grid position, or beyond the first slots, to free positions
+
+    Returns how many links moved.
+    """
+    pages = {}
+    for link_id, page_id, position in conn.execute(
+        "SELECT id, page_id, position FROM links ORDER BY page_id, position IS NULL, position, id"
+    ):
+        pages.setdefault(page_id, []).append((link_id, position))
+
+    moved = 0
+    for page_id, links in pages.items():
+        taken = set()
+        misplaced = []
+        for link_id, position in links:
+            if position in taken or position is None or not 0 <= position < slots:
+                misplaced.append(link_id)
+            else:
+                taken.add(position)
+
+        free = [i for i in range(slots) if i not in taken]
+        for link_id in misplaced:
+            # A full page spills over into a new page
+            if not free:
+                title = conn.execute("SELECT title FROM pages WHERE id = ?", (page_id,)).fetchone()[0]
+                page_id = conn.execute("INSERT INTO pages (title) VALUES (?)", (title,)).lastrowid
+                free = list(range(slots))
+            conn.execute("UPDATE links SET page_id = ?, position = ? WHERE id = ?", (page_id, free.pop(0), link_id))
+            moved += 1
+
+    return moved
+
+
+def migrate_link_constraints(conn):
+    """Version 2: cascading deletes, unique grid positions and indexes on links"""
+    moved = fix_link_positions(conn)
+
+    # SQLite can't add constraints to a table, so links is rebuilt
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'links'").fetchone()
+    conn.execute('''
+        CREATE TABLE links_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            page_id INTEGER NOT NULL REFERENCES pages (id) ON DELETE CASCADE,
+            url TEXT,
+            position INTEGER NOT NULL,
+            image_hash TEXT REFERENCES images (hash),
+            title TEXT,
+            UNIQUE (page_id, position)
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO links_new (id, page_id, url, position, image_hash, title)
+        SELECT id, page_id, url, position, image_hash, title FROM links
+    ''')
+    conn.execute("DROP TABLE links")
+    conn.execute("ALTER TABLE links_new RENAME TO links")
+
+    # Keep ids of deleted links from being reused
+    if row:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'links'", (row[0],))
+
+    # UNIQUE (page_id, position) already indexes page lookups, the image index serves the triggers
+    conn.execute("CREATE INDEX IF NOT EXISTS links_image_hash ON links (image_hash)")
+    create_link_triggers(conn)
+
+    if moved:
+        return f"Moved {moved} links that shared a grid position"
+    return None
+
+
+def migrate_search_index(conn):
+    """Version 3: full-text index over link titles, URLs and page titles"""
+    # The trigram tokenizer matches substrings, which also gives prefix and fuzzy matching
+    conn.execute('''
+        CREATE VIRTUAL TABLE link_search USING fts5(
+            title, url, page_title,
+            tokenize = 'trigram'
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO link_search (rowid, title, url, page_title)
+        SELECT l.id, l.title, l.url, p.title
+        FROM links l
+        JOIN pages p ON p.id = l.page_id
+    ''')
+
+    # Triggers keep the index in sync, deleting a page cascades into links_search_delete
+    conn.execute('''
+        CREATE TRIGGER links_search_insert AFTER INSERT ON links
+        BEGIN
+            INSERT INTO link_search (rowid, title, url, page_title)
+            VALUES (NEW.id, NEW.title, NEW.url, (SELECT title FROM pages WHERE id = NEW.page_id));
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER links_search_update AFTER UPDATE OF id, page_id, title, url ON links
+        BEGIN
+            DELETE FROM link_search WHERE rowid = OLD.id;
+            INSERT INTO link_search (rowid, title, url, page_title)
+            VALUES (NEW.id, NEW.title, NEW.url, (SELECT title FROM pages WHERE id = NEW.page_id));
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER links_search_delete AFTER DELETE ON links
+        BEGIN
+            DELETE FROM link_search WHERE rowid = OLD.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER pages_search_update AFTER UPDATE OF title ON pages
+        BEGIN
+            UPDATE link_search SET page_title = NEW.title
+            WHERE rowid IN (SELECT id FROM links WHERE page_id = NEW.id);
+        END
+    ''')
+
+
+def migrate_change_counter(conn):
+    """Version 4: a counter bumped by every change to pages or links"""
+    # PRAGMA data_version only reports commits made while a connection is open,
+    # the counter survives restarts so a saved startup snapshot can be checked
+    conn.execute('''
+        CREATE TABLE changes (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            counter INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("INSERT INTO changes (id, counter) VALUES (1, 0)")
+
+    for table in ("pages", "links"):
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f'''
+                CREATE TRIGGER {table}_changes_{event.lower()} AFTER {event} ON {table}
+                BEGIN
+                    UPDATE changes SET counter = counter + 1 WHERE id = 1;
+                END
+            ''')
+
+
+def migrate_settings(conn):
+    """Version 5: settings kept with the database, such as the grid size"""
+    conn.execute('''
+        CREATE TABLE settings (
+            key TEXT PRIMARY KEY,
+            value
+        )
+    ''')
+
+
+def migrate_change_log(conn):
+    """Version 6: a log of the pages and tiles touched by every change, replacing the counter"""
+    # The last id of the log is the new counter, it goes on from the old one
+    counter = conn.execute("SELECT counter FROM changes WHERE id = 1").fetchone()[0]
+    for table in ("pages", "links"):
+        for event in ("insert", "update", "delete"):
+            conn.execute(f"DROP TRIGGER {table}_changes_{event}")
+    conn.execute("DROP TABLE changes")
+
+    # A NULL position stands for the page itself (created, renamed or deleted),
+    # a NULL page for the whole database (the grid size changed)
+    conn.execute('''
+        CREATE TABLE change_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            page_id INTEGER,
+            position INTEGER
+        )
+    ''')
+    conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('change_log', ?)", (counter,))
+
+    conn.execute('''
+        CREATE TRIGGER pages_log_insert AFTER INSERT ON pages
+        BEGIN
+            INSERT INTO change_log (page_id) VALUES (NEW.id);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER pages_log_update AFTER UPDATE ON pages
+        BEGIN
+            INSERT INTO change_log (page_id) VALUES (OLD.id);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER pages_log_delete AFTER DELETE ON pages
+        BEGIN
+            INSERT INTO change_log (page_id) VALUES (OLD.id);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER links_log_insert AFTER INSERT ON links
+        BEGIN
+            INSERT INTO change_log (page_id, position) VALUES (NEW.page_id, NEW.position);
+        END
+    ''')
+    # A link that moved leaves one tile and fills another
+    conn.execute('''
+        CREATE TRIGGER links_log_update AFTER UPDATE ON links
+        BEGIN
+            INSERT INTO change_log (page_id, position) VALUES (OLD.page_id, OLD.position);
+            INSERT INTO change_log (page_id, position)
+            SELECT NEW.page_id, NEW.position
+            WHERE NEW.page_id IS NOT OLD.page_id OR NEW.position IS NOT OLD.position;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER links_log_delete AFTER DELETE ON links
+        BEGIN
+            INSERT INTO change_log (page_id, position) VALUES (OLD.page_id, OLD.position);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER settings_log_grid AFTER INSERT ON settings
+        WHEN NEW.key IN ('grid_rows', 'grid_columns')
+        BEGIN
+            INSERT INTO change_log (page_id) VALUES (NULL);
+        END
+    ''')
+
+
+def migrate_usage(conn):
+    """Version 7: launch history and per-link frecency scores"""
+    # Append-only, pruned by age
+    conn.execute('''
+        CREATE TABLE usage (
+            id INTEGER PRIMARY KEY,
+            link_id INTEGER NOT NULL,
+            opened_at REAL NOT NULL
+        )
+    ''')
+
+    # Maintained as launches are written, the index serves the "Most Used" page
+    conn.execute('''
+        CREATE TABLE link_stats (
+            link_id INTEGER PRIMARY KEY REFERENCES links (id) ON DELETE CASCADE,
+            launches INTEGER NOT NULL,
+            last_opened REAL NOT NULL,
+            frecency REAL NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX link_stats_frecency ON link_stats (frecency)")
+
+    # Page 0 is the "Most Used" page, windows showing it redraw when scores change
+    for event in ("INSERT", "UPDATE"):
+        conn.execute(f'''
+            CREATE TRIGGER link_stats_log_{event.lower()} AFTER {event} ON link_stats
+            BEGIN
+                INSERT INTO change_log (page_id) VALUES (0);
+            END
+        ''')
+
+
+def migrate_sync(conn):
+    """Version 8: stable identifiers and change times of pages and links, for syncing databases"""
+    # One row per page or link, also kept once it is deleted (row_id NULL) so the
+    # deletion reaches other databases. seq orders the rows by their last change,
+    # a sync reads the rows changed since the last seq the other database took.
+    conn.execute('''
+        CREATE TABLE sync_rows (
+            seq INTEGER PRIMARY KEY,
+            uid TEXT NOT NULL UNIQUE,
+            kind TEXT NOT NULL,
+            row_id INTEGER,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    conn.execute("CREATE UNIQUE INDEX sync_rows_row ON sync_rows (kind, row_id)")
+
+    # Last seq taken from each database synced with, and where it was
+    conn.execute('''
+        CREATE TABLE sync_peers (
+            uid TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            synced_at REAL NOT NULL
+        )
+    ''')
+    conn.execute("INSERT INTO settings (key, value) VALUES ('database_uid', ?)", (new_uid(),))
+
+    # Copies of a database made before syncing existed get the same identifiers for
+    # the same rows, so syncing them doesn't duplicate everything. Their change time
+    # is unknown, any later change wins over them.
+    conn.create_function("row_uid", 1, lambda key: image_hash(key.encode())[:32], deterministic=True)
+    conn.execute('''
+        INSERT INTO sync_rows (uid, kind, row_id, updated_at)
+        SELECT row_uid('page:' || id || ':' || COALESCE(title, '')), 'page', id, 0
+        FROM pages ORDER BY id
+    ''')
+    conn.execute('''
+        INSERT INTO sync_rows (uid, kind, row_id, updated_at)
+        SELECT row_uid('link:' || id || ':' || COALESCE(url, '')), 'link', id, 0
+        FROM links ORDER BY id
+    ''')
+
+    now = "(julianday('now') - 2440587.5) * 86400.0"
+    next_seq = "(SELECT COALESCE(MAX(seq), 0) + 1 FROM sync_rows)"
+    for table, kind in (("pages", "page"), ("links", "link")):
+        conn.execute(f'''
+            CREATE TRIGGER {table}_sync_insert AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO sync_rows (uid, kind, row_id, updated_at)
+                VALUES (lower(hex(randomblob(16))), '{kind}', NEW.id, {now});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER {table}_sync_update AFTER UPDATE ON {table}
+            BEGIN
+                UPDATE sync_rows SET seq = {next_seq}, updated_at = {now}
+                WHERE kind = '{kind}' AND row_id = OLD.id;
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER {table}_sync_delete AFTER DELETE ON {table}
+            BEGIN
+                UPDATE sync_rows SET seq = {next_seq}, row_id = NULL, updated_at = {now}
+                WHERE kind = '{kind}' AND row_id = OLD.id;
+            END
+        ''')
+
+
+def migrate_link_health(conn):
+    """Version 9: the result of the last health check of every link"""
+    # flag is what a tile shows: 'broken', 'redirected' or NULL
+    conn.execute('''
+        CREATE TABLE link_health (
+            link_id INTEGER PRIMARY KEY REFERENCES links (id) ON DELETE CASCADE,
+            checked_at REAL NOT NULL,
+            status TEXT NOT NULL,
+            detail TEXT,
+            failures INTEGER NOT NULL DEFAULT 0,
+            flag TEXT,
+            etag TEXT,
+            last_modified TEXT
+        )
+    ''')
+    conn.execute("CREATE INDEX link_health_checked ON link_health (checked_at)")
+
+    # A link pointing somewhere else is checked again, before the others
+    conn.execute('''
+        CREATE TRIGGER link_health_on_url AFTER UPDATE OF url ON links
+        WHEN NEW.url IS NOT OLD.url
+        BEGIN
+            DELETE FROM link_health WHERE link_id = NEW.id;
+        END
+    ''')
+
+    # Windows redraw the tiles whose flag changed
+    conn.execute('''
+        CREATE TRIGGER link_health_log_insert AFTER INSERT ON link_health
+        WHEN NEW.flag IS NOT NULL
+        BEGIN
+            INSERT INTO change_log (page_id, position) SELECT page_id, position FROM links WHERE id = NEW.link_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER link_health_log_update AFTER UPDATE OF flag ON link_health
+        WHEN NEW.flag IS NOT OLD.flag
+        BEGIN
+            INSERT INTO change_log (page_id, position) SELECT page_id, position FROM links WHERE id = NEW.link_id;
+        END
+    ''')
+
+
+MIGRATIONS = [
+    migrate_legacy,
+    migrate_link_constraints,
+    migrate_search_index,
+    migrate_change_counter,
+    migrate_settings,
+    migrate_change_log,
+    migrate_usage,
+    migrate_sync,
+    migrate_link_health,
+]
+
+
+def migrate(conn):
+    """Runs the pending migrations, returns the messages of the steps that moved data"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    messages = []
+
+    # Explicit transactions so DDL is rolled back together with the data of a failed step
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        for target, step in enumerate(MIGRATIONS, 1):
+            if target <= version:
+                continue
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have run the step while this one waited for the lock
+                if conn.execute("PRAGMA user_version").fetchone()[0] >= target:
+                    conn.execute("ROLLBACK")
+                    continue
+                message = step(conn)
+                if conn.execute("PRAGMA foreign_key_check").fetchone():
+                    raise sqlite3.IntegrityError(f"Migration to version {target} broke a foreign key")
+                conn.execute(f"PRAGMA user_version = {target}")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+            if message:
+                messages.append(message)
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.isolation_level = isolation_level
+
+    # Give the freed pages back to the file system
+    if messages:
+        conn.execute("VACUUM")
+    return messages
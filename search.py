@@ -0,0 +1,152 @@
+import math
+import time
+from collections import namedtuple
+from itertools import combinations
+from usage import decayed_launches
+
+# Results returned when the caller doesn't ask for a number
+SEARCH_LIMIT = 20
+
+# Rows fetched from the index before ranking. Ranking every match with bm25 costs
+# tens of milliseconds on common terms, so candidates are fetched unranked (FTS5
+# stops at the LIMIT) and scored in Python.
+CANDIDATES = 200
+
+# Most used links also ranked when they match. Common terms match far more links
+# than CANDIDATES, and those fetched unranked may all be rarely opened ones.
+FREQUENT_CANDIDATES = 200
+
+SearchResult = namedtuple("SearchResult", "link_id page_id title url page_title frecency")
+
+# Score weights of the searched columns
+WEIGHTS = (10, 2, 1)  # title, url, page_title
+
+# Score per doubling of the (decayed) launches of a link, so a link opened
+# daily gains about as much as a matching title, one opened once as a URL
+FRECENCY_WEIGHT = 2
+
+SELECT = """
+    SELECT l.id, l.page_id, l.title, l.url, s.page_title, u.frecency
+    FROM link_search s
+    JOIN links l ON l.id = s.rowid
+    LEFT JOIN link_stats u ON u.link_id = l.id
+"""
+
+# The links with the highest frecency, each looked up by primary key
+SELECT_FREQUENT = """
+    SELECT l.id, l.page_id, l.title, l.url, s.page_title, u.frecency
+    FROM (SELECT link_id, frecency FROM link_stats ORDER BY frecency DESC LIMIT ?) u
+    JOIN links l ON l.id = u.link_id
+    JOIN link_search s ON s.rowid = u.link_id
+"""
+
+
+def quote(term):
+    """Quotes a term as an FTS5 string"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def substring_query(words):
+    """FTS5 query matching rows that contain every word, anywhere in a column"""
+    return " AND ".join(quote(word) for word in words)
+
+
+def fuzzy_query(words):
+    """FTS5 query matching rows that share at least two trigrams with a word
+
+    A single typo breaks at most three trigrams of a word, so longer words
+    still share a pair with their misspelling.
+    """
+    groups = []
+    for word in words:
+        grams = sorted(trigrams(word))
+        if len(grams) < 3:
+            groups += [quote(gram) for gram in grams]
+        else:
+            groups += [f"({quote(a)} AND {quote(b)})" for a, b in combinations(grams, 2)]
+    return " OR ".join(groups)
+
+
+def matches(result, words):
+    """Tells whether every word is in a column, as the substring query and the LIKE scan do"""
+    columns = [(text or "").lower() for text in (result[2], result[3], result[4])]
+    return all(any(word in text for text in columns) for word in words)
+
+
+def score(result, words):
+    """Ranks a candidate: word prefixes beat substrings, which beat shared trigrams"""
+    total = 0.0
+    columns = [(text or "").lower() for text in (result.title, result.url, result.page_title)]
+    for word in words:
+        matched = False
+        for text, weight in zip(columns, WEIGHTS):
+            if text.startswith(word) or (" " + word) in text or ("/" + word) in text or ("." + word) in text:
+                total += 2 * weight
+                matched = True
+            elif word in text:
+                total += weight
+                matched = True
+
+        # Typos only, comparing trigrams is the slow part
+        if not matched:
+            grams = trigrams(word)
+            if grams:
+                total += WEIGHTS[0] * len(grams & trigrams(columns[0])) / len(grams)
+    return total
+
+
+def usage_score(result, now):
+    """Ranks a candidate by how often and how recently it was opened"""
+    if result.frecency is None:
+        return 0.0
+    return FRECENCY_WEIGHT * math.log2(1 + decayed_launches(result.frecency, now))
+
+
+def search(conn, text, limit=SEARCH_LIMIT):
+    """Returns the links matching text, best match first
+
+    Only the link_search index, link metadata and the frecency of the
+    candidates (by primary key) are read, never images or launch history.
+    """
+    words = text.lower().split()
+    if not words:
+        return []
+
+    # The trigram index can't look up words shorter than 3 characters, they are scanned for
+    if any(len(word) < 3 for word in words):
+        condition = "(s.title LIKE ? ESCAPE '\\' OR s.url LIKE ? ESCAPE '\\' OR s.page_title LIKE ? ESCAPE '\\')"
+        params = []
+        for word in words:
+            pattern = "%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            params += [pattern, pattern, pattern]
+        rows = conn.execute(
+            SELECT + " WHERE " + " AND ".join(condition for word in words) + " LIMIT ?",
+            params + [CANDIDATES],
+        ).fetchall()
+    else:
+        # Substring matches first, rows sharing trigrams (typos) fill up the rest
+        rows = conn.execute(
+            SELECT + " WHERE link_search MATCH ? LIMIT ?", (substring_query(words), CANDIDATES)
+        ).fetchall()
+        if len(rows) < limit:
+            found = {row[0] for row in rows}
+            more = conn.execute(
+                SELECT + " WHERE link_search MATCH ? LIMIT ?", (fuzzy_query(words), CANDIDATES)
+            ).fetchall()
+            rows += [row for row in more if row[0] not in found]
+
+    # Matching them in Python beats scanning every match of a common term
+    found = {row[0] for row in rows}
+    frequent = conn.execute(SELECT_FREQUENT, (FREQUENT_CANDIDATES,)).fetchall()
+    rows += [row for row in frequent if row[0] not in found and matches(row, words)]
+
+    now = time.time()
+    results = [SearchResult(*row) for row in rows]
+    results.sort(key=lambda result: (
+        -(score(result, words) + usage_score(result, now)), len(result.title or ""), result.link_id
+    ))
+    return results[:limit]
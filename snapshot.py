@@ -0,0 +1,71 @@
+"""Snapshot of the last viewed page, painted at launch before the database is opened
+
+The file sits next to the database and holds everything the first paint needs:
+the page title, its tiles and their thumbnail bytes. It records the change
+counter of the database, so the window only reloads the page when something
+changed since it was written.
+"""
+import base64
+import json
+import os
+from collections import namedtuple
+from store import Link, Page
+
+# Bumped when the layout of the file changes, older files are ignored
+SNAPSHOT_VERSION = 2
+
+Snapshot = namedtuple("Snapshot", "page counter thumbnail_size grid")
+
+
+def snapshot_path(db_path):
+    return db_path + ".snapshot"
+
+
+def save_snapshot(path, page, counter, thumbnail_size, grid):
+    """Writes a page to the snapshot file, replacing the previous one atomically"""
+    data = {
+        "version": SNAPSHOT_VERSION,
+        "counter": counter,
+        "thumbnail_size": thumbnail_size,
+        "grid": list(grid),  # Rows and columns
+        "page": {"id": page.id, "title": page.title, "prev_id": page.prev_id, "next_id": page.next_id},
+        "links": [
+            {
+                "id": link.id, "url": link.url, "position": link.position, "title": link.title,
+                "image_hash": link.image_hash, "health": link.health,
+                "thumbnail": base64.b64encode(link.thumbnail).decode("ascii") if link.thumbnail else None,
+            }
+            for link in page.links.values()
+        ],
+    }
+
+    # A crash while writing leaves the old snapshot in place
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+def load_snapshot(path):
+    """Returns the saved Snapshot, or None if there is no usable one"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != SNAPSHOT_VERSION:
+            return None
+
+        links = {}
+        for item in data["links"]:
+            thumbnail = base64.b64decode(item["thumbnail"]) if item["thumbnail"] else None
+            links[item["position"]] = Link(
+                item["id"], item["url"], item["position"], item["title"], item["image_hash"], thumbnail,
+                item.get("health"),
+            )
+        page = data["page"]
+        return Snapshot(
+            Page(page["id"], page["title"], links, page["prev_id"], page["next_id"]),
+            data["counter"], data["thumbnail_size"], tuple(data["grid"]),
+        )
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
@@ -0,0 +1,532 @@
+import hashlib
+import io
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from functools import wraps
+import perf
+import usage
+from schema import fix_link_positions, image_hash, migrate
+from search import SEARCH_LIMIT, search
+
+# Database used when no other file is given: $QUICKLINK_DB, or quicklink.db next to
+# the program rather than in whatever directory it was started from
+DEFAULT_DB_PATH = os.environ.get("QUICKLINK_DB") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "quicklink.db"
+)
+
+# Size (in pixels) of the square tiles shown in the grid
+THUMBNAIL_SIZE = 120
+
+# Grid of a new database, the grid size is a setting of each database
+DEFAULT_ROWS = 4
+DEFAULT_COLUMNS = 4
+
+# Number of tiles on a page of the default grid
+PAGE_SIZE = DEFAULT_ROWS * DEFAULT_COLUMNS
+
+# Largest number of rows or columns of the grid
+MAX_GRID = 12
+
+# Bytes moved at a time when streaming image blobs
+CHUNK_SIZE = 64 * 1024
+
+# Seconds a statement waits for another process (a second window, a command) to release the database
+BUSY_TIMEOUT = 5.0
+
+# Extra attempts of a write that still found the database locked, and the first pause between them
+BUSY_RETRIES = 3
+BUSY_BACKOFF = 0.2
+
+# Entries of the change log kept for windows that are catching up
+CHANGE_LOG_KEEP = 1000
+
+# Id of the virtual page showing the most used links, real page ids start at 1
+MOST_USED_PAGE_ID = 0
+MOST_USED_TITLE = "Most Used"
+
+# Launches kept in memory before an early write is due
+LAUNCH_BATCH = 20
+
+# health is the flag of the last health check: 'broken', 'redirected' or None
+Link = namedtuple("Link", "id url position title image_hash thumbnail health", defaults=(None,))
+Page = namedtuple("Page", "id title links prev_id next_id")
+
+
+def connect(path):
+    """Opens a connection with the settings every QuickLink connection uses"""
+    # Statements are only timed while the performance hooks are on
+    # Writes take the write lock when their transaction starts (BEGIN IMMEDIATE), so
+    # they wait for other processes through the busy timeout instead of failing
+    # when a read turns into a write
+    options = {"timeout": BUSY_TIMEOUT, "isolation_level": "IMMEDIATE"}
+    if perf.enabled:
+        options["factory"] = perf.TimedConnection
+    conn = sqlite3.connect(path, **options)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")  # Durable enough with WAL, far fewer fsyncs
+    conn.execute("PRAGMA cache_size = -16000")  # 16 MB
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+def is_busy(error):
+    """Tells whether an sqlite3 error means another connection holds the database"""
+    code = getattr(error, "sqlite_errorcode", None)  # Python 3.11+
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return "locked" in str(error)
+
+
+def retry_busy(fn):
+    """Decorator retrying a write of the store that found the database locked
+
+    Only calls made outside a transaction are retried, after rolling back what
+    they wrote, so a retry never repeats half of someone else's transaction.
+    """
+    @wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        retry = not self.conn.in_transaction
+        for attempt in range(BUSY_RETRIES + 1):
+            try:
+                return fn(self, *args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not retry or attempt == BUSY_RETRIES or not is_busy(e):
+                    raise
+                self.conn.rollback()
+                time.sleep(BUSY_BACKOFF * 2 ** attempt)
+    return wrapper
+
+
+def open_image(conn, image_hash):
+    """Opens a stored image for streaming reads, returns a file object or None"""
+    row = conn.execute("SELECT rowid FROM images WHERE hash = ?", (image_hash,)).fetchone()
+    if row is None:
+        return None
+
+    if hasattr(conn, "blobopen"):
+        return conn.blobopen("images", "data", row[0], readonly=True)
+
+    # Incremental blob I/O needs Python 3.11
+    data = conn.execute("SELECT data FROM images WHERE rowid = ?", (row[0],)).fetchone()[0]
+    return io.BytesIO(data)
+
+
+class QuickLinkStore:
+    """Data access layer of QuickLink, the UI never runs SQL itself"""
+
+    def __init__(self, path, thumbnail_size=THUMBNAIL_SIZE):
+        self.path = path
+        self.thumbnail_size = thumbnail_size
+        self.conn = connect(path)
+        self.migration_messages = migrate(self.conn)
+        self.prune_change_log()
+        self.pending_launches = []
+
+        # The launch history is pruned once its oldest launch is a day past the retention
+        oldest = self.conn.execute("SELECT opened_at FROM usage ORDER BY id LIMIT 1").fetchone()
+        if oldest and oldest[0] < time.time() - (usage.KEEP_DAYS + 1) * 24 * 3600:
+            self.prune_usage()
+
+        self.load_settings()
+        self.load_page_index()
+
+    def close(self):
+        self.flush_launches()
+        self.conn.close()
+
+    def load_page_index(self):
+        # Sorted page ids plus their positions, so prev/next are dictionary lookups
+        self.page_ids = [row[0] for row in self.conn.execute("SELECT id FROM pages ORDER BY id")]
+        self.page_index = {page_id: i for i, page_id in enumerate(self.page_ids)}
+
+    # === SETTINGS ===
+
+    def load_settings(self):
+        """Reads the grid size, again after another process changed it"""
+        self.rows = int(self.get_setting("grid_rows", DEFAULT_ROWS))
+        self.columns = int(self.get_setting("grid_columns", DEFAULT_COLUMNS))
+        self.page_size = self.rows * self.columns
+
+    def get_setting(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    @retry_busy
+    def set_setting(self, key, value):
+        """Stores a setting of this database"""
+        self.conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+        self.conn.commit()
+
+    @retry_busy
+    def set_grid(self, rows, columns):
+        """Changes the number of tiles per page, returns how many links had to move
+
+        Links that no longer fit on their page move to free tiles of the same page,
+        or to new pages when it is full.
+        """
+        if not (1 <= rows <= MAX_GRID and 1 <= columns <= MAX_GRID):
+            raise ValueError(f"The grid can have 1 to {MAX_GRID} rows and columns")
+
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('grid_rows', ?)", (rows,))
+            self.conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('grid_columns', ?)", (columns,))
+            moved = fix_link_positions(self.conn, rows * columns) if rows * columns < self.page_size else 0
+
+        self.rows = rows
+        self.columns = columns
+        self.page_size = rows * columns
+        if moved:
+            self.load_page_index()
+        return moved
+
+    # === PAGES ===
+
+    def first_page_id(self):
+        """Returns the id of the first page, or None if there are no pages"""
+        return self.page_ids[0] if self.page_ids else None
+
+    def prev_page_id(self, page_id):
+        """Returns the id of the page before page_id, or None
+
+        The "Most Used" page comes before the first page once a link was opened.
+        """
+        if page_id == MOST_USED_PAGE_ID:
+            return None
+        i = self.page_index[page_id]
+        if i > 0:
+            return self.page_ids[i - 1]
+        return MOST_USED_PAGE_ID if self.has_launches() else None
+
+    def next_page_id(self, page_id):
+        """Returns the id of the page after page_id, or None"""
+        if page_id == MOST_USED_PAGE_ID:
+            return self.first_page_id()
+        i = self.page_index[page_id]
+        return self.page_ids[i + 1] if i + 1 < len(self.page_ids) else None
+
+    def has_page(self, page_id):
+        """Tells whether a page can be shown, the "Most Used" page once a link was opened"""
+        return page_id in self.page_index or (page_id == MOST_USED_PAGE_ID and self.has_launches())
+
+    def count_pages(self):
+        return len(self.page_ids)
+
+    def list_pages(self):
+        """Returns (id, title, number of links) of every page, in page order"""
+        return self.conn.execute("""
+            SELECT p.id, p.title, COUNT(l.id)
+            FROM pages p
+            LEFT JOIN links l ON l.page_id = p.id
+            GROUP BY p.id
+            ORDER BY p.id
+        """).fetchall()
+
+    @perf.timed("store.get_page", "query")
+    def get_page(self, page_id):
+        """Returns the page with its links indexed by position, using a single query"""
+        if page_id == MOST_USED_PAGE_ID:
+            return self.get_most_used_page()
+
+        # Only cached thumbnails are read here, never the original images
+        rows = self.conn.execute("""
+            SELECT p.title, l.id, l.url, l.position, l.title, l.image_hash, t.data, h.flag
+            FROM pages p
+            LEFT JOIN links l ON l.page_id = p.id
+            LEFT JOIN thumbnails t ON t.image_hash = l.image_hash AND t.size = ?
+            LEFT JOIN link_health h ON h.link_id = l.id
+            WHERE p.id = ?
+        """, (self.thumbnail_size, page_id)).fetchall()
+
+        if not rows:
+            return None
+
+        links = {}
+        for row in rows:
+            if row[1] is not None:
+                links[row[3]] = Link(row[1], row[2], row[3], row[4], row[5], row[6], row[7])
+
+        return Page(page_id, rows[0][0], links, self.prev_page_id(page_id), self.next_page_id(page_id))
+
+    def get_most_used_page(self):
+        """Returns the virtual page of the links with the highest frecency, best first"""
+        rows = self.conn.execute("""
+            SELECT l.id, l.url, l.title, l.image_hash, t.data, h.flag
+            FROM link_stats s
+            JOIN links l ON l.id = s.link_id
+            LEFT JOIN thumbnails t ON t.image_hash = l.image_hash AND t.size = ?
+            LEFT JOIN link_health h ON h.link_id = l.id
+            ORDER BY s.frecency DESC
+            LIMIT ?
+        """, (self.thumbnail_size, self.page_size)).fetchall()
+
+        links = {i: Link(row[0], row[1], i, row[2], row[3], row[4], row[5]) for i, row in enumerate(rows)}
+        return Page(MOST_USED_PAGE_ID, MOST_USED_TITLE, links, None, self.first_page_id())
+
+    @perf.timed("store.add_page")
+    @retry_busy
+    def add_page(self, title):
+        """Creates a page after the last one, returns its id"""
+        cursor = self.conn.execute("INSERT INTO pages (title) VALUES (?)", (title,))
+        self.conn.commit()
+
+        # AUTOINCREMENT ids only grow, so the new page always goes last
+        page_id = cursor.lastrowid
+        self.page_index[page_id] = len(self.page_ids)
+        self.page_ids.append(page_id)
+        return page_id
+
+    def append_page_ids(self, page_ids):
+        """Adds pages created outside add_page (bulk imports) to the page index"""
+        for page_id in page_ids:
+            self.page_index[page_id] = len(self.page_ids)
+            self.page_ids.append(page_id)
+
+    @retry_busy
+    def rename_page(self, page_id, title):
+        self.conn.execute("UPDATE pages SET title = ? WHERE id = ?", (title, page_id))
+        self.conn.commit()
+
+    @perf.timed("store.delete_page")
+    @retry_busy
+    def delete_page(self, page_id):
+        """Deletes a page, its links go with it through ON DELETE CASCADE"""
+        self.conn.execute("DELETE FROM pages WHERE id = ?", (page_id,))
+        self.conn.commit()
+
+        i = self.page_index.pop(page_id)
+        del self.page_ids[i]
+        for j in range(i, len(self.page_ids)):
+            self.page_index[self.page_ids[j]] = j
+
+    # === LINKS ===
+
+    def count_links(self, page_id):
+        return self.conn.execute("SELECT COUNT(*) FROM links WHERE page_id = ?", (page_id,)).fetchone()[0]
+
+    def list_links(self, page_id):
+        """Returns (id, url, title, position, image_hash) of the links of a page, ordered by position"""
+        if page_id == MOST_USED_PAGE_ID:
+            return [(link.id, link.url, link.title, link.position, link.image_hash)
+                    for link in self.get_most_used_page().links.values()]
+        return self.conn.execute(
+            "SELECT id, url, title, position, image_hash FROM links WHERE page_id = ? ORDER BY position",
+            (page_id,),
+        ).fetchall()
+
+    def get_link(self, link_id):
+        """Returns (id, page_id, url, title, position, image_hash) of a link, or None"""
+        return self.conn.execute(
+            "SELECT id, page_id, url, title, position, image_hash FROM links WHERE id = ?", (link_id,)
+        ).fetchone()
+
+    def first_page_with_room(self):
+        """Returns the id of the first page that is not full, or None"""
+        row = self.conn.execute("""
+            SELECT p.id FROM pages p
+            WHERE (SELECT COUNT(*) FROM links l WHERE l.page_id = p.id) < ?
+            ORDER BY p.id
+            LIMIT 1
+        """, (self.page_size,)).fetchone()
+        return row[0] if row else None
+
+    def first_free_position(self, page_id):
+        """Returns the first position of a page without a link, or None if the page is full"""
+        taken = {row[0] for row in self.conn.execute("SELECT position FROM links WHERE page_id = ?", (page_id,))}
+        for position in range(self.page_size):
+            if position not in taken:
+                return position
+        return None
+
+    @perf.timed("store.add_link")
+    @retry_busy
+    def add_link(self, page_id, url, position, title, image_hash=None):
+        """Inserts a link, returns its id"""
+        # Tiles past the grid are never drawn
+        if not 0 <= position < self.page_size:
+            raise ValueError(f"Position {position} is outside the {self.page_size} tiles of a page")
+        cursor = self.conn.execute("""
+            INSERT INTO links (page_id, url, position, image_hash, title)
+            VALUES (?, ?, ?, ?, ?)
+        """, (page_id, url, position, image_hash, title))
+        self.conn.commit()
+        return cursor.lastrowid
+
+    @perf.timed("store.delete_link")
+    @retry_busy
+    def delete_link(self, link_id):
+        self.conn.execute("DELETE FROM links WHERE id = ?", (link_id,))
+        self.conn.commit()
+
+    @perf.timed("store.page_link_counts")
+    def page_link_counts(self):
+        """Returns (page_id, number of links) of every page with links, in page order"""
+        return self.conn.execute(
+            "SELECT page_id, COUNT(*) FROM links GROUP BY page_id ORDER BY page_id"
+        ).fetchall()
+
+    @perf.timed("store.links_from")
+    def links_from(self, page_id, skip, limit):
+        """Returns (id, page_id, position, url, title, image_hash) of up to limit links
+
+        Links are ordered by (page_id, position) and start at the skip-th link of
+        page_id. The (page_id, position) index finds the page, so only links of
+        that page are skipped, however far into the collection it is.
+        """
+        return self.conn.execute("""
+            SELECT id, page_id, position, url, title, image_hash FROM links
+            WHERE page_id >= ?
+            ORDER BY page_id, position
+            LIMIT ? OFFSET ?
+        """, (page_id, limit, skip)).fetchall()
+
+    @perf.timed("store.search")
+    def search(self, text, limit=SEARCH_LIMIT):
+        """Returns the links matching text, best match first"""
+        return search(self.conn, text, limit)
+
+    def vacuum(self):
+        """Rebuilds the database file, giving the pages freed by deletes back to the file system"""
+        self.conn.execute("VACUUM")
+
+    # === USAGE ===
+
+    def record_launch(self, link_id, when=None):
+        """Remembers that a link was opened, written by the next flush so opening never waits on a commit
+
+        Returns True once LAUNCH_BATCH launches are waiting, the caller should flush them soon.
+        """
+        self.pending_launches.append((link_id, time.time() if when is None else when))
+        return len(self.pending_launches) >= LAUNCH_BATCH
+
+    @retry_busy
+    def flush_launches(self):
+        """Writes the launches recorded since the last flush in one transaction"""
+        if not self.pending_launches:
+            return
+        with self.conn:
+            usage.write_launches(self.conn, self.pending_launches)
+        self.pending_launches = []
+
+    def has_launches(self):
+        return self.conn.execute("SELECT 1 FROM link_stats LIMIT 1").fetchone() is not None
+
+    def most_used(self, limit):
+        """Returns (id, page_id, url, title, image_hash, launches, last_opened, frecency) of the top links"""
+        return usage.most_used(self.conn, limit)
+
+    @retry_busy
+    def prune_usage(self, keep_days=usage.KEEP_DAYS):
+        """Drops the launch history older than keep_days or of deleted links, returns the rows deleted
+
+        Frecency scores are kept up to date as launches are written, they don't
+        depend on the history.
+        """
+        with self.conn:
+            return usage.prune(self.conn, keep_days)
+
+    # === CHANGES ===
+
+    def change_counter(self):
+        """Returns a number that grows with every change to pages or links, the last id of the change log"""
+        row = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+        return row[0] if row else 0
+
+    def data_version(self):
+        """Returns a number that changes when another connection commits, a cheap check before changes_since"""
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def changes_since(self, change_id):
+        """Returns (last change id, {page_id: positions touched}) of the changes after change_id
+
+        A None position stands for the page itself (created, renamed or deleted),
+        a None page for the grid size. Returns None when the log no longer goes
+        back to change_id, everything has to be read again then.
+        """
+        rows = self.conn.execute(
+            "SELECT id, page_id, position FROM change_log WHERE id > ? ORDER BY id", (change_id,)
+        ).fetchall()
+        if not rows:
+            return (change_id, {}) if change_id >= self.change_counter() else None
+        if rows[0][0] != change_id + 1:
+            return None
+
+        pages = {}
+        for _, page_id, position in rows:
+            pages.setdefault(page_id, set()).add(position)
+        return rows[-1][0], pages
+
+    @retry_busy
+    def prune_change_log(self):
+        """Drops old entries of the change log once it grew well past CHANGE_LOG_KEEP"""
+        first, last = self.conn.execute("SELECT MIN(id), MAX(id) FROM change_log").fetchone()
+        if first is not None and last - first >= 2 * CHANGE_LOG_KEEP:
+            with self.conn:
+                self.conn.execute("DELETE FROM change_log WHERE id <= ?", (last - CHANGE_LOG_KEEP,))
+
+    def stats(self):
+        """Returns counts and sizes describing the database"""
+        conn = self.conn
+        images, image_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM images").fetchone()
+        thumbnails, thumbnail_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM thumbnails"
+        ).fetchone()
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            "path": self.path,
+            "schema_version": conn.execute("PRAGMA user_version").fetchone()[0],
+            "pages": len(self.page_ids),
+            "links": conn.execute("SELECT COUNT(*) FROM links").fetchone()[0],
+            "links_with_images": conn.execute("SELECT COUNT(image_hash) FROM links").fetchone()[0],
+            "launches": conn.execute("SELECT COUNT(*) FROM usage").fetchone()[0],
+            "images": images,
+            "image_bytes": image_bytes,
+            "thumbnails": thumbnails,
+            "thumbnail_bytes": thumbnail_bytes,
+            "database_bytes": conn.execute("PRAGMA page_count").fetchone()[0] * page_size,
+            "free_bytes": conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size,
+        }
+
+    # === IMAGES ===
+
+    @retry_busy
+    def add_image(self, data):
+        """Stores image bytes unless already present, returns their hash"""
+        key = image_hash(data)
+        self.conn.execute("INSERT OR IGNORE INTO images (hash, data) VALUES (?, ?)", (key, data))
+        return key
+
+    @retry_busy
+    def add_image_file(self, path):
+        """Streams an image file into the store unless already present, returns its hash
+
+        Like add_image, the insert is committed together with the link that uses it.
+        """
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+            key = digest.hexdigest()
+
+            if self.conn.execute("SELECT 1 FROM images WHERE hash = ?", (key,)).fetchone():
+                return key
+
+            # Reserve the blob, then fill it chunk by chunk
+            size = f.tell()
+            f.seek(0)
+            if hasattr(self.conn, "blobopen"):
+                cursor = self.conn.execute("INSERT INTO images (hash, data) VALUES (?, zeroblob(?))", (key, size))
+                with self.conn.blobopen("images", "data", cursor.lastrowid) as blob:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        blob.write(chunk)
+            else:
+                self.conn.execute("INSERT INTO images (hash, data) VALUES (?, ?)", (key, f.read()))
+        return key
+
+    def has_image(self, image_hash):
+        return self.conn.execute("SELECT 1 FROM images WHERE hash = ?", (image_hash,)).fetchone() is not None
+
+    def open_image(self, image_hash):
+        return open_image(self.conn, image_hash)
@@ -0,0 +1,338 @@
+"""Incremental two-way sync between two QuickLink databases
+
+Every page and link has a stable identifier (uid) and a change time in
+sync_rows, deleted ones keep a row there too. A database remembers, for each
+database it synced with, the last change (seq) it took from it, so a sync only
+reads the rows changed since then on either side:
+
+- the same row changed on both sides: the latest change wins, ties are broken
+  by the content so both sides pick the same one
+- links of a page deleted on the other side go with the page
+- links claiming the same tile: the one placed there first keeps it, the
+  others move to the first free tiles of the page, or to a new page when it
+  is full, in the same way on both sides
+
+Images are copied by hash, only when the other side doesn't have them yet.
+Launch history, thumbnails and settings stay with each database.
+
+    python quicklink.py sync portable/quicklink.db
+"""
+import os
+import time
+from collections import namedtuple
+from schema import MIGRATIONS, migrate, new_uid
+from store import CHUNK_SIZE, DEFAULT_COLUMNS, DEFAULT_ROWS, connect, open_image
+
+# Uids looked up per query
+LOOKUP_BATCH = 500
+
+# Deleted rows are remembered this long, a database synced less often may bring them back
+TOMBSTONE_KEEP_DAYS = 365
+
+# data is None for a deleted row, (title,) for a page, (page_uid, url, position, title, image_hash) for a link
+Record = namedtuple("Record", "uid kind updated_at data")
+
+SyncResult = namedtuple("SyncResult", "received sent images_received images_sent moved")
+
+SELECT_RECORDS = """
+    SELECT s.uid, s.kind, s.updated_at, s.row_id, p.title, lp.uid, l.url, l.position, l.title, l.image_hash
+    FROM sync_rows s
+    LEFT JOIN pages p ON s.kind = 'page' AND p.id = s.row_id
+    LEFT JOIN links l ON s.kind = 'link' AND l.id = s.row_id
+    LEFT JOIN sync_rows lp ON lp.kind = 'page' AND lp.row_id = l.page_id
+"""
+
+
+def read_records(conn, where, params=()):
+    """Returns {uid: Record} of the rows of sync_rows matching where"""
+    records = {}
+    for uid, kind, updated_at, row_id, page_title, page_uid, url, position, title, image_hash in conn.execute(
+        f"{SELECT_RECORDS} WHERE {where}", params
+    ):
+        if row_id is None:
+            data = None
+        elif kind == "page":
+            data = (page_title,)
+        else:
+            data = (page_uid, url, position, title, image_hash)
+        records[uid] = Record(uid, kind, updated_at, data)
+    return records
+
+
+def find_records(conn, uids):
+    """Returns {uid: Record} of the given uids a database knows"""
+    uids = list(uids)
+    records = {}
+    for i in range(0, len(uids), LOOKUP_BATCH):
+        chunk = uids[i:i + LOOKUP_BATCH]
+        records.update(read_records(conn, f"s.uid IN ({', '.join('?' * len(chunk))})", chunk))
+    return records
+
+
+def page_records(conn, page_uid):
+    """Returns {uid: Record} of the links of a page"""
+    return read_records(conn, """
+        s.kind = 'link' AND s.row_id IN (
+            SELECT l.id FROM links l JOIN sync_rows p ON p.kind = 'page' AND p.row_id = l.page_id WHERE p.uid = ?
+        )
+    """, (page_uid,))
+
+
+def newest(*records):
+    """Returns the record that wins, the latest change, then the greatest content"""
+    return max((record for record in records if record is not None), key=lambda r: (r.updated_at, repr(r.data)))
+
+
+def database_uid(conn):
+    return conn.execute("SELECT value FROM settings WHERE key = 'database_uid'").fetchone()[0]
+
+
+def grid_slots(conn):
+    """Returns the number of tiles of a page of a database"""
+    settings = dict(conn.execute("SELECT key, value FROM settings WHERE key IN ('grid_rows', 'grid_columns')"))
+    return int(settings.get("grid_rows", DEFAULT_ROWS)) * int(settings.get("grid_columns", DEFAULT_COLUMNS))
+
+
+def last_seq(conn):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM sync_rows").fetchone()[0]
+
+
+def database_path(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def taken_seq(conn, peer_uid, peer_path):
+    """Returns the last seq a database took from another one, 0 if they never synced
+
+    A database found somewhere else may be a copy that went its own way since,
+    every row is compared then.
+    """
+    row = conn.execute("SELECT seq, path FROM sync_peers WHERE uid = ?", (peer_uid,)).fetchone()
+    return row[0] if row and row[1] == peer_path else 0
+
+
+def resolve(ours, theirs, links_on, slots, now):
+    """Decides the record of every row changed on either side, returns ({uid: Record}, links moved)
+
+    ours and theirs map uids to the current records of each side,
+    links_on(page_uid) returns the records of the links of one of our pages.
+    """
+    merged = {uid: newest(ours.get(uid), theirs.get(uid)) for uid in ours.keys() | theirs.keys()}
+
+    def page(page_uid):
+        return merged.get(page_uid) or ours.get(page_uid) or theirs.get(page_uid)
+
+    # A link can't outlive its page
+    arriving = {}
+    for uid, record in merged.items():
+        if record.kind != "link" or record.data is None:
+            continue
+        page_uid = record.data[0]
+        if page(page_uid) is None or page(page_uid).data is None:
+            merged[uid] = Record(uid, "link", record.updated_at, None)
+        else:
+            arriving.setdefault(page_uid, {})[uid] = record
+
+    # Links that arrive on a page share out its tiles with the links already there
+    moved = 0
+    for page_uid in sorted(arriving):
+        links = {r.uid: merged.get(r.uid, r) for r in links_on(page_uid).values()}
+        links.update(arriving[page_uid])
+        links = sorted((r for r in links.values() if r.data is not None and r.data[0] == page_uid),
+                       key=lambda r: (r.updated_at, r.uid))
+
+        # The link placed first keeps its tile
+        taken = set()
+        misplaced = []
+        for record in links:
+            position = record.data[2]
+            if position in taken or not 0 <= position < slots:
+                misplaced.append(record)
+            else:
+                taken.add(position)
+
+        free = [i for i in range(slots) if i not in taken]
+        target_uid = page_uid
+        for record in misplaced:
+            # A full page spills over into a new page, created alike on both sides
+            if not free:
+                target_uid = new_uid()
+                merged[target_uid] = Record(target_uid, "page", now, page(page_uid).data)
+                free = list(range(slots))
+            data = (target_uid, record.data[1], free.pop(0)) + record.data[3:]
+            merged[record.uid] = Record(record.uid, "link", max(now, record.updated_at), data)
+            moved += 1
+
+    return merged, moved
+
+
+def copy_image(source, target, image_hash):
+    """Streams an image from one database into another unless it is already there, returns True if copied"""
+    if target.execute("SELECT 1 FROM images WHERE hash = ?", (image_hash,)).fetchone():
+        return False
+
+    size = source.execute("SELECT LENGTH(data) FROM images WHERE hash = ?", (image_hash,)).fetchone()[0]
+    with open_image(source, image_hash) as blob:
+        if hasattr(target, "blobopen"):
+            cursor = target.execute("INSERT INTO images (hash, data) VALUES (?, zeroblob(?))", (image_hash, size))
+            with target.blobopen("images", "data", cursor.lastrowid) as out:
+                for chunk in iter(lambda: blob.read(CHUNK_SIZE), b""):
+                    out.write(chunk)
+        else:
+            target.execute("INSERT INTO images (hash, data) VALUES (?, ?)", (image_hash, blob.read()))
+    return True
+
+
+def apply(conn, source, records, current):
+    """Writes the records that differ from a database's current rows, returns (rows written, images copied)
+
+    Images missing from conn are copied from source.
+    """
+    changes = [r for r in records.values() if r.uid not in current or current[r.uid].data != r.data]
+    pages = [r for r in changes if r.kind == "page"]
+    links = [r for r in changes if r.kind == "link"]
+    images = 0
+
+    def row_id(uid):
+        row = conn.execute("SELECT row_id FROM sync_rows WHERE uid = ?", (uid,)).fetchone()
+        return row and row[0]
+
+    def insert(kind, uid, sql, params):
+        # The insert trigger gives the row a new uid, replaced by the one it has everywhere else
+        conn.execute("DELETE FROM sync_rows WHERE uid = ?", (uid,))
+        new_id = conn.execute(sql, params).lastrowid
+        conn.execute("UPDATE sync_rows SET uid = ? WHERE kind = ? AND row_id = ?", (uid, kind, new_id))
+
+    # Pages first, links need them
+    for record in pages:
+        if record.data is None:
+            continue
+        page_id = row_id(record.uid)
+        if page_id is None:
+            insert("page", record.uid, "INSERT INTO pages (title) VALUES (?)", record.data)
+        else:
+            conn.execute("UPDATE pages SET title = ? WHERE id = ?", (record.data[0], page_id))
+
+    # Deleted links go, links changing tiles step aside so they can swap places
+    for record in links:
+        link_id = row_id(record.uid)
+        if link_id is None:
+            continue
+        if record.data is None:
+            conn.execute("DELETE FROM links WHERE id = ?", (link_id,))
+        elif (current[record.uid].data[0], current[record.uid].data[2]) != (record.data[0], record.data[2]):
+            conn.execute("UPDATE links SET position = -id WHERE id = ?", (link_id,))
+
+    for record in links:
+        if record.data is None:
+            continue
+        page_uid, url, position, title, image_hash = record.data
+        if image_hash is not None and copy_image(source, conn, image_hash):
+            images += 1
+        params = (row_id(page_uid), url, position, title, image_hash)
+        link_id = row_id(record.uid)
+        if link_id is None:
+            insert("link", record.uid,
+                   "INSERT INTO links (page_id, url, position, title, image_hash) VALUES (?, ?, ?, ?, ?)", params)
+        else:
+            conn.execute("UPDATE links SET page_id = ?, url = ?, position = ?, title = ?, image_hash = ? WHERE id = ?",
+                         params + (link_id,))
+
+    # Deleted pages last, their links go with them
+    for record in pages:
+        if record.data is None:
+            page_id = row_id(record.uid)
+            if page_id is not None:
+                conn.execute("DELETE FROM pages WHERE id = ?", (page_id,))
+
+    # Rows keep the change time of the change they carry, deletions are remembered
+    # even for rows this database never had, so they reach the databases it syncs with
+    conn.executemany("""
+        INSERT INTO sync_rows (uid, kind, row_id, updated_at) VALUES (?, ?, NULL, ?)
+        ON CONFLICT (uid) DO UPDATE SET updated_at = excluded.updated_at
+    """, [(r.uid, r.kind, r.updated_at) for r in changes])
+    return len(changes), images
+
+
+def sync_databases(conn, other):
+    """Merges the changes each database made since they last synced into the other, returns a SyncResult
+
+    Both databases are locked for writing meanwhile, each one is committed
+    only if the whole sync succeeded.
+    """
+    for c in (conn, other):
+        c.execute("BEGIN IMMEDIATE")
+    try:
+        # A copy of a database made with a file manager starts with the same identity
+        if database_uid(conn) == database_uid(other):
+            other.execute("UPDATE settings SET value = ? WHERE key = 'database_uid'", (new_uid(),))
+        uid, other_uid = database_uid(conn), database_uid(other)
+        path, other_path = database_path(conn), database_path(other)
+
+        ours = read_records(conn, "s.seq > ?", (taken_seq(other, uid, path),))
+        theirs = read_records(other, "s.seq > ?", (taken_seq(conn, other_uid, other_path),))
+
+        # Pages of the changed links, to know whether they still exist
+        page_uids = {r.data[0] for r in (*ours.values(), *theirs.values()) if r.kind == "link" and r.data is not None}
+        ours.update(find_records(conn, page_uids - ours.keys()))
+
+        # Rows changed on one side only are compared with the other side's current version
+        ours.update(find_records(conn, theirs.keys() - ours.keys()))
+        theirs.update(find_records(other, ours.keys() - theirs.keys()))
+
+        now = time.time()
+        merged, moved = resolve(ours, theirs, lambda page_uid: page_records(conn, page_uid),
+                                min(grid_slots(conn), grid_slots(other)), now)
+
+        # Links moved to free tiles may have changed on neither side
+        ours.update(find_records(conn, merged.keys() - ours.keys()))
+        theirs.update(find_records(other, merged.keys() - theirs.keys()))
+
+        received, images_received = apply(conn, other, merged, ours)
+        sent, images_sent = apply(other, conn, merged, theirs)
+
+        # Each side now has everything the other one has, up to its latest change
+        conn.execute("INSERT OR REPLACE INTO sync_peers (uid, seq, path, synced_at) VALUES (?, ?, ?, ?)",
+                     (other_uid, last_seq(other), other_path, now))
+        other.execute("INSERT OR REPLACE INTO sync_peers (uid, seq, path, synced_at) VALUES (?, ?, ?, ?)",
+                      (uid, last_seq(conn), path, now))
+    except BaseException:
+        conn.rollback()
+        other.rollback()
+        raise
+
+    conn.commit()
+    other.commit()
+    return SyncResult(received, sent, images_received, images_sent, moved)
+
+
+def open_database(path):
+    """Opens another database for syncing, brought up to the current schema"""
+    if not os.path.exists(path):
+        raise ValueError(f"No database at {path}")
+    conn = connect(path)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > len(MIGRATIONS):
+        conn.close()
+        raise ValueError(f"{path} was made by a newer version of QuickLink (schema version {version})")
+    migrate(conn)
+    return conn
+
+
+def sync_files(db_path, other_path):
+    """Syncs two database files, see sync_databases"""
+    if os.path.exists(other_path) and os.path.samefile(db_path, other_path):
+        raise ValueError("A database can't be synced with itself")
+    conn = connect(db_path)
+    other = open_database(other_path)
+    try:
+        return sync_databases(conn, other)
+    finally:
+        other.close()
+        conn.close()
+
+
+def prune_tombstones(conn, keep_days=TOMBSTONE_KEEP_DAYS):
+    """Forgets rows deleted more than keep_days ago, returns how many, in the caller's transaction"""
+    cutoff = time.time() - keep_days * 24 * 3600
+    return conn.execute("DELETE FROM sync_rows WHERE row_id IS NULL AND updated_at < ?", (cutoff,)).rowcount
@@ -0,0 +1,48 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# The modules of QuickLink live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# An image stored inline by databases from before schema versioning
+LEGACY_IMAGE = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """Path of a database in the schema of the first release
+
+    Three links share one inline image, two share a grid position and one
+    belongs to a deleted page.
+    """
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE pages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT DEFAULT 'New Page'
+        );
+        CREATE TABLE links (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            page_id INTEGER,
+            url TEXT,
+            position INTEGER,
+            image BLOB,
+            title TEXT,
+            FOREIGN KEY (page_id) REFERENCES pages (id)
+        );
+        INSERT INTO pages (title) VALUES ('Home'), ('Work');
+    """)
+    conn.executemany("INSERT INTO links (page_id, url, position, image, title) VALUES (?, ?, ?, ?, ?)", [
+        (1, "https://github.com", 0, LEGACY_IMAGE, "GitHub"),
+        (1, "https://gitlab.com", 1, LEGACY_IMAGE, "GitLab"),
+        (1, "https://python.org", 1, None, "Python"),
+        (2, "https://example.com", 0, LEGACY_IMAGE, "Example"),
+        (99, "https://orphan.example", 0, None, "Orphan"),
+    ])
+    conn.commit()
+    conn.close()
+    return path
@@ -0,0 +1,113 @@
+import datetime
+import os
+import sqlite3
+
+import pytest
+
+import backup
+from store import QuickLinkStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = QuickLinkStore(str(tmp_path / "links.db"))
+    page_id = store.add_page("Home")
+    store.add_link(page_id, "https://github.com", 0, "GitHub", store.add_image(b"image"))
+    yield store
+    store.close()
+
+
+def urls(path):
+    conn = sqlite3.connect(path)
+    try:
+        return sorted(row[0] for row in conn.execute("SELECT url FROM links"))
+    finally:
+        conn.close()
+
+
+def fake_backup(directory, when, label=""):
+    """Creates an empty file named like a backup taken at when"""
+    path = os.path.join(directory, f"quicklink-{when:%Y%m%d-%H%M%S}{label}.db")
+    open(path, "wb").close()
+    return path
+
+
+def test_create_backup(tmp_path, store):
+    directory = str(tmp_path / "backups")
+    path = backup.create_backup(store.path, directory)
+    assert backup.check_backup(path) == []
+    assert urls(path) == ["https://github.com"]
+    assert os.listdir(directory) == [os.path.basename(path)]  # No .partial left behind
+
+    # A second one within the same second gets its own name
+    second = backup.create_backup(store.path, directory)
+    assert second != path
+    assert [backup_path for backup_path, _ in backup.list_backups(directory)] == [second, path]
+
+
+def test_rotation(tmp_path):
+    directory = str(tmp_path)
+    today = datetime.date.today()
+    backups = {}
+    for days in list(range(1, 14)) + list(range(16, 21)):
+        for hour in (9, 12, 15):
+            when = datetime.datetime.combine(today - datetime.timedelta(days=days), datetime.time(hour))
+            backups[days, hour] = fake_backup(directory, when)
+    other = tmp_path / "notes.txt"
+    other.write_text("")
+
+    removed = backup.prune_backups(directory)
+
+    # The newest five, and the newest of each of the last 14 days
+    kept = {(1, 9), (1, 12), (1, 15), (2, 12), (2, 15)} | {(days, 15) for days in range(3, 14)}
+    assert sorted(removed) == sorted(path for key, path in backups.items() if key not in kept)
+    assert sorted(path for path, _ in backup.list_backups(directory)) == sorted(backups[key] for key in kept)
+    assert other.exists()
+
+
+def test_check_backup(tmp_path, store):
+    garbage = tmp_path / "garbage.db"
+    garbage.write_bytes(b"not a database " * 300)
+    assert backup.check_backup(str(garbage)) == ["file is not a database"]
+
+    newer = backup.create_backup(store.path, str(tmp_path / "backups"))
+    conn = sqlite3.connect(newer)
+    conn.execute("PRAGMA user_version = 999")
+    conn.close()
+    assert backup.check_backup(newer) == ["Made by a newer version of QuickLink (schema version 999)"]
+
+
+def test_restore_backup(tmp_path, store):
+    directory = str(tmp_path / "backups")
+    path = backup.create_backup(store.path, directory)
+    database_uid = store.get_setting("database_uid")
+    last_change = store.change_counter()
+
+    # Changes made after the backup
+    store.delete_link(store.get_page(store.first_page_id()).links[0].id)
+    store.add_link(store.first_page_id(), "https://python.org", 1, "Python")
+
+    safety = backup.restore_backup(store.path, path)
+
+    # The database as it was just before is kept, the store sees the restored links
+    assert "before-restore" in os.path.basename(safety)
+    assert urls(safety) == ["https://python.org"]
+    assert urls(store.path) == ["https://github.com"]
+    assert [link.url for link in store.get_page(store.first_page_id()).links.values()] == ["https://github.com"]
+
+    # Open windows read everything again, other databases compare every row on their next sync
+    assert store.change_counter() > last_change
+    assert store.changes_since(store.change_counter() - 1) == (store.change_counter(), {None: {None}})
+    assert store.get_setting("database_uid") != database_uid
+
+
+def test_restore_refuses_a_damaged_backup(tmp_path, store):
+    directory = tmp_path / "backups"
+    directory.mkdir()
+    damaged = directory / "quicklink-20260101-120000.db"
+    damaged.write_bytes(b"not a database " * 300)
+
+    with pytest.raises(ValueError):
+        backup.restore_backup(store.path, str(damaged))
+    assert urls(store.path) == ["https://github.com"]
+    assert [path for path, _ in backup.list_backups(str(directory))] == [str(damaged)]
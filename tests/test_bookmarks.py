@@ -0,0 +1,73 @@
+import pytest
+
+import bookmarks
+from store import QuickLinkStore
+
+IMAGES = [b"\x89PNG\r\n\x1a\n" + bytes([i]) * 64 for i in range(2)]
+
+
+@pytest.fixture
+def source(tmp_path):
+    """A database with two pages, an image used twice and titles that need escaping"""
+    store = QuickLinkStore(str(tmp_path / "source.db"))
+    home = store.add_page("Home & Work")
+    store.add_link(home, "https://github.com/?q=a&b=c", 0, 'Git"Hub" <code>', store.add_image(IMAGES[0]))
+    store.add_link(home, "https://python.org", 1, "Python", store.add_image(IMAGES[0]))
+    store.add_link(home, "https://pypi.org", 2, "PyPI", store.add_image(IMAGES[1]))
+    news = store.add_page("Nouvelles")
+    store.add_link(news, "https://lemonde.fr", 0, "Le Monde, à la une")
+    yield store
+    store.close()
+
+
+def contents(store, images=True):
+    """Returns (page title, position, url, title, image bytes) of every link"""
+    rows = []
+    for page_id, page, url, title, image_hash in bookmarks.iter_links(store.conn):
+        position = store.conn.execute("SELECT position FROM links WHERE url = ?", (url,)).fetchone()[0]
+        image = None
+        if images and image_hash:
+            with store.open_image(image_hash) as blob:
+                image = blob.read()
+        rows.append((page, position, url, title, image))
+    return rows
+
+
+@pytest.mark.parametrize("extension", [".json", ".html", ".csv"])
+def test_round_trip(tmp_path, source, extension):
+    path = str(tmp_path / f"bookmarks{extension}")
+    bookmarks.export_file(source, path)
+
+    target = QuickLinkStore(str(tmp_path / "target.db"))
+    page_ids, count = bookmarks.import_file(target, path)
+    assert (len(page_ids), count) == (2, 4)
+    assert target.page_ids == page_ids
+
+    # Only JSON carries the images, stored once however many links use them
+    with_images = extension == ".json"
+    assert contents(target, with_images) == contents(source, with_images)
+    if with_images:
+        assert target.conn.execute("SELECT COUNT(*) FROM images").fetchone()[0] == 2
+    target.close()
+
+
+def test_large_folder_fills_several_pages(tmp_path):
+    store = QuickLinkStore(str(tmp_path / "links.db"))
+    folder = [bookmarks.Bookmark(f"https://example.com/{i}", None, "Big") for i in range(store.page_size + 3)]
+    page_ids, count = bookmarks.import_bookmarks(store, folder + [bookmarks.Bookmark("https://example.org", None, None)])
+    assert count == store.page_size + 4
+    assert [(title, links) for _, title, links in store.list_pages()] == [
+        ("Big", store.page_size), ("Big (2)", 3), (bookmarks.DEFAULT_PAGE_TITLE, 1),
+    ]
+    store.close()
+
+
+def test_csv_image_path(tmp_path):
+    (tmp_path / "logo.png").write_bytes(IMAGES[1])
+    path = tmp_path / "links.csv"
+    path.write_text("url,title,page,image_path\nhttps://example.com,Example,Home,logo.png\n", encoding="utf-8")
+
+    store = QuickLinkStore(str(tmp_path / "links.db"))
+    bookmarks.import_file(store, str(path))
+    assert contents(store) == [("Home", 0, "https://example.com", "Example", IMAGES[1])]
+    store.close()
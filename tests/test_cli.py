@@ -0,0 +1,17 @@
+import json
+
+from quicklink import main
+
+
+def test_not_a_database(tmp_path, capsys):
+    path = tmp_path / "notadb.db"
+    path.write_bytes(b"not a database " * 300)
+    assert main(["--db", str(path), "stats"]) == 1
+    assert capsys.readouterr().err == "quicklink: file is not a database\n"
+
+
+def test_import_record_without_url(tmp_path, capsys):
+    bookmarks = tmp_path / "bookmarks.json"
+    bookmarks.write_text(json.dumps([{"page": "Home", "title": "No URL"}]))
+    assert main(["--db", str(tmp_path / "links.db"), "import", str(bookmarks)]) == 1
+    assert capsys.readouterr().err == "quicklink: missing key 'url'\n"
@@ -0,0 +1,101 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+
+import store as store_module
+from store import QuickLinkStore, connect
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Processes writing at once, and the pages each one adds
+WRITERS = 4
+PAGES_PER_WRITER = 25
+
+WRITER = """
+import sys
+from store import QuickLinkStore
+store = QuickLinkStore(sys.argv[1])
+for i in range(int(sys.argv[2])):
+    page_id = store.add_page(f"{sys.argv[3]} {i}")
+    store.add_link(page_id, f"https://example.com/{sys.argv[3]}/{i}", 0, None)
+store.close()
+"""
+
+
+def test_connections_use_wal_and_wait_for_locks(tmp_path):
+    conn = connect(str(tmp_path / "links.db"))
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == store_module.BUSY_TIMEOUT * 1000
+    conn.close()
+
+
+def test_processes_writing_at_once(tmp_path):
+    path = str(tmp_path / "links.db")
+    writers = [subprocess.Popen([sys.executable, "-c", WRITER, path, str(PAGES_PER_WRITER), f"writer{i}"],
+                                cwd=ROOT, stderr=subprocess.PIPE, text=True)
+               for i in range(WRITERS)]
+    results = [(writer.wait(), writer.stderr.read()) for writer in writers]
+    assert all(code == 0 for code, _ in results), results
+
+    store = QuickLinkStore(path)
+    assert store.count_pages() == WRITERS * PAGES_PER_WRITER
+    assert store.conn.execute("SELECT COUNT(*) FROM links").fetchone()[0] == WRITERS * PAGES_PER_WRITER
+    store.close()
+
+
+def test_write_retried_while_locked(tmp_path, monkeypatch):
+    path = str(tmp_path / "links.db")
+    monkeypatch.setattr(store_module, "BUSY_TIMEOUT", 0.05)
+    store = QuickLinkStore(path)
+
+    # Another connection holds the write lock for longer than the busy timeout
+    other = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    release = threading.Timer(0.3, other.execute, ("COMMIT",))
+    release.start()
+    try:
+        page_id = store.add_page("Locked")
+    finally:
+        release.join()
+        other.close()
+    assert store.has_page(page_id)
+    store.close()
+
+
+def test_changes_seen_by_another_store(tmp_path):
+    path = str(tmp_path / "links.db")
+    writer = QuickLinkStore(path)
+    reader = QuickLinkStore(path)
+    page_id = writer.add_page("Home")
+    data_version = reader.data_version()
+    last_change = reader.change_counter()
+
+    writer.add_link(page_id, "https://example.com", 3, "Example")
+    assert reader.data_version() != data_version
+    assert reader.changes_since(last_change) == (last_change + 1, {page_id: {3}})
+
+    # Nothing new, and a writer doesn't see its own commits through data_version
+    assert reader.changes_since(last_change + 1) == (last_change + 1, {})
+    writer_version = writer.data_version()
+    writer.add_link(page_id, "https://example.org", 4, "Example")
+    assert writer.data_version() == writer_version
+    writer.close()
+    reader.close()
+
+
+def test_pruned_change_log(tmp_path, monkeypatch):
+    monkeypatch.setattr(store_module, "CHANGE_LOG_KEEP", 5)
+    store = QuickLinkStore(str(tmp_path / "links.db"))
+    page_id = store.add_page("Home")
+    first = store.change_counter()
+    for position in range(12):
+        store.add_link(page_id, f"https://example.com/{position}", position, None)
+
+    store.prune_change_log()
+    assert store.conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0] == 5
+    assert store.changes_since(first) is None  # Read everything again
+    last, pages = store.changes_since(store.change_counter() - 2)
+    assert (last, pages) == (store.change_counter(), {page_id: {10, 11}})
+    store.close()
@@ -0,0 +1,166 @@
+import asyncio
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import health
+from store import QuickLinkStore
+
+ETAG = '"v1"'
+LAST_MODIFIED = "Mon, 05 Oct 2026 10:00:00 GMT"
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Answers HEAD and GET requests the way the paths tell"""
+
+    # (time, method, path) of every request
+    requests = []
+
+    def do_HEAD(self):
+        self.requests.append((time.monotonic(), self.command, self.path))
+        if self.path == "/nohead":
+            self.answer(405)
+        else:
+            self.do_GET()
+
+    def do_GET(self):
+        if self.command == "GET":
+            self.requests.append((time.monotonic(), self.command, self.path))
+        if self.path == "/ok":
+            if self.headers.get("If-None-Match") == ETAG:
+                self.answer(304)
+            else:
+                self.answer(200, {"ETag": ETAG, "Last-Modified": LAST_MODIFIED})
+        elif self.path == "/moved":
+            self.answer(301, {"Location": "/ok"})
+        elif self.path == "/nohead":
+            self.answer(200)
+        elif self.path == "/error":
+            self.answer(503)
+        else:
+            self.answer(404)
+
+    def answer(self, status, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = QuickLinkStore(str(tmp_path / "links.db"))
+    yield store
+    store.close()
+
+
+def check(url, etag=None, last_modified=None, host_interval=0):
+    links = [(1, url, etag, last_modified)]
+    return asyncio.run(health.check_web_links(links, host_interval=host_interval, timeout=5))[0]
+
+
+def refused_url():
+    """Returns the URL of a local port nothing listens on"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/"
+
+
+def test_ok(server):
+    result = check(server + "/ok")
+    assert (result.status, result.detail) == ("ok", "HTTP 200")
+    assert (result.etag, result.last_modified) == (ETAG, LAST_MODIFIED)
+
+
+def test_not_modified(server):
+    result = check(server + "/ok", ETAG, LAST_MODIFIED)
+    assert (result.status, result.detail) == ("ok", "Not modified")
+    assert (result.etag, result.last_modified) == (ETAG, LAST_MODIFIED)
+
+
+def test_moved_permanently(server):
+    result = check(server + "/moved")
+    assert (result.status, result.detail) == ("redirected", server + "/ok")
+
+
+def test_not_found(server):
+    result = check(server + "/missing")
+    assert (result.status, result.detail) == ("broken", "HTTP 404")
+
+
+def test_head_refused_falls_back_to_get(server):
+    result = check(server + "/nohead")
+    assert (result.status, result.detail) == ("ok", "HTTP 200")
+
+
+def test_get_fallback_waits_for_the_host(server):
+    Handler.requests.clear()
+    check(server + "/nohead", host_interval=0.3)
+    (head_at, head, _), (get_at, get, _) = Handler.requests
+    assert (head, get) == ("HEAD", "GET")
+    assert get_at - head_at >= 0.25
+
+
+def test_server_errors_flag_after_failures_in_a_row(server, store):
+    url = server + "/error"
+    link_id = store.add_link(store.add_page("Web"), url, 0, "Error")
+
+    flags = []
+    for _ in range(health.FAILURES_BROKEN):
+        result = check(url)._replace(link_id=link_id)
+        assert (result.status, result.detail) == ("unreachable", "HTTP 503")
+        with store.conn:
+            health.write_checks(store.conn, [result])
+        flags.append(store.conn.execute("SELECT flag FROM link_health WHERE link_id = ?", (link_id,)).fetchone()[0])
+    assert flags == [None] * (health.FAILURES_BROKEN - 1) + ["broken"]
+    assert [row[0] for row in health.flagged_links(store.conn)] == [link_id]
+
+
+def test_offline_flags_nothing(store):
+    page_id = store.add_page("Web")
+    url = refused_url()
+    for position in range(3):
+        store.add_link(page_id, url, position, None)
+
+    checks = [check(url) for _ in range(3)]
+    assert [result.status for result in checks] == ["unreachable"] * 3
+    assert health.offline(checks)
+
+    # The links stay due rather than counting a failure
+    assert health.check_due(store.path, host_interval=0, timeout=5) == []
+    assert store.conn.execute("SELECT COUNT(*) FROM link_health").fetchone()[0] == 0
+
+
+def test_http_errors_are_not_offline(server):
+    checks = [check(refused_url()), check(refused_url()), check(server + "/error")]
+    assert not health.offline(checks)
+
+
+def test_missing_folder(tmp_path):
+    present = tmp_path / "present.txt"
+    present.write_text("")
+    gone = tmp_path / "gone"
+    paths = [(1, None, str(present)), (2, None, str(tmp_path / "missing.txt")),
+             (3, None, str(gone / "a.pdf")), (4, None, str(gone / "b.pdf"))]
+    results = health.check_paths(paths)
+    assert [(result.status, result.detail) for result in results] == [
+        ("ok", None), ("broken", "File not found"), ("broken", "Folder not found"), ("broken", "Folder not found"),
+    ]
@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import LEGACY_IMAGE
+from schema import MIGRATIONS, image_hash, migrate
+from store import QuickLinkStore, connect
+
+QUICKLINK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "quicklink.py")
+
+# Processes opening the same database at once
+PROCESSES = 6
+
+
+def open_at_once(path):
+    """Runs a command on the database from several processes at once, returns their exit codes and stderr"""
+    processes = [subprocess.Popen([sys.executable, QUICKLINK, "--db", path, "pages"],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+                 for _ in range(PROCESSES)]
+    return [(process.wait(), process.stderr.read()) for process in processes]
+
+
+@pytest.mark.parametrize("legacy", [False, True])
+def test_concurrent_first_open(tmp_path, legacy_db, legacy):
+    path = legacy_db if legacy else str(tmp_path / "new.db")
+    results = open_at_once(path)
+    assert all(code == 0 for code, _ in results), results
+    assert not any("Traceback" in error for _, error in results)
+
+    # The migrations ran once: a single report, every link kept once
+    reports = [error for _, error in results if "deduplicated store" in error]
+    assert len(reports) == (1 if legacy else 0)
+    conn = connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    assert conn.execute("SELECT COUNT(*) FROM links").fetchone()[0] == (4 if legacy else 0)
+    conn.close()
+
+    # And the database still opens
+    assert all(code == 0 for code, _ in open_at_once(path))
+
+
+def test_legacy_upgrade(legacy_db):
+    store = QuickLinkStore(legacy_db)
+    size = len(LEGACY_IMAGE)
+    assert store.migration_messages == [
+        f"Images moved to the deduplicated store: {3 * size} -> {size} bytes ({2 * size} bytes saved)",
+        "Moved 1 links that shared a grid position",
+    ]
+    assert store.conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+
+    # The link of the deleted page is gone, the one sharing a tile moved to a free one
+    links = store.conn.execute("SELECT page_id, position, url, image_hash FROM links ORDER BY id").fetchall()
+    assert links == [
+        (1, 0, "https://github.com", image_hash(LEGACY_IMAGE)),
+        (1, 1, "https://gitlab.com", image_hash(LEGACY_IMAGE)),
+        (1, 2, "https://python.org", None),
+        (2, 0, "https://example.com", image_hash(LEGACY_IMAGE)),
+    ]
+    with store.open_image(image_hash(LEGACY_IMAGE)) as image:
+        assert image.read() == LEGACY_IMAGE
+    assert store.conn.execute("SELECT COUNT(*) FROM images").fetchone()[0] == 1
+    assert [result.url for result in store.search("gitlab")] == ["https://gitlab.com"]
+    store.close()
+
+    # Nothing left to do the next time
+    store = QuickLinkStore(legacy_db)
+    assert store.migration_messages == []
+    assert migrate(store.conn) == []
+    assert store.conn.execute("SELECT page_id, position, url, image_hash FROM links ORDER BY id").fetchall() == links
+    store.close()
@@ -0,0 +1,24 @@
+from search import CANDIDATES
+from store import QuickLinkStore
+
+
+def test_most_used_match_ranks_first(tmp_path):
+    store = QuickLinkStore(str(tmp_path / "links.db"))
+    try:
+        ids = []
+        for i in range(CANDIDATES + 100):
+            if i % store.page_size == 0:
+                page_id = store.add_page(f"Code {i // store.page_size}")
+            ids.append(store.add_link(page_id, f"https://github.com/project{i}", i % store.page_size,
+                                      f"GitHub project {i}"))
+
+        # A link far past the first CANDIDATES matches, opened often
+        for _ in range(50):
+            store.record_launch(ids[-5])
+        store.flush_launches()
+
+        assert store.most_used(1)[0][0] == ids[-5]
+        assert store.search("github")[0].link_id == ids[-5]
+        assert store.search("gi")[0].link_id == ids[-5]
+    finally:
+        store.close()
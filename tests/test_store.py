@@ -0,0 +1,91 @@
+import pytest
+
+from store import MOST_USED_PAGE_ID, QuickLinkStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = QuickLinkStore(str(tmp_path / "links.db"))
+    yield store
+    store.close()
+
+
+def test_get_page(store):
+    page_id = store.add_page("Home")
+    first = store.add_link(page_id, "https://github.com", 0, "GitHub", store.add_image(b"image"))
+    second = store.add_link(page_id, "https://python.org", 5, "Python")
+
+    page = store.get_page(page_id)
+    assert (page.id, page.title, page.prev_id, page.next_id) == (page_id, "Home", None, None)
+    assert sorted(page.links) == [0, 5]
+    assert (page.links[0].id, page.links[0].url, page.links[0].title) == (first, "https://github.com", "GitHub")
+    assert page.links[0].image_hash is not None
+    assert (page.links[5].id, page.links[5].image_hash, page.links[5].health) == (second, None, None)
+    assert store.get_page(page_id + 1) is None
+
+
+def test_page_index(store):
+    home, work, misc = store.add_page("Home"), store.add_page("Work"), store.add_page("Misc")
+    assert (store.first_page_id(), store.count_pages()) == (home, 3)
+    assert (store.prev_page_id(home), store.next_page_id(home)) == (None, work)
+    assert (store.prev_page_id(misc), store.next_page_id(misc)) == (work, None)
+
+    store.delete_page(work)
+    assert (store.next_page_id(home), store.prev_page_id(misc)) == (misc, home)
+    assert not store.has_page(work)
+
+    # The "Most Used" page comes first once a link was opened
+    assert not store.has_page(MOST_USED_PAGE_ID)
+    link_id = store.add_link(misc, "https://example.com", 0, "Example")
+    store.record_launch(link_id)
+    store.flush_launches()
+    assert store.prev_page_id(home) == MOST_USED_PAGE_ID
+    assert store.next_page_id(MOST_USED_PAGE_ID) == home
+    assert [link.id for link in store.get_page(MOST_USED_PAGE_ID).links.values()] == [link_id]
+
+
+def test_links_from(store):
+    home, work = store.add_page("Home"), store.add_page("Work")
+    for position in (3, 1, 0):
+        store.add_link(home, f"https://home.example/{position}", position, None)
+    for position in (2, 0):
+        store.add_link(work, f"https://work.example/{position}", position, None)
+
+    def positions(rows):
+        return [(row[1], row[2]) for row in rows]
+
+    assert store.page_link_counts() == [(home, 3), (work, 2)]
+    assert positions(store.links_from(home, 0, 10)) == [(home, 0), (home, 1), (home, 3), (work, 0), (work, 2)]
+    assert positions(store.links_from(home, 2, 2)) == [(home, 3), (work, 0)]
+    assert positions(store.links_from(work, 1, 10)) == [(work, 2)]
+
+
+def test_incremental_writes(store):
+    page_id = store.add_page("Home")
+    for position in range(store.page_size - 1):
+        store.add_link(page_id, f"https://example.com/{position}", position, None)
+    assert store.first_free_position(page_id) == store.page_size - 1
+    assert store.first_page_with_room() == page_id
+
+    store.add_link(page_id, "https://example.com/last", store.page_size - 1, None)
+    assert store.first_free_position(page_id) is None
+    assert store.first_page_with_room() is None
+
+    link_id = store.get_page(page_id).links[4].id
+    store.delete_link(link_id)
+    assert store.get_link(link_id) is None
+    assert store.first_free_position(page_id) == 4
+    assert 4 not in store.get_page(page_id).links
+
+    # Deleting a page takes its links along
+    store.delete_page(page_id)
+    assert store.conn.execute("SELECT COUNT(*) FROM links").fetchone()[0] == 0
+
+
+@pytest.mark.parametrize("position", [-1, 16, 100])
+def test_positions_outside_the_grid(store, position):
+    page_id = store.add_page("Home")
+    assert store.page_size == 16
+    with pytest.raises(ValueError):
+        store.add_link(page_id, "https://example.com", position, None)
+    assert store.count_links(page_id) == 0
@@ -0,0 +1,141 @@
+import time
+
+import pytest
+
+import sync
+from schema import image_hash
+from store import QuickLinkStore
+
+IMAGE = b"\x89PNG\r\n\x1a\n" + bytes(range(256))
+IMAGE_HASH = image_hash(IMAGE)
+
+
+@pytest.fixture
+def stores(tmp_path):
+    """Two databases holding the same page after a first sync"""
+    ours = QuickLinkStore(str(tmp_path / "ours.db"))
+    theirs = QuickLinkStore(str(tmp_path / "theirs.db"))
+    page_id = ours.add_page("Home")
+    ours.add_link(page_id, "https://github.com", 0, "GitHub", ours.add_image(IMAGE))
+    ours.add_link(page_id, "https://python.org", 1, "Python")
+
+    result = sync.sync_files(ours.path, theirs.path)
+    assert result == sync.SyncResult(0, 3, 0, 1, 0)
+    theirs.load_page_index()
+    yield ours, theirs
+    ours.close()
+    theirs.close()
+
+
+def contents(store):
+    """Returns the pages and the (page title, position, url, title, image hash) of every link of a database"""
+    pages = sorted(row[0] for row in store.conn.execute("SELECT title FROM pages"))
+    links = sorted(store.conn.execute("""
+        SELECT p.title, l.position, l.url, l.title, l.image_hash
+        FROM links l JOIN pages p ON p.id = l.page_id
+    """).fetchall())
+    return pages, links
+
+
+def link_id(store, url):
+    return store.conn.execute("SELECT id FROM links WHERE url = ?", (url,)).fetchone()[0]
+
+
+def edit(store, sql, params, updated_at):
+    """Changes a row, as if at updated_at"""
+    cursor = store.conn.execute(sql, params)
+    store.conn.execute("UPDATE sync_rows SET updated_at = ? WHERE seq = (SELECT MAX(seq) FROM sync_rows)",
+                       (updated_at,))
+    store.conn.commit()
+    return cursor.lastrowid
+
+
+def assert_synced(ours, theirs):
+    """Both sides hold the same links, and syncing again changes nothing"""
+    assert contents(ours) == contents(theirs)
+    assert sync.sync_files(ours.path, theirs.path) == sync.SyncResult(0, 0, 0, 0, 0)
+
+
+def test_first_sync_copies_everything(stores):
+    ours, theirs = stores
+    assert contents(theirs) == (["Home"], [
+        ("Home", 0, "https://github.com", "GitHub", IMAGE_HASH),
+        ("Home", 1, "https://python.org", "Python", None),
+    ])
+    assert_synced(ours, theirs)
+
+
+@pytest.mark.parametrize("ours_later", [True, False])
+def test_latest_change_wins(stores, ours_later):
+    ours, theirs = stores
+    sql = "UPDATE links SET title = ? WHERE url = 'https://github.com'"
+    edit(ours, sql, ("Ours",), 2000 if ours_later else 1000)
+    edit(theirs, sql, ("Theirs",), 1000 if ours_later else 2000)
+
+    sync.sync_files(ours.path, theirs.path)
+    titles = {title for _, _, url, title, _ in contents(ours)[1] + contents(theirs)[1] if "github" in url}
+    assert titles == {"Ours" if ours_later else "Theirs"}
+    assert_synced(ours, theirs)
+
+
+def test_deletes_reach_the_other_side(stores):
+    ours, theirs = stores
+    work = theirs.add_page("Work")
+    theirs.add_link(work, "https://example.com", 0, "Example")
+    sync.sync_files(ours.path, theirs.path)
+
+    # A link deleted on one side, a page deleted on the other while its link changed there:
+    # the page takes the link with it
+    ours.delete_link(link_id(ours, "https://python.org"))
+    edit(ours, "UPDATE links SET title = 'Changed' WHERE url = 'https://example.com'", (), 1000)
+    theirs.delete_page(work)
+
+    result = sync.sync_files(ours.path, theirs.path)
+    assert (result.received, result.sent) == (2, 1)
+    assert contents(ours) == (["Home"], [("Home", 0, "https://github.com", "GitHub", IMAGE_HASH)])
+    assert_synced(ours, theirs)
+
+
+def test_tile_conflict_moves_a_link_to_a_free_tile(stores):
+    ours, theirs = stores
+    page_id = ours.first_page_id()
+    edit(ours, "INSERT INTO links (page_id, url, position, title) VALUES (?, 'https://ours.example', 5, 'Ours')",
+         (page_id,), 1000)
+    edit(theirs, "INSERT INTO links (page_id, url, position, title) VALUES (?, 'https://theirs.example', 5, 'Theirs')",
+         (theirs.first_page_id(),), 2000)
+
+    result = sync.sync_files(ours.path, theirs.path)
+    assert result.moved == 1
+    positions = {url: position for _, position, url, _, _ in contents(ours)[1]}
+    assert (positions["https://ours.example"], positions["https://theirs.example"]) == (5, 2)
+    assert_synced(ours, theirs)
+
+
+def test_tile_conflict_on_a_full_page_moves_a_link_to_a_new_page(stores):
+    ours, theirs = stores
+    page_id = ours.first_page_id()
+    for position in range(2, ours.page_size):
+        ours.add_link(page_id, f"https://example.com/{position}", position, None)
+    edit(theirs, "INSERT INTO links (page_id, url, position, title) VALUES (?, 'https://theirs.example', 2, 'Theirs')",
+         (theirs.first_page_id(),), time.time() + 3600)
+
+    result = sync.sync_files(ours.path, theirs.path)
+    assert result.moved == 1
+    pages, links = contents(theirs)
+    assert pages == ["Home", "Home"]
+    assert len(links) == ours.page_size + 1
+    moved = ours.conn.execute("SELECT page_id, position FROM links WHERE url = 'https://theirs.example'").fetchone()
+    assert moved[0] != page_id and moved[1] == 0
+    assert_synced(ours, theirs)
+
+
+def test_images_copied_only_when_missing(stores):
+    ours, theirs = stores
+    theirs.add_link(theirs.first_page_id(), "https://gitlab.com", 2, "GitLab", theirs.add_image(IMAGE))
+    other_image = theirs.add_image(IMAGE + b"other")
+    theirs.add_link(theirs.first_page_id(), "https://example.com", 3, "Example", other_image)
+
+    result = sync.sync_files(ours.path, theirs.path)
+    assert (result.received, result.images_received) == (2, 1)
+    assert ours.has_image(other_image)
+    assert_synced(ours, theirs)
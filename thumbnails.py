@@ -0,0 +1,84 @@
+import io
+from PIL import Image
+import perf
+from store import THUMBNAIL_SIZE, open_image
+
+
+class ThumbnailCache:
+    """Pre-scaled images persisted next to the originals"""
+
+    def __init__(self, conn, size=THUMBNAIL_SIZE):
+        self.conn = conn
+        self.size = size
+
+    @perf.timed("thumbnail.make", "resize")
+    def make_thumbnail(self, source):
+        """Decodes an original image (bytes or file object) and returns the scaled tile as PNG bytes"""
+        if isinstance(source, bytes):
+            source = io.BytesIO(source)
+        elif not hasattr(source, "readline"):
+            # Some Pillow plugins probe with readline(), which sqlite3.Blob doesn't have
+            source = io.BytesIO(source.read())
+        img = Image.open(source)
+        if img.mode != "RGBA":
+            img = img.convert("RGBA")
+        img = img.resize((self.size, self.size), Image.LANCZOS)
+
+        output = io.BytesIO()
+        img.save(output, format="PNG", optimize=True)
+        return output.getvalue()
+
+    def build(self, image_hash):
+        """Scales the original of an image, returns the thumbnail bytes (None if missing or undecodable)"""
+        # The original is streamed from the blob store instead of loaded in one piece
+        blob = open_image(self.conn, image_hash)
+        if blob is None:
+            return None
+        with blob:
+            try:
+                return self.make_thumbnail(blob)
+            except (OSError, ValueError, Image.DecompressionBombError):
+                return None
+
+    def store(self, image_hash, data):
+        """Saves the thumbnail of an image"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO thumbnails (image_hash, size, data) VALUES (?, ?, ?)",
+            (image_hash, self.size, data),
+        )
+
+    def get(self, image_hash):
+        """Returns the cached thumbnail of an image, building it on first view"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT data FROM thumbnails WHERE image_hash = ? AND size = ?", (image_hash, self.size))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+
+        # Written once the blob is closed: a write started inside its read transaction
+        # would have to upgrade it, which fails at once if another connection wrote meanwhile
+        data = self.build(image_hash)
+        if data is not None:
+            self.store(image_hash, data)
+            self.conn.commit()
+        return data
+
+    def backfill(self):
+        """Builds the missing thumbnails of every stored image, returns how many were made"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT hash FROM images
+            WHERE hash NOT IN (SELECT image_hash FROM thumbnails WHERE size = ?)
+        ''', (self.size,))
+        image_hashes = [row[0] for row in cursor.fetchall()]
+
+        # Originals are read one at a time so memory stays bounded by the largest image
+        made = 0
+        for image_hash in image_hashes:
+            data = self.build(image_hash)
+            if data is not None:
+                self.store(image_hash, data)
+                made += 1
+
+        self.conn.commit()
+        return made
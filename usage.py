@@ -0,0 +1,89 @@
+"""Launch history and frecency of links
+
+Every launch is appended to the usage table. Each link also keeps a frecency
+score in link_stats: its launches, each decayed by half every HALF_LIFE. The
+decay applies to every link alike, so scores are stored relative to a fixed
+EPOCH (in log2, so they never overflow) and a launch only updates the score
+of its own link. Ranking the most used links then reads the score index,
+never the history.
+"""
+import math
+import time
+
+# Seconds after which a launch counts half
+HALF_LIFE = 14 * 24 * 3600
+
+# Reference time of the stored scores (2025-01-01 UTC)
+EPOCH = 1735689600.0
+
+# Launch history kept, in days, the scores don't depend on it
+KEEP_DAYS = 180
+
+
+def launch_weight(when):
+    """Returns log2 of the weight of a launch at time when, relative to EPOCH"""
+    return (when - EPOCH) / HALF_LIFE
+
+
+def add_launch(frecency, when):
+    """Returns a frecency score with one more launch, both scores in log2"""
+    weight = launch_weight(when)
+    if frecency is None:
+        return weight
+    high, low = max(frecency, weight), min(frecency, weight)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def decayed_launches(frecency, now=None):
+    """Returns the launches behind a score, decayed to now"""
+    return 2 ** (frecency - launch_weight(time.time() if now is None else now))
+
+
+def write_launches(conn, launches):
+    """Appends (link_id, time) launches to the history and updates the scores, in the caller's transaction
+
+    Launches of links deleted in the meantime are dropped.
+    """
+    link_ids = sorted({link_id for link_id, when in launches})
+    stats = {}
+    for i in range(0, len(link_ids), 500):
+        chunk = link_ids[i:i + 500]
+        stats.update((row[0], row[1:]) for row in conn.execute(f"""
+            SELECT l.id, COALESCE(s.launches, 0), s.last_opened, s.frecency
+            FROM links l
+            LEFT JOIN link_stats s ON s.link_id = l.id
+            WHERE l.id IN ({", ".join("?" * len(chunk))})
+        """, chunk))
+
+    launches = [(link_id, when) for link_id, when in launches if link_id in stats]
+    for link_id, when in launches:
+        count, last_opened, frecency = stats[link_id]
+        stats[link_id] = (count + 1, max(when, last_opened or when), add_launch(frecency, when))
+
+    conn.executemany("INSERT INTO usage (link_id, opened_at) VALUES (?, ?)", launches)
+    conn.executemany("""
+        INSERT INTO link_stats (link_id, launches, last_opened, frecency) VALUES (?, ?, ?, ?)
+        ON CONFLICT (link_id) DO UPDATE SET
+            launches = excluded.launches, last_opened = excluded.last_opened, frecency = excluded.frecency
+    """, [(link_id, *stats[link_id]) for link_id in {link_id for link_id, when in launches}])
+    return len(launches)
+
+
+def most_used(conn, limit):
+    """Returns (id, page_id, url, title, image_hash, launches, last_opened, frecency) of the top links"""
+    return conn.execute("""
+        SELECT l.id, l.page_id, l.url, l.title, l.image_hash, s.launches, s.last_opened, s.frecency
+        FROM link_stats s
+        JOIN links l ON l.id = s.link_id
+        ORDER BY s.frecency DESC
+        LIMIT ?
+    """, (limit,)).fetchall()
+
+
+def prune(conn, keep_days=KEEP_DAYS):
+    """Deletes the history older than keep_days or of deleted links, returns the rows deleted"""
+    cutoff = time.time() - keep_days * 24 * 3600
+    return conn.execute("""
+        DELETE FROM usage
+        WHERE opened_at < ? OR NOT EXISTS (SELECT 1 FROM links WHERE id = usage.link_id)
+    """, (cutoff,)).rowcount